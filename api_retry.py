@@ -0,0 +1,86 @@
+"""Retry and pacing helpers shared by every Gemini API caller.
+
+Rate-limit (429 RESOURCE_EXHAUSTED) and server (5xx) errors are retried with
+the server's retryDelay when it sends one, or jittered exponential backoff
+otherwise. A RateLimiter shared by a worker pool paces request starts and
+holds every worker back after a 429.
+"""
+import re
+import time
+import random
+import threading
+
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 2.0
+
+# "retryDelay": "17s" in the details of a 429 RESOURCE_EXHAUSTED error
+RETRY_DELAY_PATTERN = re.compile(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+class RateLimiter:
+    """Spaces out request starts so a worker pool stays under a requests-per-minute quota.
+
+    Shared by all workers. After a rate-limit error, pause() pushes the next
+    free slot back for every worker instead of letting each one hammer the API.
+    """
+
+    def __init__(self, requests_per_minute=0):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+def is_rate_limit_error(error):
+    return getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+def is_retryable_error(error):
+    code = getattr(error, "code", None)
+    return is_rate_limit_error(error) or (isinstance(code, int) and code >= 500) or "UNAVAILABLE" in str(error)
+
+def retry_delay(error, attempt, base_delay=RETRY_BASE_DELAY):
+    """Seconds to wait before retrying: the server's retryDelay if given, else jittered exponential backoff."""
+    match = RETRY_DELAY_PATTERN.search(str(error))
+    if match:
+        return float(match.group(1))
+    return base_delay * (2 ** attempt) * random.uniform(1.0, 1.5)
+
+def call_with_retry(function, *args, limiter=None, max_retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY,
+                    description="API request", **kwargs):
+    """Calls function(*args, **kwargs), retrying rate-limit and server errors.
+
+    Args:
+        function: The call to make; it is re-run from scratch on each attempt.
+        limiter: Shared RateLimiter, or None for no pacing.
+        max_retries: Retries after the first attempt.
+        base_delay: First backoff delay in seconds when the server sends none.
+        description: What is being retried, for the log line.
+
+    Returns:
+        Whatever the function returns. Non-retryable errors, and the last
+        error once retries run out, are raised.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        try:
+            return function(*args, **kwargs)
+        except Exception as error:
+            if attempt == max_retries or not is_retryable_error(error):
+                raise
+            delay = retry_delay(error, attempt, base_delay)
+            if is_rate_limit_error(error) and limiter is not None:
+                limiter.pause(delay)
+            print(f"[WARN] {description} failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
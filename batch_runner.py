@@ -0,0 +1,220 @@
+"""
+Chạy nhiều overview trong một tiến trình: mỗi job là một thư mục tài liệu nguồn.
+
+    python batch_runner.py jobs.json --yes [--jobs 4] [--output-root batch_output]
+
+Manifest (JSON): danh sách job, hoặc {"defaults": {...}, "jobs": [...]}. Mỗi job có các khóa của
+OverviewJob (sources, customize_text, customize_audio, slides, slide_dir, ...) và "id" (mặc định là
+tên thư mục sources; không được chứa dấu phân cách đường dẫn hay ".."). output_dir mặc định <output_root>/<id>, slide_dir mặc định <output_dir>/slides.
+
+- Mọi job dùng chung client của tiến trình (genai_client), một UploadManager và các cache trên đĩa.
+- Số request đồng thời được giới hạn chung cho cả tiến trình theo từng loại API (upload, text, TTS)
+  bởi client dùng chung, bất kể bao nhiêu job đang chạy.
+- Process render slide cũng được chia: job không đặt render_workers thì dùng số nhân CPU / --jobs,
+  để các job chạy cùng lúc không tạo tổng cộng (số job x số nhân) process.
+- Mỗi job có một file kết quả <results>/<id>.json, ghi nguyên tử lúc bắt đầu (running) và lúc xong
+  (succeeded / failed, thời gian và lỗi từng bước, các file output). Tiến trình chết giữa chừng không
+  làm mất job đã xong: chạy lại cùng manifest sẽ bỏ qua các job succeeded và chạy lại phần còn lại.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import genai_client
+from disk_cache import write_json_atomic
+from generate_text import print_cache_stats
+from upload_manager import UploadManager
+from video_overview import OverviewJob, run_job_async
+
+MAX_JOBS = 4
+UPLOAD_CONCURRENCY = genai_client.DEFAULT_LIMITS["upload"].concurrency
+TEXT_CONCURRENCY = genai_client.DEFAULT_LIMITS["text"].concurrency
+TTS_CONCURRENCY = genai_client.DEFAULT_LIMITS["tts"].concurrency
+OUTPUT_ROOT = "batch_output"
+# Thread cho các bước chặn (asyncio.to_thread) của mỗi job đang chạy
+THREADS_PER_JOB = 8
+
+BatchJob = namedtuple("BatchJob", ["id", "job"])
+
+def render_workers_per_job(max_jobs):
+    """Process render slide cho mỗi job, để max_jobs job chạy cùng lúc dùng khoảng bằng số nhân CPU"""
+    return max(1, (os.cpu_count() or 1) // max(1, max_jobs))
+
+def validate_job_id(job_id):
+    """id dùng làm tên thư mục output và file kết quả: không được chứa dấu phân cách đường dẫn, '..'"""
+    # Chặn cả "/" và "\\" trên mọi hệ điều hành: manifest có thể được viết trên máy khác
+    if job_id in ("", ".") or ".." in job_id or "/" in job_id or "\\" in job_id:
+        raise ValueError(f"invalid job id '{job_id}': ids name output folders and must not contain path separators or '..'")
+    return job_id
+
+def load_batch_manifest(manifest_path, output_root=OUTPUT_ROOT):
+    """Danh sách BatchJob từ manifest. Khóa lạ hoặc id trùng thì raise ValueError"""
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        defaults, entries = {}, manifest
+    else:
+        defaults, entries = manifest.get("defaults", {}), manifest.get("jobs", [])
+
+    jobs, seen = [], set()
+    for index, entry in enumerate(entries):
+        fields = {**defaults, **entry}
+        unknown = set(fields) - set(OverviewJob._fields) - {"id"}
+        if unknown:
+            raise ValueError(f"Job {index}: unknown keys {', '.join(sorted(unknown))}")
+        job_id = str(fields.pop("id", None) or os.path.basename(os.path.normpath(fields.get("sources", "sources"))))
+        try:
+            validate_job_id(job_id)
+        except ValueError as e:
+            raise ValueError(f"Job {index}: {e}") from None
+        if job_id in seen:
+            raise ValueError(f"Job {index}: duplicate id '{job_id}'")
+        seen.add(job_id)
+        fields.setdefault("output_dir", os.path.join(output_root, job_id))
+        fields.setdefault("slide_dir", os.path.join(fields["output_dir"], "slides"))
+        jobs.append(BatchJob(job_id, OverviewJob(**fields)))
+    return jobs
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def result_path(results_dir, job_id):
+    return os.path.join(results_dir, f"{job_id}.json")
+
+def read_result(results_dir, job_id):
+    try:
+        with open(result_path(results_dir, job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def describe_error(error):
+    # CancelledError / KeyboardInterrupt không có message
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+def result_record(batch_job, status, started_at, step_results=None, error=None):
+    """Record kết quả một job; error: lỗi ngoài các bước của pipeline (job dừng trước khi pipeline chạy xong)"""
+    record = {"id": batch_job.id, "status": status, "job": batch_job.job._asdict(), "started_at": started_at}
+    if error is not None:
+        record.update(finished_at=_now(), error=describe_error(error))
+    if step_results is not None:
+        steps, outputs = {}, {}
+        for name, result in step_results.items():
+            if result.error is None:
+                steps[name] = {"status": "ok", "seconds": round(result.finished - result.started, 3)}
+                if isinstance(result.value, str):
+                    outputs[name] = result.value
+            else:
+                ran = result.started is not None
+                steps[name] = {"status": "failed" if ran else "skipped", "error": str(result.error)}
+                if ran:
+                    steps[name]["seconds"] = round(result.finished - result.started, 3)
+        record.update(finished_at=_now(), steps=steps, outputs=outputs)
+    return record
+
+def write_failed_record(batch_job, results_dir, started_at, error):
+    """Ghi record failed cho job dừng giữa chừng (không để record kẹt ở running), trả về record"""
+    record = result_record(batch_job, "failed", started_at, error=error)
+    try:
+        write_json_atomic(result_path(results_dir, batch_job.id), record)
+    except OSError as write_error:
+        print(f"[ERROR] Job {batch_job.id}: could not write result record: {write_error}")
+    print(f"[ERROR] Job {batch_job.id} failed: {record['error']}")
+    return record
+
+async def run_batch_job(batch_job, client, uploader, results_dir, job_slots):
+    async with job_slots:
+        started_at = _now()
+
+        def on_event(name, event, error):
+            if error is not None:
+                print(f"[{batch_job.id}] {name} {event}: {error}")
+            else:
+                print(f"[{batch_job.id}] {name} {event}")
+
+        try:
+            write_json_atomic(result_path(results_dir, batch_job.id), result_record(batch_job, "running", started_at))
+            step_results = await run_job_async(batch_job.job, client, on_event, uploader)
+        except Exception as error:
+            # Lỗi ngoài các bước (dựng / kiểm tra DAG, ghi file...): chỉ job này failed, batch chạy tiếp
+            return write_failed_record(batch_job, results_dir, started_at, error)
+        except BaseException as error:
+            # Bị hủy / Ctrl+C: ghi lại rồi để việc dừng tiếp tục lan ra
+            write_failed_record(batch_job, results_dir, started_at, error)
+            raise
+        failed = any(result.error is not None for result in step_results.values())
+        record = result_record(batch_job, "failed" if failed else "succeeded", started_at, step_results)
+        write_json_atomic(result_path(results_dir, batch_job.id), record)
+        print(f"[{'ERROR' if failed else 'SUCCESS'}] Job {batch_job.id} {record['status']}")
+        return record
+
+async def run_batch_async(batch_jobs, client, results_dir, max_jobs=MAX_JOBS, rerun=False):
+    """Chạy các job (bỏ qua job đã succeeded nếu rerun=False), trả về list record theo thứ tự job"""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max_jobs * THREADS_PER_JOB))
+    uploader = UploadManager(client)
+    job_slots = asyncio.Semaphore(max_jobs)
+
+    render_workers = render_workers_per_job(max_jobs)
+
+    async def run_or_skip(batch_job):
+        if batch_job.job.render_workers is None:
+            batch_job = batch_job._replace(job=batch_job.job._replace(render_workers=render_workers))
+        previous = read_result(results_dir, batch_job.id)
+        if not rerun and previous is not None and previous.get("status") == "succeeded":
+            print(f"[SKIP] Job {batch_job.id} already succeeded")
+            return previous
+        return await run_batch_job(batch_job, client, uploader, results_dir, job_slots)
+
+    # Một job lỗi (kể cả bị hủy) không làm mất record của các job khác
+    outcomes = await asyncio.gather(*(run_or_skip(batch_job) for batch_job in batch_jobs), return_exceptions=True)
+    records = []
+    for batch_job, outcome in zip(batch_jobs, outcomes):
+        if isinstance(outcome, BaseException):
+            # run_batch_job đã ghi record failed cho job này (nếu ghi được)
+            started_at = (read_result(results_dir, batch_job.id) or {}).get("started_at")
+            outcome = result_record(batch_job, "failed", started_at, error=outcome)
+        records.append(outcome)
+    return records
+
+def run_batch(batch_jobs, client, results_dir, max_jobs=MAX_JOBS, rerun=False):
+    records = asyncio.run(run_batch_async(batch_jobs, client, results_dir, max_jobs, rerun))
+    print_cache_stats()
+    return records
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate overviews for every job in a batch manifest.")
+    parser.add_argument("manifest", help="JSON job list, or {\"defaults\": {...}, \"jobs\": [...]}")
+    parser.add_argument("--yes", action="store_true", help="accept the free-plan data notice (required)")
+    parser.add_argument("--jobs", type=int, default=MAX_JOBS, help=f"jobs running at once (default: {MAX_JOBS})")
+    parser.add_argument("--upload-concurrency", type=int, default=UPLOAD_CONCURRENCY)
+    parser.add_argument("--text-concurrency", type=int, default=TEXT_CONCURRENCY)
+    parser.add_argument("--tts-concurrency", type=int, default=TTS_CONCURRENCY)
+    parser.add_argument("--output-root", default=OUTPUT_ROOT, help=f"parent folder of per-job outputs (default: {OUTPUT_ROOT})")
+    parser.add_argument("--results", help="folder for per-job result records (default: <output-root>/results)")
+    parser.add_argument("--rerun", action="store_true", help="run jobs again even if they already succeeded")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.yes:
+        print("WARNING: If you're using Google's Gemini API on the *free plan*, your content *might* be used to help improve their models.\n"
+              "[ERROR] Pass --yes to accept and run the batch.")
+        return 1
+    batch_jobs = load_batch_manifest(args.manifest, args.output_root)
+    results_dir = args.results or os.path.join(args.output_root, "results")
+    concurrency = {"upload": args.upload_concurrency, "text": args.text_concurrency, "tts": args.tts_concurrency}
+    genai_client.configure(limits={api: genai_client.DEFAULT_LIMITS[api]._replace(concurrency=value)
+                                   for api, value in concurrency.items()})
+    records = run_batch(batch_jobs, genai_client.get_client(), results_dir, args.jobs, args.rerun)
+    succeeded = sum(record.get("status") == "succeeded" for record in records)
+    print(f"Batch done: {succeeded}/{len(records)} jobs succeeded. Results in {results_dir}")
+    return 0 if succeeded == len(records) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
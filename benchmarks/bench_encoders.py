@@ -0,0 +1,80 @@
+"""
+Benchmark: thời gian mã hóa và dung lượng file của từng preset encoder
+(slide_encoder.ENCODERS) trên tất cả template có sẵn.
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_encoders.py [số_lần_lặp] [--detail]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import python as renderer
+import slide_encoder
+
+TEMPLATE_DIR = "templates"
+FONT_DIR = "fonts"
+HUE = 200
+CHAPTER_TEMPLATES = 8
+
+SAMPLE_DATA = {
+    "opening": {"title": "Tổng quan về **Học máy** hiện đại"},
+    "definition": {"term": "**Mạng nơ-ron**", "emoji": "🧠",
+                   "definition": "Một mô hình tính toán lấy cảm hứng từ **bộ não sinh học**, "
+                                 "gồm nhiều lớp nút được kết nối với nhau."},
+    "chapter": {"title": "Chương một: **Khởi đầu**"},
+    "quote": {"title": "\"Trí tưởng tượng quan trọng hơn **kiến thức**\" - Einstein"},
+    "question": {"title": "Điều gì khiến **AI** trở nên mạnh mẽ?"},
+    "side_by_side": {"left": {"emoji": "🍎", "content": "Táo có **nhiều chất xơ** và vitamin C"},
+                     "right": {"emoji": "🍊", "content": "Cam giúp tăng **sức đề kháng**"}},
+    "blank": {"title": "Những điểm **chính**", "content": ["Điểm thứ nhất", "Điểm thứ hai với **nhấn mạnh**"]},
+    "text_with_emoji": {"text": "Văn bản ở giữa với **điểm nhấn**", "emoji_chars": ["🚀", "🌟"]},
+    "3_steps": {"title": "Quy trình ba bước", "steps": [{"title": f"Bước {i}", "content": "Nội dung"} for i in (1, 2, 3)]},
+    "4_steps": {"title": "Quy trình bốn bước", "steps": [{"title": f"Bước {i}", "content": "Nội dung"} for i in (1, 2, 3, 4)]},
+}
+
+def render_all_templates():
+    """Render mỗi template có sẵn một lần, trả về list (tên, ảnh)"""
+    ctx = renderer.RenderContext(hue=HUE)
+    slides = []
+    for template_name, data in SAMPLE_DATA.items():
+        if template_name == "chapter":
+            for chapter_number in range(1, CHAPTER_TEMPLATES + 1):
+                image = renderer.render_slide("chapter.png", data, TEMPLATE_DIR, FONT_DIR, ctx,
+                                              chapter_number=chapter_number)
+                slides.append((f"chapter_{chapter_number}", image))
+        else:
+            slides.append((template_name, renderer.render_slide(f"{template_name}.png", data,
+                                                                TEMPLATE_DIR, FONT_DIR, ctx)))
+    return slides
+
+def bench_encoder(encoder, image, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = slide_encoder.encode_image(image, encoder)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(data)
+
+def main(repeat=3, detail=False):
+    renderer.warm_up_fonts(FONT_DIR)
+    slides = render_all_templates()
+    print(f"{len(slides)} template, {slides[0][1].width}x{slides[0][1].height}, lặp {repeat} lần\n")
+
+    print(f"{'encoder':<15}{'ms/slide':>10}{'KB/slide':>10}{'tổng MB':>10}")
+    for encoder in slide_encoder.ENCODERS.values():
+        results = [(name, *bench_encoder(encoder, image, repeat)) for name, image in slides]
+        total_time = sum(seconds for _, seconds, _ in results)
+        total_size = sum(size for _, _, size in results)
+        print(f"{encoder.name:<15}{total_time / len(results) * 1000:>10.1f}"
+              f"{total_size / len(results) / 1024:>10.0f}{total_size / 1e6:>10.2f}")
+        if detail:
+            for name, seconds, size in results:
+                print(f"    {name:<17}{seconds * 1000:>8.1f} ms{size / 1024:>8.0f} KB")
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--detail"]
+    main(int(args[0]) if args else 3, detail="--detail" in sys.argv)
@@ -0,0 +1,97 @@
+"""
+Benchmark: blend nền highlight cho text bold.
+So sánh cách cũ (mỗi cụm bold tạo một overlay cả khung hình rồi composite cả khung hình)
+với cách hiện tại (overlay và composite chỉ trong bounding box của từng cụm)
+trên template side_by_side và blank.
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_highlight.py [số_lần_lặp]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+import python as renderer
+
+TEMPLATE_DIR = "templates"
+FONT_DIR = "fonts"
+HUE = 200
+
+SLIDES = {
+    "side_by_side": {
+        "left": {
+            "emoji": "🍎",
+            "content": "Táo có **nhiều chất xơ** và **vitamin C**, rất tốt cho **hệ tiêu hóa**, "
+                       "**tim mạch** và giúp **no lâu** hơn",
+        },
+        "right": {
+            "emoji": "🍊",
+            "content": "Cam chứa **vitamin C** dồi dào giúp tăng **sức đề kháng**, "
+                       "**làm đẹp da** và **giảm mệt mỏi** mỗi ngày",
+        },
+    },
+    "blank": {
+        "title": "Những **điểm chính** cần nhớ",
+        "content": [
+            "Điểm thứ nhất với **nhấn mạnh** ở giữa câu",
+            "Điểm thứ hai có **hai** cụm **in đậm**",
+            "**Toàn bộ dòng này in đậm**",
+            "Điểm cuối cùng kết thúc bằng **một cụm bold**",
+        ],
+    },
+}
+
+def composite_full_frame(image, coords, radius, fill_color):
+    """Cách cũ: overlay trong suốt kích thước cả khung hình cho mỗi cụm bold"""
+    overlay = Image.new('RGBA', image.size, (0, 0, 0, 0))
+    renderer.draw_rounded_rectangle(ImageDraw.Draw(overlay), coords, radius, fill_color)
+    image.alpha_composite(overlay)
+    return image
+
+def render(template_name, background, ctx):
+    spec = renderer.get_template_spec(template_name, TEMPLATE_DIR)
+    return renderer.add_template_data(background.copy(), spec, SLIDES[template_name], FONT_DIR, ctx)
+
+def bench(template_name, background, ctx, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = render(template_name, background, ctx)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), image
+
+def main(repeat=10):
+    renderer.warm_up_fonts(FONT_DIR)
+    local_composite = renderer.composite_rounded_rectangle
+
+    print(f"{'template':<14}{'highlights':>11}{'before (ms)':>13}{'after (ms)':>12}{'speedup':>9}")
+    for template_name in SLIDES:
+        template = Image.open(os.path.join(TEMPLATE_DIR, f"{template_name}.png")).convert('RGBA')
+        background = renderer.apply_background(template, HUE)
+        ctx = renderer.RenderContext(hue=HUE)
+
+        # Đếm số lần blend highlight trên một slide
+        calls = []
+        def counting_composite(image, coords, radius, fill_color):
+            calls.append(coords)
+            return local_composite(image, coords, radius, fill_color)
+        renderer.composite_rounded_rectangle = counting_composite
+        render(template_name, background, ctx)
+
+        try:
+            renderer.composite_rounded_rectangle = composite_full_frame
+            before, before_image = bench(template_name, background, ctx, repeat)
+        finally:
+            renderer.composite_rounded_rectangle = local_composite
+        after, after_image = bench(template_name, background, ctx, repeat)
+
+        identical = before_image.tobytes() == after_image.tobytes()
+        print(f"{template_name:<14}{len(calls):>11}{before * 1000:>13.1f}{after * 1000:>12.1f}"
+              f"{before / after:>8.1f}x{'' if identical else '  (OUTPUT KHÁC!)'}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
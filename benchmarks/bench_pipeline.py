@@ -0,0 +1,172 @@
+"""
+Benchmark end-to-end: cả pipeline video overview chạy trên backend Gemini giả (fake_gemini), không cần mạng.
+Mỗi bước (upload, overview, title, TTS một request / chia chunk, render slide, ghép video) được chạy riêng
+rồi đo thời gian thực, thời gian CPU (tiến trình hiện tại + tiến trình con: worker render, ffmpeg) và bộ
+nhớ đỉnh (tracemalloc, chỉ tính cấp phát Python / numpy của tiến trình hiện tại). Sau đó chạy cả DAG
+(video_overview.run_job) hai lần: cache trống, rồi cache nóng (upload, text, TTS đều dùng lại).
+
+Mọi file (nguồn giả, cache, manifest upload, output) nằm trong một thư mục tạm, xóa khi xong.
+Không có ffmpeg (PATH hoặc FFMPEG_BINARY) thì bỏ qua bước ghép video.
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_pipeline.py [--time-scale 0.2] [--words 1100] [--sources 3] [--source-mb 2]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import genai_client
+import generate_audio as audio_module
+import generate_text as text_module
+import video_overview
+from fake_gemini import FakeGemini
+from generate_audio import generate as generate_audio
+from generate_text import generate_overview, generate_title
+from upload_manager import UploadManager
+from video_assembly import find_ffmpeg
+
+SLIDES = [
+    {"template": "opening.png", "data": {"title": "Tổng quan về **Học máy** hiện đại"}},
+    {"template": "chapter.png", "data": {"title": "Chương một: **Khởi đầu**"}},
+    {"template": "definition.png", "data": {"term": "**Mạng nơ-ron**", "emoji": "🧠",
+                                            "definition": "Một mô hình tính toán gồm nhiều lớp nút kết nối với nhau."}},
+    {"template": "question.png", "data": {"title": "Điều gì khiến **AI** trở nên mạnh mẽ?"}},
+    {"template": "quote.png", "data": {"title": "\"Trí tưởng tượng quan trọng hơn **kiến thức**\""}},
+]
+
+def cpu_seconds():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+@contextmanager
+def measure(rows, name):
+    """Thêm (tên, giây thực, giây CPU, MB bộ nhớ đỉnh) vào rows khi khối lệnh kết thúc"""
+    tracemalloc.start()
+    wall, cpu = time.perf_counter(), cpu_seconds()
+    try:
+        yield
+    finally:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append((name, time.perf_counter() - wall, cpu_seconds() - cpu, peak / 1e6))
+
+def print_rows(title, rows):
+    print(f"\n{title}")
+    print(f"{'bước':<22}{'thực s':>9}{'CPU s':>9}{'đỉnh MB':>10}")
+    for name, wall, cpu, peak in rows:
+        print(f"{name:<22}{wall:>9.2f}{cpu:>9.2f}{peak:>10.1f}")
+
+def write_sources(source_dir, count, size_mb, seed=0):
+    os.makedirs(source_dir, exist_ok=True)
+    for index in range(count):
+        # Nội dung cố định theo seed: lần chạy DAG thứ hai thấy đúng các hash đã upload
+        block = bytes((seed + index + i) % 251 for i in range(4096))
+        with open(os.path.join(source_dir, f"source_{index + 1}.pdf"), "wb") as f:
+            f.write(block * int(size_mb * 1024 * 1024 / len(block)))
+
+def has_ffmpeg():
+    try:
+        find_ffmpeg()
+        return True
+    except FileNotFoundError:
+        return False
+
+def bench_stages(client, workspace, source_dir, slides_path, video):
+    rows = []
+    uploader = UploadManager(client, os.path.join(workspace, "stages_uploads.json"))
+    output_dir = os.path.join(workspace, "stages")
+    slide_dir = os.path.join(output_dir, "slides")
+    os.makedirs(output_dir)
+
+    with measure(rows, "upload"):
+        documents = [result.file for result in uploader.upload_all(video_overview.list_documents(source_dir))]
+    with measure(rows, "overview"):
+        overview = generate_overview(documents, "", client, cache=False)
+    with measure(rows, "title"):
+        title = generate_title(overview, client, cache=False)
+    with measure(rows, "tts (1 request)"):
+        generate_audio(overview, "", os.path.join(output_dir, "single"), client=client, cache=False)
+    with measure(rows, "tts (chunked)"):
+        audio_file = generate_audio(overview, "", os.path.join(output_dir, "chunked"), client=client,
+                                    chunked=True, cache=False)
+    with measure(rows, "slides"):
+        slide_dir = video_overview.render_slides(slides_path, "templates", "fonts", slide_dir)
+    if video:
+        with measure(rows, "video"):
+            video_overview.assemble_overview(overview, title, audio_file, slide_dir, output_dir)
+    return rows
+
+def bench_dag(client, workspace, source_dir, slides_path, name, video):
+    job = video_overview.OverviewJob(sources=source_dir, slides=slides_path,
+                                     slide_dir=os.path.join(workspace, name, "slides"),
+                                     output_dir=os.path.join(workspace, name))
+    uploader = UploadManager(client, os.path.join(workspace, "dag_uploads.json"))
+    totals = []
+    with measure(totals, "tổng"):
+        results = video_overview.run_job(job, client, on_event=lambda *event: None, uploader=uploader)
+    start = min(result.started for result in results.values() if result.started is not None)
+    print(f"\nDAG ({name}): {'bước':<12}{'bắt đầu s':>11}{'kết thúc s':>12}")
+    failures = 0
+    for result in results.values():
+        if result.name == "video" and not video:
+            print(f"{'':<15}{result.name:<12}{'bỏ qua':>11}   (không có ffmpeg)")
+            continue
+        failures += result.error is not None
+        if result.started is None:
+            print(f"{'':<15}{result.name:<12}{'bỏ qua':>11}   {result.error}")
+            continue
+        status = "" if result.error is None else f"   LỖI: {result.error}"
+        print(f"{'':<15}{result.name:<12}{result.started - start:>11.2f}{result.finished - start:>12.2f}{status}")
+    name, wall, cpu, peak = totals[0]
+    print(f"{'':<15}{name}: {wall:.2f} s thực, {cpu:.2f} s CPU, đỉnh {peak:.1f} MB")
+    return failures
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on the offline fake Gemini backend.")
+    parser.add_argument("--time-scale", type=float, default=0.2, help="multiplier for fake API latencies (0 = no waiting)")
+    parser.add_argument("--words", type=int, default=1100, help="words in the fake overview")
+    parser.add_argument("--sources", type=int, default=3, help="number of fake source documents")
+    parser.add_argument("--source-mb", type=float, default=2, help="size of each source document (MB)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Tạo ở đây, không phải lúc import: worker render slide (spawn) import lại module này
+    workspace = tempfile.mkdtemp(prefix="bench_pipeline_")
+    # Cache dùng chung được tạo ở lần dùng đầu tiên, trỏ vào thư mục tạm trước đó
+    text_module.TEXT_CACHE_DIR = os.path.join(workspace, "cache", "text")
+    audio_module.TTS_CACHE_DIR = os.path.join(workspace, "cache", "tts")
+    genai_client.configure(backend_factory=lambda: FakeGemini(time_scale=args.time_scale, overview_words=args.words))
+    client = genai_client.get_client()
+    source_dir = os.path.join(workspace, "sources")
+    write_sources(source_dir, args.sources, args.source_mb)
+    slides_path = os.path.join(workspace, "slides.json")
+    with open(slides_path, "w", encoding="utf-8") as f:
+        json.dump(SLIDES, f, ensure_ascii=False)
+    video = has_ffmpeg()
+    if not video:
+        print("[WARN] ffmpeg not found, skipping the video step.")
+
+    try:
+        print_rows(f"Từng bước riêng (time_scale={args.time_scale}, {args.words} từ, "
+                   f"{args.sources} x {args.source_mb} MB nguồn)",
+                   bench_stages(client, workspace, source_dir, slides_path, video))
+        failures = bench_dag(client, workspace, source_dir, slides_path, "cold", video)
+        failures += bench_dag(client, workspace, source_dir, slides_path, "warm", video)
+        print(f"\nBộ nhớ RSS đỉnh của tiến trình: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+        print(f"Lời gọi API giả: {client.backend.calls}")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
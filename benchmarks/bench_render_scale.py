@@ -0,0 +1,42 @@
+"""
+Benchmark: thời gian render + mã hóa một slide ở từng chế độ render (python.RENDER_SCALES).
+Cache nền được xóa trước mỗi chế độ; lần render đầu tiên (resize + tô nền template) được tính riêng.
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_render_scale.py [số_lần_lặp]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import python as renderer
+import slide_encoder
+from bench_encoders import SAMPLE_DATA, TEMPLATE_DIR, FONT_DIR, HUE
+
+def render_deck_once(ctx):
+    """Render và mã hóa mỗi template một lần, trả về (số giây, ảnh cuối cùng)"""
+    start = time.perf_counter()
+    image = None
+    for template_name, data in SAMPLE_DATA.items():
+        image = renderer.render_slide(f"{template_name}.png", data, TEMPLATE_DIR, FONT_DIR, ctx,
+                                      chapter_number=1)
+        slide_encoder.encode_image(image, ctx.encoder)
+    return time.perf_counter() - start, image
+
+def main(repeat=3):
+    print(f"{'chế độ':<10}{'kích thước':>12}{'lần đầu ms':>12}{'ms/slide':>10}")
+    for mode in renderer.RENDER_SCALES:
+        ctx = renderer.RenderContext(hue=HUE, scale=mode)
+        renderer._background_cache.clear()
+        renderer.warm_up_fonts(FONT_DIR, scale=ctx.scale)
+
+        cold, image = render_deck_once(ctx)
+        timings = [render_deck_once(ctx)[0] for _ in range(repeat)]
+        per_slide = statistics.median(timings) / len(SAMPLE_DATA)
+        print(f"{mode:<10}{f'{image.width}x{image.height}':>12}{cold * 1000:>12.0f}{per_slide * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,92 @@
+"""
+Benchmark + kiểm tra hồi quy: ghép emoji trong template text_with_emoji.
+So sánh cách cũ (mỗi emoji: tạo ảnh tạm cả khung hình, xoay cả khung hình, composite cả khung hình)
+với cách hiện tại (chỉ tạo, xoay và composite tile của emoji), và kiểm tra output giống hệt từng byte.
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_text_with_emoji.py [số_lần_lặp]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+import python as renderer
+
+TEMPLATE_DIR = "templates"
+FONT_DIR = "fonts"
+HUE = 200
+
+CASES = [
+    ("2 emoji, lần lẻ", {"text": "Văn bản ở giữa với **điểm nhấn**", "emoji_chars": ["🚀", "🌟"]}, 1),
+    ("2 emoji, lần chẵn", {"text": "Văn bản ở giữa với **điểm nhấn**", "emoji_chars": ["🚀", "🌟"]}, 2),
+    ("1 emoji (nhân đôi)", {"text": "Lần thứ hai không markdown", "emoji_chars": "🔥"}, 1),
+    ("emoji không tồn tại", {"text": "Thiếu emoji", "emoji_chars": ["\U0010ffff", "🌟"]}, 2),
+]
+
+def add_emojis_full_frame(image_to_draw_on, data, text_with_emoji_number, emoji_dir):
+    """Cách cũ, giữ nguyên để so sánh: phần vẽ emoji của template text_with_emoji trước đây"""
+    emoji_chars = data.get("emoji_chars", [])
+    if not isinstance(emoji_chars, list):
+        emoji_chars = [emoji_chars]
+    if len(emoji_chars) == 1:
+        emoji_chars = emoji_chars * 2
+    emoji_size = 250
+
+    for idx, char in enumerate(emoji_chars[:2]):
+        tmp_img = Image.new("RGBA", image_to_draw_on.size, (0, 0, 0, 0))
+        if text_with_emoji_number % 2 == 1:
+            pos = (100, 100) if idx == 0 else (2200, 1100)
+        else:
+            pos = (2200, 100) if idx == 0 else (100, 1100)
+        renderer.paste_emoji_image(tmp_img, char, pos, emoji_size, emoji_dir)
+        angle = 0
+        tmp_img = tmp_img.rotate(angle, resample=Image.BICUBIC)
+        image_to_draw_on = Image.alpha_composite(image_to_draw_on.convert("RGBA"), tmp_img)
+    return image_to_draw_on
+
+def text_with_emoji_spec():
+    return renderer.get_template_spec("text_with_emoji", TEMPLATE_DIR)
+
+def render_before(background, data, number, ctx):
+    image = add_emojis_full_frame(background.copy(), data, number, ctx.emoji_dir)
+    # Phần text giữ nguyên: vẽ text lên ảnh đã có emoji, không vẽ lại emoji
+    return renderer.add_template_data(image, text_with_emoji_spec(), dict(data, emoji_chars=[]), FONT_DIR, ctx,
+                                      usage_number=number)
+
+def render_after(background, data, number, ctx):
+    return renderer.add_template_data(background.copy(), text_with_emoji_spec(), data, FONT_DIR, ctx,
+                                      usage_number=number)
+
+def bench(render, background, data, number, ctx, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = render(background, data, number, ctx)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), image
+
+def main(repeat=10):
+    renderer.warm_up_fonts(FONT_DIR)
+    ctx = renderer.RenderContext(hue=HUE)
+    background = renderer.load_template_background(os.path.join(TEMPLATE_DIR, "text_with_emoji.png"), HUE)
+
+    failures = 0
+    print(f"{'case':<22}{'before (ms)':>13}{'after (ms)':>12}{'speedup':>9}  output")
+    for name, data, number in CASES:
+        before, before_image = bench(render_before, background, data, number, ctx, repeat)
+        after, after_image = bench(render_after, background, data, number, ctx, repeat)
+
+        identical = (before_image.mode == after_image.mode and before_image.size == after_image.size
+                     and before_image.tobytes() == after_image.tobytes())
+        failures += not identical
+        print(f"{name:<22}{before * 1000:>13.1f}{after * 1000:>12.1f}{before / after:>8.1f}x"
+              f"  {'giống hệt' if identical else 'KHÁC!'}")
+
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 10) else 0)
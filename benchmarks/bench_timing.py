@@ -0,0 +1,82 @@
+"""
+Benchmark + kiểm tra: tìm khoảng nghỉ trong PCM (timing.SilenceDetector).
+Tạo audio giả lập giọng đọc 15 phút, 24 kHz (các cụm nhiễu xen khoảng nghỉ đã biết trước),
+đo thời gian phân tích, kiểm tra khoảng nghỉ tìm được khớp khoảng nghỉ đã chèn
+và kết quả không đổi khi cắt luồng thành các chunk kích thước lẻ (cắt ngang sample / frame).
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_timing.py [số_phút]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import timing
+
+SAMPLE_RATE = timing.DEFAULT_SAMPLE_RATE
+SEED = 0
+
+def synth_speech(minutes, rng):
+    """PCM giả lập và danh sách khoảng nghỉ đã chèn (giây)"""
+    pieces, pauses = [], []
+    position = 0
+    total = int(minutes * 60 * SAMPLE_RATE)
+    while position < total:
+        # Một câu: các từ (nhiễu) cách nhau khoảng lặng ngắn, không tính là khoảng nghỉ
+        for word_index in range(rng.integers(3, 15)):
+            if word_index:
+                gap = int(rng.uniform(0.03, 0.12) * SAMPLE_RATE)
+                pieces.append(rng.normal(0, 20, gap))
+                position += gap
+            word = int(rng.uniform(0.15, 0.5) * SAMPLE_RATE)
+            pieces.append(rng.normal(0, 4000, word))
+            position += word
+        pause = int(rng.uniform(0.4, 1.2) * SAMPLE_RATE)
+        pauses.append((position / SAMPLE_RATE, (position + pause) / SAMPLE_RATE))
+        pieces.append(rng.normal(0, 20, pause))
+        position += pause
+    pcm = np.clip(np.concatenate(pieces), -32768, 32767).astype(timing.PCM_DTYPE)
+    return pcm.tobytes(), pauses
+
+def chunked(data, rng, low=1, high=100_001):
+    position = 0
+    while position < len(data):
+        size = int(rng.integers(low, high))
+        yield memoryview(data)[position:position + size]
+        position += size
+
+def main(minutes=15):
+    rng = np.random.default_rng(SEED)
+    pcm, expected = synth_speech(minutes, rng)
+    duration = len(pcm) / 2 / SAMPLE_RATE
+    print(f"{duration / 60:.1f} phút, {len(pcm) / 1e6:.1f} MB PCM, {len(expected)} khoảng nghỉ đã chèn")
+
+    # Chunk cỡ như luồng TTS (vài chục KB)
+    start = time.perf_counter()
+    analysis = timing.analyze_pcm_chunks(chunked(pcm, rng, 20_000, 60_001))
+    elapsed = time.perf_counter() - start
+    print(f"phân tích: {elapsed * 1000:.0f} ms ({duration / elapsed:.0f}x thời gian thực)")
+
+    failures = 0
+    frame = timing.FRAME_MS / 1000
+    matched = sum(any(abs(p.start - s) <= frame and abs(p.end - e) <= frame for p in analysis.pauses)
+                  for s, e in expected)
+    if matched != len(expected) or len(analysis.pauses) != len(expected):
+        failures += 1
+    print(f"khớp {matched}/{len(expected)} khoảng nghỉ, tìm được {len(analysis.pauses)}")
+
+    reference = timing.analyze_pcm_chunks([pcm])
+    for low, high in ((1, 8), (1, 4_000)):
+        streamed = timing.analyze_pcm_chunks(chunked(pcm[:len(pcm) // 20], rng, low, high))
+        one_shot = timing.analyze_pcm_chunks([pcm[:len(pcm) // 20]])
+        identical = streamed == one_shot
+        failures += not identical
+        print(f"chunk {low}-{high - 1} byte: {'giống hệt' if identical else 'KHÁC!'}")
+    failures += reference.pauses != analysis.pauses
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if main(float(sys.argv[1]) if len(sys.argv) > 1 else 15) else 0)
@@ -0,0 +1,92 @@
+"""
+Benchmark + kiểm tra: upload tài liệu nguồn (upload_manager.UploadManager) trên backend Gemini giả.
+Đo thời gian upload song song so với tuần tự, rồi kiểm tra:
+- file trùng nội dung chỉ upload một lần
+- lần chạy sau dùng lại handle trong manifest, không upload lại
+- file không đọc được (symlink hỏng, file bị xóa giữa chừng, không có quyền) chỉ làm lỗi file đó,
+  các file còn lại vẫn được upload
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_uploads.py [số_file]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini import FakeGemini
+from genai_client import ManagedClient
+from upload_manager import UploadManager
+
+LATENCY_SCALE = 0.5
+
+def write_files(directory, count, size=256 * 1024):
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"source_{index + 1}.pdf")
+        with open(path, "wb") as f:
+            f.write(bytes([index % 256]) * size)
+        paths.append(path)
+    return paths
+
+def upload(paths, manifest_path, max_workers):
+    """(giây, kết quả, số lời gọi files.upload) của một lần upload_all với client giả mới"""
+    client = ManagedClient(FakeGemini(time_scale=LATENCY_SCALE))
+    start = time.perf_counter()
+    results = UploadManager(client, manifest_path, max_workers).upload_all(paths)
+    return time.perf_counter() - start, results, client.backend.calls["upload"]
+
+def check(name, ok):
+    print(f"{name:<48}{'ok' if ok else 'SAI!'}")
+    return not ok
+
+def main(count=12):
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = write_files(tmp_dir, count)
+
+        serial, _, _ = upload(paths, os.path.join(tmp_dir, "serial.json"), max_workers=1)
+        manifest_path = os.path.join(tmp_dir, "uploads.json")
+        parallel, results, calls = upload(paths, manifest_path, max_workers=4)
+        print(f"{count} file: tuần tự {serial:.2f} s, song song {parallel:.2f} s ({serial / parallel:.1f}x)")
+        failures += check("upload song song: mọi file thành công",
+                          calls == count and all(result.error is None for result in results))
+
+        # Handle trong manifest chỉ sống trên server giả đã tạo ra nó, nên dùng lại cùng một client
+        client = ManagedClient(FakeGemini(time_scale=0))
+        uploader = UploadManager(client, os.path.join(tmp_dir, "reuse.json"))
+        duplicate = os.path.join(tmp_dir, "copy_of_1.pdf")
+        with open(paths[0], "rb") as src, open(duplicate, "wb") as dst:
+            dst.write(src.read())
+        first = uploader.upload_all(paths + [duplicate])
+        failures += check("file trùng nội dung chỉ upload một lần",
+                          client.backend.calls["upload"] == count and first[-1].file.name == first[0].file.name)
+        second = UploadManager(client, os.path.join(tmp_dir, "reuse.json")).upload_all(paths)
+        failures += check("lần sau dùng lại manifest, không upload lại",
+                          client.backend.calls["upload"] == count and all(result.reused for result in second))
+
+        broken_link = os.path.join(tmp_dir, "broken.pdf")
+        os.symlink(os.path.join(tmp_dir, "missing.pdf"), broken_link)
+        unreadable = [broken_link, os.path.join(tmp_dir, "deleted.pdf")]
+        if os.geteuid() != 0:
+            # root đọc được mọi file nên chỉ kiểm tra quyền khi chạy bằng user thường
+            no_access = os.path.join(tmp_dir, "no_access.pdf")
+            with open(no_access, "wb") as f:
+                f.write(b"secret")
+            os.chmod(no_access, 0)
+            unreadable.append(no_access)
+        mixed = paths[:2] + unreadable + paths[2:4]
+        _, results, calls = upload(mixed, os.path.join(tmp_dir, "mixed.json"), max_workers=4)
+        good = [result for result in results if result.path not in unreadable]
+        bad = [result for result in results if result.path in unreadable]
+        failures += check(f"{len(unreadable)} file không đọc được: file tốt vẫn upload",
+                          calls == 4 and all(result.error is None and result.file is not None for result in good))
+        failures += check("file không đọc được có lỗi riêng, đúng thứ tự",
+                          [result.path for result in results] == mixed
+                          and all(result.error is not None and result.sha256 is None for result in bad))
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 12) else 0)
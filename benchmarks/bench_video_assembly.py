@@ -0,0 +1,103 @@
+"""
+Benchmark + kiểm tra: ghép video bằng ffmpeg thật (video_assembly.assemble_slide_dir).
+Tạo vài slide màu và một file WAV, ghép với từng cấu hình (libx264 mặc định, -vsync vfr cho ffmpeg cũ,
+codec khác libx264: mpeg4, libx265 nếu có), đo thời gian và kiểm tra video ra: ffmpeg chạy thành công, thời lượng khớp audio,
+mỗi slide chỉ là một (hoặc vài) khung hình.
+
+Không có ffmpeg (PATH hoặc FFMPEG_BINARY) thì bỏ qua, không tính là lỗi.
+
+Chạy từ thư mục gốc của repo:
+    python benchmarks/bench_video_assembly.py [số_slide] [số_giây_audio]
+"""
+import os
+import re
+import sys
+import time
+import wave
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+import video_assembly
+
+SAMPLE_RATE = 24000
+SLIDE_SIZE = (1920, 1080)
+
+CASES = {
+    "libx264": {},
+    "libx264, -vsync vfr": {"legacy_vsync": True},
+    "mpeg4": {"video_codec": "mpeg4"},
+    # Không nhận -tune stillimage: ffmpeg lỗi nếu tham số riêng của libx264 bị truyền cho codec khác
+    "libx265": {"video_codec": "libx265"},
+}
+
+def write_slides(slide_dir, count):
+    os.makedirs(slide_dir, exist_ok=True)
+    for index in range(count):
+        color = (40 * index % 256, 90, 255 - 30 * index % 256)
+        Image.new("RGB", SLIDE_SIZE, color).save(os.path.join(slide_dir, f"{index + 1}_blank.png"))
+
+def write_wav(audio_path, seconds):
+    with wave.open(audio_path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(b"\0\0" * int(seconds * SAMPLE_RATE))
+
+def available_encoders(ffmpeg):
+    result = subprocess.run([ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True)
+    return {line.split()[1] for line in result.stdout.splitlines() if len(line.split()) > 1}
+
+def probe(ffmpeg, video_path):
+    """(thời lượng giây, số khung hình video) của file, đọc bằng chính ffmpeg (bản static không có ffprobe)"""
+    result = subprocess.run([ffmpeg, "-hide_banner", "-i", video_path, "-map", "0:v:0", "-f", "null", "-"],
+                            capture_output=True, text=True)
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+\.\d+)", result.stderr)
+    frames = re.findall(r"frame=\s*(\d+)", result.stderr)
+    seconds = int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+    return seconds, int(frames[-1]) if frames else 0
+
+def main(slide_count=12, seconds=60.0):
+    try:
+        ffmpeg = video_assembly.find_ffmpeg()
+    except FileNotFoundError as e:
+        print(f"Bỏ qua: {e}")
+        return 0
+    print(f"ffmpeg {video_assembly.ffmpeg_version(ffmpeg)}, {slide_count} slide, audio {seconds:.0f} s")
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        slide_dir = os.path.join(tmp_dir, "slides")
+        audio_path = os.path.join(tmp_dir, "audio.wav")
+        write_slides(slide_dir, slide_count)
+        write_wav(audio_path, seconds)
+
+        encoders = available_encoders(ffmpeg)
+        print(f"{'cấu hình':<22}{'ms':>8}{'giây':>8}{'khung':>7}  kết quả")
+        for name, options in CASES.items():
+            if options.get("video_codec", video_assembly.VIDEO_CODEC) not in encoders:
+                print(f"{name:<22}{'':>8}{'':>8}{'':>7}  bỏ qua (ffmpeg không có encoder này)")
+                continue
+            output_path = os.path.join(tmp_dir, re.sub(r"\W+", "_", name) + ".mp4")
+            start = time.perf_counter()
+            try:
+                video_assembly.assemble_slide_dir(slide_dir, audio_path, output_path, **options)
+            except RuntimeError as e:
+                failures += 1
+                print(f"{name:<22}{'':>8}{'':>8}{'':>7}  LỖI: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            duration, frames = probe(ffmpeg, output_path)
+            # Ảnh cuối được lặp lại trong danh sách concat nên có thể thêm một khung hình
+            ok = abs(duration - seconds) < 0.2 and slide_count <= frames <= slide_count + 1
+            failures += not ok
+            print(f"{name:<22}{elapsed * 1000:>8.0f}{duration:>8.2f}{frames:>7}  {'ok' if ok else 'SAI!'}")
+    return failures
+
+if __name__ == "__main__":
+    arguments = [float(arg) for arg in sys.argv[1:3]]
+    if arguments:
+        arguments[0] = int(arguments[0])
+    sys.exit(1 if main(*arguments) else 0)
@@ -0,0 +1,196 @@
+"""
+Cache trên đĩa, đánh địa chỉ theo nội dung: key là hash SHA-256 của toàn bộ đầu vào tạo ra kết quả,
+value là bytes lưu thành một file <thư mục>/<2 ký tự đầu>/<key><đuôi>.
+
+An toàn khi nhiều tiến trình dùng chung một thư mục cache:
+- Ghi nguyên tử: ghi ra file tạm trong cùng thư mục rồi os.replace, tiến trình khác chỉ thấy
+  entry cũ, entry đầy đủ hoặc không thấy gì, không bao giờ thấy file ghi dở.
+- Hai tiến trình ghi cùng key thì ghi cùng nội dung (cùng đầu vào), ai thắng cũng đúng.
+- Giới hạn dung lượng: sau mỗi lần ghi, xóa các entry lâu chưa dùng nhất (theo atime, được đặt lại
+  mỗi lần đọc trúng) cho tới khi tổng dung lượng dưới max_bytes. Entry đang được đọc mà bị xóa
+  thì file handle đang mở vẫn đọc được (POSIX); trên Windows xóa lỗi thì bỏ qua entry đó.
+- TTL (tùy chọn): entry ghi cách đây quá ttl giây (theo mtime, không đổi khi đọc) coi như không có
+  và bị xóa khi dọn.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+
+TEMP_PREFIX = ".tmp-"
+
+# Thống kê của một DiskCache: số lần đọc trúng / trượt (trong tiến trình này), số entry và tổng dung lượng trên đĩa
+CacheStats = namedtuple("CacheStats", ["hits", "misses", "entries", "bytes"])
+
+def cache_key(*parts):
+    """Hash SHA-256 (hex) của các thành phần tạo nên key; str/số/None/list/dict đều được"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def file_sha256(path, block_size=1024 * 1024):
+    """Hash SHA-256 (hex) nội dung một file, đọc theo khối"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_json_atomic(path, data):
+    """Ghi JSON nguyên tử (file tạm + os.replace): tiến trình khác không bao giờ đọc phải file ghi dở"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+class CacheWriter:
+    """
+    Ghi một entry theo luồng (không giữ cả value trong bộ nhớ).
+    Dùng với `with`: thoát bình thường thì entry được commit, có exception thì file tạm bị xóa
+    """
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.path = cache.path(key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(self.path))
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data):
+        self._file.write(data)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.temp_path, self.path)
+        self.cache.evict()
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+class DiskCache:
+    def __init__(self, directory, max_bytes, suffix=".bin", ttl=None):
+        if max_bytes <= 0:
+            raise ValueError(f"max_bytes phải > 0, nhận {max_bytes}")
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"ttl phải > 0 (giây) hoặc None, nhận {ttl}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _expired(self, mtime, now):
+        return self.ttl is not None and now - mtime > self.ttl
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def open(self, key):
+        """File (chế độ rb) của entry, None nếu chưa có. Đọc trúng thì đánh dấu entry vừa được dùng"""
+        path = self.path(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            self._count(False)
+            return None
+        now = time.time()
+        mtime = os.fstat(f.fileno()).st_mtime
+        if self._expired(mtime, now):
+            f.close()
+            self._count(False)
+            return None
+        try:
+            # Chỉ đặt lại atime (dùng cho LRU), giữ mtime là thời điểm ghi (dùng cho TTL)
+            os.utime(path, (now, mtime))
+        except OSError:
+            # Vừa bị tiến trình khác xóa: handle đã mở vẫn đọc được
+            pass
+        self._count(True)
+        return f
+
+    def get(self, key):
+        f = self.open(key)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def writer(self, key):
+        return CacheWriter(self, key)
+
+    def put(self, key, data):
+        with self.writer(key) as writer:
+            writer.write(data)
+
+    def entries(self):
+        """(atime, size, path, mtime) của các entry đã commit"""
+        entries = []
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.startswith(TEMP_PREFIX) or not filename.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path, stat.st_mtime))
+        return entries
+
+    def size(self):
+        return sum(entry[1] for entry in self.entries())
+
+    def stats(self):
+        entries = self.entries()
+        return CacheStats(self.hits, self.misses, len(entries), sum(entry[1] for entry in entries))
+
+    def evict(self):
+        """
+        Xóa các entry hết hạn, rồi các entry lâu chưa dùng nhất cho tới khi tổng dung lượng <= max_bytes.
+        Trả về số entry đã xóa
+        """
+        now = time.time()
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        removed = 0
+        # Entry hết hạn được xếp lên đầu, sau đó theo thứ tự dùng gần nhất
+        for _, size, path, mtime in sorted(entries, key=lambda entry: (not self._expired(entry[3], now), entry[0])):
+            if total <= self.max_bytes and not self._expired(mtime, now):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,148 @@
+"""
+Atlas emoji: gom toàn bộ thư mục emojis/ vào một file duy nhất.
+
+- emojis.atlas: nội dung PNG của từng emoji nối liền nhau, đọc bằng mmap (nhỏ hơn thư mục gốc
+  vì không tốn block hệ thống file cho từng file nhỏ)
+- emojis.atlas.json: index mã codepoint -> (offset, độ dài) trong atlas
+
+Khi render, emoji được decode thẳng từ mmap (không stat / mở file), resize một lần cho mỗi
+(codepoint, size) rồi giữ trong cache của process. Không build sẵn các cỡ 200/250/300 px mà
+template dùng: emoji gốc chỉ 72 px, lưu sẵn bản phóng to của ~3700 emoji ở 3 cỡ tốn vài GB
+(RGBA thô) trong khi mỗi slide chỉ dùng vài emoji.
+Chưa build atlas (hoặc atlas cũ hơn thư mục emoji) thì tự động đọc từng file PNG như trước.
+
+Build một lần:
+    python emoji_atlas.py [thư_mục_emoji]
+"""
+import io
+import os
+import sys
+import json
+import mmap
+import functools
+
+from PIL import Image
+
+ATLAS_SUFFIX = ".atlas"
+INDEX_SUFFIX = ".atlas.json"
+# Tăng khi đổi định dạng atlas; atlas định dạng khác bị bỏ qua (đọc file PNG) cho tới khi build lại
+ATLAS_FORMAT = 2
+
+# Số tile đã resize giữ lại trong process, khóa theo (thư mục emoji, codepoint, size)
+EMOJI_TILE_CACHE_SIZE = 512
+
+def emoji_codepoints(emoji_char):
+    """Tên file emoji theo codepoint, vd. '1f1fb-1f1f3'"""
+    return "-".join(f"{ord(c):x}" for c in emoji_char)
+
+def atlas_paths(emoji_dir):
+    emoji_dir = os.path.normpath(emoji_dir)
+    return emoji_dir + ATLAS_SUFFIX, emoji_dir + INDEX_SUFFIX
+
+def build_atlas(emoji_dir):
+    """Đóng gói tất cả emoji PNG trong emoji_dir vào atlas, trả về số emoji đã đóng gói"""
+    atlas_path, index_path = atlas_paths(emoji_dir)
+    filenames = sorted(f for f in os.listdir(emoji_dir) if f.lower().endswith('.png'))
+
+    codepoints = {}
+    offset = 0
+    tmp_atlas_path = atlas_path + ".tmp"
+    with open(tmp_atlas_path, "wb") as f:
+        for filename in filenames:
+            with open(os.path.join(emoji_dir, filename), "rb") as emoji_file:
+                data = emoji_file.read()
+            try:
+                with Image.open(io.BytesIO(data)) as emoji_img:
+                    emoji_img.verify()
+            except Exception as e:
+                print(f"⚠️ Bỏ qua emoji '{filename}': {e}")
+                continue
+            codepoints[os.path.splitext(filename)[0]] = [offset, len(data)]
+            f.write(data)
+            offset += len(data)
+
+    index = {
+        "format": ATLAS_FORMAT,
+        "source_mtime_ns": os.stat(emoji_dir).st_mtime_ns,
+        "codepoints": codepoints,
+    }
+    tmp_index_path = index_path + ".tmp"
+    with open(tmp_index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+
+    os.replace(tmp_atlas_path, atlas_path)
+    os.replace(tmp_index_path, index_path)
+    open_atlas.cache_clear()
+    get_emoji_tile.cache_clear()
+    return len(codepoints)
+
+class EmojiAtlas:
+    """Atlas đã build, đọc emoji theo codepoint qua mmap"""
+
+    def __init__(self, atlas_path, index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("format") != ATLAS_FORMAT:
+            raise ValueError(f"định dạng {index.get('format')}, cần {ATLAS_FORMAT}")
+        self.source_mtime_ns = index["source_mtime_ns"]
+        self.codepoints = index["codepoints"]
+
+        with open(atlas_path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __contains__(self, codepoints):
+        return codepoints in self.codepoints
+
+    def get(self, codepoints):
+        """Emoji RGBA kích thước gốc, None nếu không có trong atlas"""
+        entry = self.codepoints.get(codepoints)
+        if entry is None:
+            return None
+        offset, length = entry
+        with Image.open(io.BytesIO(self._data[offset:offset + length])) as emoji_img:
+            return emoji_img.convert("RGBA")
+
+@functools.lru_cache(maxsize=None)
+def open_atlas(emoji_dir):
+    """Mở atlas của emoji_dir (một lần mỗi process), None nếu chưa build hoặc đã cũ"""
+    atlas_path, index_path = atlas_paths(emoji_dir)
+    if not (os.path.isfile(atlas_path) and os.path.isfile(index_path)):
+        return None
+    try:
+        atlas = EmojiAtlas(atlas_path, index_path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Không đọc được atlas emoji '{atlas_path}': {e}")
+        return None
+    if os.path.isdir(emoji_dir) and os.stat(emoji_dir).st_mtime_ns != atlas.source_mtime_ns:
+        print(f"⚠️ Atlas emoji '{atlas_path}' cũ hơn thư mục '{emoji_dir}', hãy chạy lại emoji_atlas.py")
+        return None
+    return atlas
+
+def load_emoji(emoji_dir, codepoints):
+    """Emoji RGBA kích thước gốc, lấy từ atlas hoặc từ file PNG; None nếu không tìm thấy"""
+    atlas = open_atlas(emoji_dir)
+    if atlas is not None:
+        return atlas.get(codepoints)
+
+    emoji_file = os.path.join(emoji_dir, f"{codepoints}.png")
+    if not os.path.exists(emoji_file):
+        return None
+    with Image.open(emoji_file) as emoji_img:
+        return emoji_img.convert("RGBA")
+
+@functools.lru_cache(maxsize=EMOJI_TILE_CACHE_SIZE)
+def get_emoji_tile(emoji_dir, codepoints, size):
+    """
+    Emoji đã resize về size x size, sẵn sàng để paste; None nếu không tìm thấy.
+    Ảnh trả về dùng chung giữa các lần gọi nên chỉ được đọc.
+    """
+    emoji_img = load_emoji(emoji_dir, codepoints)
+    if emoji_img is None:
+        return None
+    return emoji_img.resize((size, size), Image.LANCZOS)
+
+if __name__ == "__main__":
+    emoji_directory = sys.argv[1] if len(sys.argv) > 1 else "emojis"
+    count = build_atlas(emoji_directory)
+    atlas_file, index_file = atlas_paths(emoji_directory)
+    print(f"✅ Đã đóng gói {count} emoji vào '{atlas_file}' ({os.path.getsize(atlas_file) / 1e6:.1f} MB)")
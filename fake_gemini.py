@@ -0,0 +1,255 @@
+"""
+Backend Gemini giả, chạy hoàn toàn offline: đo hiệu năng pipeline mà không tốn quota.
+
+Cài đúng phần API repo dùng, trả về đúng kiểu dữ liệu của google.genai (types.File,
+types.GenerateContentResponse, errors.ClientError):
+- files.upload / files.get / files.delete
+- models.generate_content: text tất định (cùng đầu vào -> cùng text), prompt đặt tên -> tiêu đề ngắn
+- models.generate_content_stream: model TTS -> PCM giả lập giọng đọc audio/L16;rate=24000
+  (cụm âm cho từng từ, khoảng nghỉ sau câu / đoạn), model text -> text chia thành từng mẩu
+
+Độ trễ (thời gian tới phần đầu tiên, tốc độ sinh, băng thông upload), cỡ chunk audio và lỗi 429
+giả lập đều chỉnh được. time_scale nhân mọi độ trễ (0 = không sleep, chỉ đo CPU).
+
+Dùng qua client dùng chung:
+    genai_client.configure(backend_factory=lambda: FakeGemini(time_scale=0.5))
+hoặc không sửa code:
+    GENAI_BACKEND=fake_gemini:create_backend python video_overview.py --yes --non-interactive
+(các tham số lấy từ biến môi trường FAKE_GEMINI_*, xem create_backend)
+"""
+import os
+import re
+import time
+import random
+import hashlib
+import itertools
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from google.genai import errors, types
+
+SAMPLE_RATE = 24000
+AUDIO_MIME_TYPE = f"audio/L16;codec=pcm;rate={SAMPLE_RATE}"
+FILE_TTL = timedelta(hours=48)
+TITLE_PROMPT_PREFIX = "Give me a short and clear title"
+# prompt_audio.txt kết thúc bằng "Content:", phần sau mới là nội dung cần đọc
+SPOKEN_CONTENT_MARKER = "Content:"
+
+WORDS = (
+    "data model system process signal energy network memory pattern structure method result "
+    "research theory example question answer change growth balance value design layer source "
+    "learning language image sound motion light water market history culture science future"
+).split()
+
+def _seed(*parts):
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+def _content_text(contents):
+    """Text (và tên file) của contents, dùng làm seed và để đọc prompt"""
+    pieces = []
+    for item in contents if isinstance(contents, (list, tuple)) else [contents]:
+        if isinstance(item, str):
+            pieces.append(item)
+        elif isinstance(item, types.File):
+            pieces.append(f"<{item.name}:{item.sha256_hash}>")
+        elif isinstance(item, types.Content):
+            pieces.extend(part.text for part in item.parts or [] if part.text)
+        else:
+            pieces.append(str(item))
+    return "\n".join(pieces)
+
+def fake_sentence(rng, words=(8, 18)):
+    sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(*words)))
+    return sentence[0].upper() + sentence[1:] + rng.choice(".....?!")
+
+def fake_overview(seed, word_count):
+    """Bài viết giả ~word_count từ, chia đoạn bằng dòng trống"""
+    rng = random.Random(seed)
+    paragraphs, count = [], 0
+    while count < word_count:
+        sentences = [fake_sentence(rng) for _ in range(rng.randint(3, 6))]
+        count += sum(len(sentence.split()) for sentence in sentences)
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+def fake_title(seed):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 4)))
+
+def synth_speech(text, seed, words_per_second=2.6):
+    """
+    PCM int16 mono 24 kHz giả lập giọng đọc text: mỗi từ là một cụm âm (độ dài theo số ký tự),
+    cách nhau khoảng lặng ngắn; sau dấu câu / xuống đoạn có khoảng nghỉ dài hơn
+    """
+    rng = np.random.default_rng(seed)
+    word_seconds = 1.0 / words_per_second
+    pieces = []
+    for token in re.findall(r"\S+|\n\s*\n", text):
+        if not token.strip():
+            pieces.append(np.zeros(int(0.7 * SAMPLE_RATE), dtype=np.int16))
+            continue
+        length = int(SAMPLE_RATE * word_seconds * min(1.6, max(0.5, len(token) / 6)) * 0.8)
+        envelope = np.sin(np.linspace(0, np.pi, length, dtype=np.float32))
+        tone = np.sin(np.arange(length, dtype=np.float32) * (2 * np.pi * rng.uniform(110, 220) / SAMPLE_RATE))
+        word = (tone * 0.6 + rng.standard_normal(length).astype(np.float32) * 0.4) * envelope * 6000
+        pieces.append(word.astype(np.int16))
+        gap = 0.45 if token[-1] in ".?!" else 0.06
+        pieces.append(np.zeros(int(gap * SAMPLE_RATE), dtype=np.int16))
+    if not pieces:
+        return b""
+    return np.concatenate(pieces).astype("<i2").tobytes()
+
+def _response(part):
+    return types.GenerateContentResponse(candidates=[types.Candidate(
+        content=types.Content(role="model", parts=[part]),
+    )])
+
+def rate_limit_error(retry_delay=1):
+    return errors.ClientError(429, {"error": {
+        "code": 429,
+        "message": "Resource has been exhausted (fake).",
+        "status": "RESOURCE_EXHAUSTED",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_delay}s"}],
+    }})
+
+class FakeFiles:
+    def __init__(self, backend):
+        self._backend = backend
+        self._files = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def upload(self, *, file, config=None):
+        self._backend.maybe_fail("upload")
+        with open(file, "rb") as f:
+            data = f.read()
+        self._backend.sleep(self._backend.upload_latency + len(data) / self._backend.upload_bytes_per_second)
+        with self._lock:
+            name = f"files/fake-{next(self._counter)}"
+            uploaded = types.File(
+                name=name,
+                display_name=os.path.basename(file),
+                uri=f"https://fake.generativelanguage/v1beta/{name}",
+                mime_type="application/pdf" if file.lower().endswith(".pdf") else "application/octet-stream",
+                size_bytes=len(data),
+                sha256_hash=hashlib.sha256(data).hexdigest(),
+                state=types.FileState.ACTIVE,
+                create_time=datetime.now(timezone.utc),
+                expiration_time=datetime.now(timezone.utc) + FILE_TTL,
+            )
+            self._files[name] = uploaded
+        return uploaded
+
+    def get(self, *, name, config=None):
+        with self._lock:
+            uploaded = self._files.get(name)
+        if uploaded is None:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": f"{name} not found", "status": "NOT_FOUND"}})
+        return uploaded
+
+    def delete(self, *, name, config=None):
+        with self._lock:
+            self._files.pop(name, None)
+
+class FakeModels:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def _is_tts(self, model, config):
+        modalities = [str(modality).lower() for modality in (getattr(config, "response_modalities", None) or [])]
+        return "tts" in model or "audio" in modalities
+
+    def _text_for(self, model, prompt):
+        backend = self._backend
+        if prompt.startswith(TITLE_PROMPT_PREFIX):
+            return fake_title(_seed(model, prompt))
+        return fake_overview(_seed(model, prompt), backend.overview_words)
+
+    def generate_content(self, *, model, contents, config=None):
+        backend = self._backend
+        backend.maybe_fail("text")
+        text = self._text_for(model, _content_text(contents))
+        backend.sleep(backend.text_first_token_latency + len(text.split()) / backend.text_words_per_second)
+        return _response(types.Part(text=text))
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        backend = self._backend
+        backend.maybe_fail("tts" if self._is_tts(model, config) else "text")
+        prompt = _content_text(contents)
+        if self._is_tts(model, config):
+            return self._stream_audio(model, prompt)
+        return self._stream_text(model, prompt)
+
+    def _stream_audio(self, model, prompt):
+        backend = self._backend
+        spoken = prompt.rsplit(SPOKEN_CONTENT_MARKER, 1)[-1].strip()
+        pcm = synth_speech(spoken, _seed(model, prompt), backend.words_per_second)
+        chunk_bytes = max(2, int(SAMPLE_RATE * backend.audio_chunk_seconds) * 2)
+        backend.sleep(backend.tts_first_chunk_latency)
+        for offset in range(0, len(pcm), chunk_bytes):
+            data = pcm[offset:offset + chunk_bytes]
+            # Sinh audio nhanh hơn thời gian thực tts_realtime_factor lần
+            backend.sleep(len(data) / 2 / SAMPLE_RATE / backend.tts_realtime_factor)
+            yield _response(types.Part(inline_data=types.Blob(data=data, mime_type=AUDIO_MIME_TYPE)))
+
+    def _stream_text(self, model, prompt):
+        backend = self._backend
+        words = re.findall(r"\S+\s*", self._text_for(model, prompt))
+        backend.sleep(backend.text_first_token_latency)
+        for start in range(0, len(words), backend.text_chunk_words):
+            piece = "".join(words[start:start + backend.text_chunk_words])
+            backend.sleep(len(words[start:start + backend.text_chunk_words]) / backend.text_words_per_second)
+            yield _response(types.Part(text=piece))
+
+class FakeGemini:
+    """
+    Backend giả có .files / .models như genai.Client. Độ trễ tính bằng giây (trước khi nhân time_scale).
+    rate_limit_every: cứ mỗi N lời gọi của một loại API ("upload" / "text" / "tts") thì lời gọi thứ N
+    bị 429 (0 = không bao giờ)
+    """
+    def __init__(self, time_scale=1.0, upload_latency=0.2, upload_bytes_per_second=20e6,
+                 text_first_token_latency=0.5, text_words_per_second=300, text_chunk_words=12, overview_words=1100,
+                 tts_first_chunk_latency=0.8, tts_realtime_factor=20.0, audio_chunk_seconds=2.0,
+                 words_per_second=2.6, rate_limit_every=0, rate_limit_delay=1):
+        self.time_scale = time_scale
+        self.upload_latency = upload_latency
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.text_first_token_latency = text_first_token_latency
+        self.text_words_per_second = text_words_per_second
+        self.text_chunk_words = text_chunk_words
+        self.overview_words = overview_words
+        self.tts_first_chunk_latency = tts_first_chunk_latency
+        self.tts_realtime_factor = tts_realtime_factor
+        self.audio_chunk_seconds = audio_chunk_seconds
+        self.words_per_second = words_per_second
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_delay = rate_limit_delay
+        self.calls = {"upload": 0, "text": 0, "tts": 0}
+        self._calls_lock = threading.Lock()
+        self.files = FakeFiles(self)
+        self.models = FakeModels(self)
+
+    def sleep(self, seconds):
+        if self.time_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def maybe_fail(self, api):
+        with self._calls_lock:
+            self.calls[api] += 1
+            count = self.calls[api]
+        if self.rate_limit_every and count % self.rate_limit_every == 0:
+            raise rate_limit_error(self.rate_limit_delay)
+
+def create_backend():
+    """Factory cho GENAI_BACKEND=fake_gemini:create_backend, tham số lấy từ biến môi trường FAKE_GEMINI_*"""
+    def env(name, default):
+        return type(default)(os.environ.get(f"FAKE_GEMINI_{name}", default))
+    return FakeGemini(
+        time_scale=env("TIME_SCALE", 1.0),
+        overview_words=env("OVERVIEW_WORDS", 1100),
+        tts_realtime_factor=env("TTS_REALTIME_FACTOR", 20.0),
+        audio_chunk_seconds=env("AUDIO_CHUNK_SECONDS", 2.0),
+        rate_limit_every=env("RATE_LIMIT_EVERY", 0),
+    )
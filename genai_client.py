@@ -0,0 +1,180 @@
+"""
+Client Gemini dùng chung cho cả tiến trình.
+
+get_client() trả về một ManagedClient duy nhất (tạo ở lần gọi đầu, an toàn giữa các thread) bọc
+backend thật: một genai.Client, tức một pool kết nối HTTP (httpx) được dùng lại cho mọi lời gọi.
+Mọi lời gọi API trong repo đi qua đây nên timeout, retry và rate limit được xử lý ở một chỗ:
+
+- Timeout: GENAI_TIMEOUT_MS (mặc định 10 phút, một request TTS dài có thể mất vài phút).
+- Retry lỗi rate limit (429) / lỗi server (5xx) với backoff có jitter hoặc retryDelay của server,
+  sau 429 mọi worker cùng loại API đều tạm dừng (api_retry.RateLimiter).
+- Giới hạn số lời gọi đồng thời và (tùy chọn) số request mỗi phút cho từng loại API:
+  "upload" (files.*), "text" (generate_content) và "tts" (model có "tts" trong tên).
+  Stream chỉ được retry tới khi nhận phần đầu tiên; slot được giữ tới khi đọc hết stream.
+
+Backend thay được (cho test / benchmark không cần mạng):
+- GENAI_BACKEND="module:hàm" (hoặc configure(backend_factory=...)): hàm không tham số trả về object
+  có .files / .models như genai.Client.
+- GEMINI_BASE_URL: dùng genai.Client thật nhưng trỏ tới endpoint khác, ví dụ server giả chạy local.
+"""
+import os
+import importlib
+import threading
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+from api_retry import MAX_RETRIES, RateLimiter, call_with_retry
+
+load_dotenv()
+
+BACKEND_ENV = "GENAI_BACKEND"
+BASE_URL_ENV = "GEMINI_BASE_URL"
+TIMEOUT_MS = int(os.environ.get("GENAI_TIMEOUT_MS") or 600_000)
+
+# concurrency: số lời gọi đồng thời tối đa, requests_per_minute: 0 = không giới hạn
+ApiLimits = namedtuple("ApiLimits", ["concurrency", "requests_per_minute"])
+
+DEFAULT_LIMITS = {
+    "upload": ApiLimits(8, 0),
+    "text": ApiLimits(4, 0),
+    "tts": ApiLimits(4, int(os.environ.get("TTS_REQUESTS_PER_MINUTE") or 0)),
+}
+
+_EMPTY = object()
+
+def load_backend_factory(spec):
+    """Hàm tạo backend từ chuỗi "module:hàm" """
+    module_name, _, attribute = spec.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"{BACKEND_ENV} phải có dạng 'module:hàm', nhận '{spec}'")
+    return getattr(importlib.import_module(module_name), attribute)
+
+def create_gemini_backend(limits=None):
+    """genai.Client thật, pool kết nối đủ lớn cho tổng số lời gọi đồng thời"""
+    import httpx
+    from google import genai
+    from google.genai import types
+
+    connections = sum(limit.concurrency for limit in (limits or DEFAULT_LIMITS).values())
+    return genai.Client(
+        api_key=os.environ.get("GEMINI_API_KEY"),
+        http_options=types.HttpOptions(
+            timeout=TIMEOUT_MS,
+            base_url=os.environ.get(BASE_URL_ENV) or None,
+            client_args={"limits": httpx.Limits(max_connections=connections,
+                                                max_keepalive_connections=connections)},
+        ),
+    )
+
+class ApiPolicy:
+    """Giới hạn đồng thời + nhịp request + retry cho một loại API"""
+    def __init__(self, limits, max_retries=MAX_RETRIES):
+        self.semaphore = threading.BoundedSemaphore(limits.concurrency)
+        self.limiter = RateLimiter(limits.requests_per_minute)
+        self.max_retries = max_retries
+
+    def call(self, function, description, **kwargs):
+        def attempt():
+            with self.semaphore:
+                return function(**kwargs)
+        return call_with_retry(attempt, limiter=self.limiter, max_retries=self.max_retries, description=description)
+
+    def stream(self, function, description, **kwargs):
+        def open_stream():
+            # Slot chỉ được giữ trong lúc thử (không giữ lúc chờ retry); lần thử thành công giữ tiếp
+            # slot cho tới khi đọc hết stream. Request thật sự được gửi khi đọc phần đầu tiên
+            self.semaphore.acquire()
+            try:
+                iterator = iter(function(**kwargs))
+                return iterator, next(iterator, _EMPTY)
+            except BaseException:
+                self.semaphore.release()
+                raise
+
+        iterator, first = call_with_retry(open_stream, limiter=self.limiter, max_retries=self.max_retries,
+                                          description=description)
+        try:
+            if first is _EMPTY:
+                return
+            yield first
+            yield from iterator
+        finally:
+            self.semaphore.release()
+
+class _ManagedFiles:
+    def __init__(self, files, policy):
+        self._files = files
+        self._policy = policy
+
+    def upload(self, **kwargs):
+        return self._policy.call(self._files.upload, f"Upload {kwargs.get('file')}", **kwargs)
+
+    def get(self, **kwargs):
+        return self._policy.call(self._files.get, f"Lookup {kwargs.get('name')}", **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._files, name)
+
+class _ManagedModels:
+    def __init__(self, models, policies):
+        self._models = models
+        self._policies = policies
+
+    def _policy(self, model):
+        return self._policies["tts" if "tts" in str(model) else "text"]
+
+    def generate_content(self, *, model, **kwargs):
+        return self._policy(model).call(self._models.generate_content, f"{model} request", model=model, **kwargs)
+
+    def generate_content_stream(self, *, model, **kwargs):
+        return self._policy(model).stream(self._models.generate_content_stream, f"{model} request",
+                                          model=model, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+class ManagedClient:
+    """Bọc một backend (genai.Client hoặc backend giả) với ApiPolicy cho từng loại API"""
+    def __init__(self, backend, limits=None, max_retries=MAX_RETRIES):
+        self.backend = backend
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.policies = {api: ApiPolicy(api_limits, max_retries) for api, api_limits in limits.items()}
+        # Backend giả có thể chỉ cài một phần API (ví dụ chỉ models cho benchmark TTS)
+        if hasattr(backend, "files"):
+            self.files = _ManagedFiles(backend.files, self.policies["upload"])
+        if hasattr(backend, "models"):
+            self.models = _ManagedModels(backend.models, self.policies)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+_client = None
+_client_lock = threading.Lock()
+_settings = {"backend_factory": None, "limits": None, "max_retries": MAX_RETRIES}
+
+def configure(backend_factory=None, limits=None, max_retries=MAX_RETRIES):
+    """
+    Đổi backend / giới hạn cho client dùng chung; client hiện có (nếu có) bị bỏ, lần get_client() sau tạo lại.
+    limits: dict loại API -> ApiLimits, chỉ cần các loại muốn đổi
+    """
+    global _client
+    with _client_lock:
+        _settings.update(backend_factory=backend_factory, limits=limits, max_retries=max_retries)
+        _client = None
+
+def create_backend():
+    factory = _settings["backend_factory"]
+    if factory is None and os.environ.get(BACKEND_ENV):
+        factory = load_backend_factory(os.environ[BACKEND_ENV])
+    if factory is not None:
+        return factory()
+    return create_gemini_backend({**DEFAULT_LIMITS, **(_settings["limits"] or {})})
+
+def get_client():
+    """Client dùng chung của tiến trình"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ManagedClient(create_backend(), _settings["limits"], _settings["max_retries"])
+        return _client
@@ -2,38 +2,190 @@ import base64
 import mimetypes
 import os
 import re
+import shutil
 import struct
-from google import genai
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from google.genai import types
 from dotenv import load_dotenv
+from disk_cache import DiskCache, cache_key
+from genai_client import get_client as get_shared_client
+from timing import PCM_DTYPE, split_sentences
 load_dotenv()
 Language = os.environ.get("LANGUAGE")
 
+TTS_MODEL = "gemini-2.5-flash-preview-tts"
+TTS_VOICE = "Puck"
+TTS_TEMPERATURE = 1
+
+# Synthesized audio is cached on disk, keyed by everything that shapes it, so
+# re-running the pipeline on the same script does not call the API again.
+# 1 GiB holds roughly 6 hours of 24 kHz mono PCM.
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR") or os.path.join(".cache", "tts")
+TTS_CACHE_MAX_BYTES = 1024 ** 3
+# Bump when the entry format or request shape changes
+TTS_CACHE_VERSION = 1
+
+# Chunked mode: the script is split at paragraph / sentence boundaries and the
+# chunks are synthesized concurrently. The first chunk is kept short so the
+# first audio lands on disk quickly; later chunks can be longer.
+TTS_CHUNK_CHARS = 900
+TTS_FIRST_CHUNK_CHARS = 300
+# Retries, rate limiting and the process-wide TTS concurrency cap live in
+# genai_client; this only bounds the threads of one generate() call
+TTS_MAX_WORKERS = 4
+# Overlap between consecutive chunks, long enough to hide a click at the seam
+# but well under a syllable
+CROSSFADE_MS = 30
+
 def save_binary_file(file_name, data):
     f = open(file_name, "wb")
     f.write(data)
     f.close()
 
 
-def generate(content = None, customize = "", name_file="AUDIO_OVERVIEW"):
-    if not content:
+class WavStreamWriter:
+    """Streams raw PCM chunks into a WAV file as they arrive.
+
+    A placeholder header is written on open, each chunk is appended as-is
+    (no header + data concatenation, nothing kept in memory), and the
+    RIFF / data chunk sizes are patched in on close. If generation fails
+    midway, closing still leaves a valid WAV with the audio received so far.
+    """
+
+    def __init__(self, file_name, sample_rate=24000, bits_per_sample=16, num_channels=1):
+        self.file_name = file_name
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.num_channels = num_channels
+        self.data_size = 0
+        self._file = open(file_name, "wb")
+        self._file.write(wav_header(0, sample_rate, bits_per_sample, num_channels))
+
+    @classmethod
+    def from_mime_type(cls, file_name, mime_type):
+        """Opens a writer with the rate / sample size of an audio MIME type like "audio/L16;rate=24000"."""
+        parameters = parse_audio_mime_type(mime_type)
+        return cls(file_name, parameters["rate"], parameters["bits_per_sample"])
+
+    def write(self, audio_data):
+        self._file.write(audio_data)
+        self.data_size += len(audio_data)
+
+    def close(self):
+        if self._file.closed:
+            return
+        # Patch ChunkSize (offset 4) and Subchunk2Size (offset 40)
+        self._file.seek(4)
+        self._file.write(struct.pack("<I", 36 + self.data_size))
+        self._file.seek(40)
+        self._file.write(struct.pack("<I", self.data_size))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PcmCrossfader:
+    """Joins consecutive 16-bit PCM chunks with a short linear crossfade.
+
+    The last `crossfade_ms` of each chunk is held back until the next chunk
+    arrives and is then mixed with its head, so the returned bytes can be
+    written straight to a WavStreamWriter in order. Call finish() after the
+    last chunk to flush the held-back tail.
+    """
+
+    def __init__(self, sample_rate=24000, num_channels=1, crossfade_ms=CROSSFADE_MS):
+        self.num_channels = num_channels
+        self.overlap = int(sample_rate * crossfade_ms / 1000) * num_channels
+        self._tail = np.empty(0, dtype=PCM_DTYPE)
+
+    def _fade_in(self, sample_count):
+        frames = sample_count // self.num_channels
+        ramp = np.linspace(0.0, 1.0, frames + 2, dtype=np.float32)[1:-1]
+        return np.repeat(ramp, self.num_channels)
+
+    def add(self, pcm):
+        samples = np.frombuffer(pcm, dtype=PCM_DTYPE)
+        head = np.empty(0, dtype=PCM_DTYPE)
+        overlap = min(len(self._tail), len(samples))
+        overlap -= overlap % self.num_channels
+        if overlap:
+            fade_in = self._fade_in(overlap)
+            tail = self._tail[len(self._tail) - overlap:].astype(np.float32)
+            mixed = tail * (1.0 - fade_in) + samples[:overlap].astype(np.float32) * fade_in
+            mixed = np.clip(np.rint(mixed), -32768, 32767).astype(PCM_DTYPE)
+            head = np.concatenate((self._tail[:len(self._tail) - overlap], mixed))
+            samples = samples[overlap:]
+        else:
+            head = self._tail
+        keep = min(self.overlap, len(samples))
+        keep -= keep % self.num_channels
+        body = samples[:len(samples) - keep]
+        self._tail = samples[len(samples) - keep:].copy()
+        return head.tobytes() + body.tobytes()
+
+    def finish(self):
+        tail, self._tail = self._tail, np.empty(0, dtype=PCM_DTYPE)
+        return tail.tobytes()
+
+
+_tts_cache = None
+
+def get_tts_cache():
+    """The shared on-disk TTS cache, created on first use."""
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = DiskCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, suffix=".audio")
+    return _tts_cache
+
+def resolve_cache(cache):
+    """None -> the shared cache, False -> caching disabled, otherwise the given DiskCache."""
+    if cache is None:
+        return get_tts_cache()
+    return cache or None
+
+def tts_cache_key(chunk, prompt_text, customize="", voice_name=TTS_VOICE, model=TTS_MODEL,
+                  temperature=TTS_TEMPERATURE):
+    return cache_key("tts", TTS_CACHE_VERSION, model, voice_name, temperature, prompt_text, customize, chunk)
+
+def open_cached_audio(cache, key):
+    """Opens a cached entry.
+
+    Entries are the MIME type on the first line followed by the audio bytes.
+
+    Returns:
+        A (file, mime_type) tuple with the file positioned at the audio bytes,
+        or None on a miss.
+    """
+    if cache is None:
         return None
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
+    f = cache.open(key)
+    if f is None:
+        return None
+    return f, f.readline().decode("ascii").strip()
 
-    model = "gemini-2.5-flash-preview-tts"
-    
-    # Đọc prompt từ file
+def store_cached_audio(cache, key, audio_data, mime_type):
+    with cache.writer(key) as writer:
+        writer.write(f"{mime_type}\n".encode("ascii"))
+        writer.write(audio_data)
+
+
+def read_audio_prompt():
     with open("prompt_audio.txt", "r", encoding="utf-8") as f:
-        prompt_text = f.read()
-    
-    # Tạo nội dung text hoàn chỉnh
+        return f.read()
+
+def build_tts_text(prompt_text, content, customize=""):
     full_text = f"{prompt_text}\n{content}"
     if customize:
         full_text += f"\n{customize}"
-    
-    contents = [
+    return full_text
+
+def build_tts_contents(full_text):
+    return [
         types.Content(
             role="user",
             parts=[
@@ -41,28 +193,79 @@ def generate(content = None, customize = "", name_file="AUDIO_OVERVIEW"):
             ],
         ),
     ]
-    
-    generate_content_config = types.GenerateContentConfig(
-        temperature=1,
+
+def build_tts_config(voice_name=TTS_VOICE, temperature=TTS_TEMPERATURE):
+    return types.GenerateContentConfig(
+        temperature=temperature,
         response_modalities=[
             "audio",
         ],
         speech_config=types.SpeechConfig(
             voice_config=types.VoiceConfig(
                 prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                    voice_name="Puck"
+                    voice_name=voice_name
                 )
             )
         ),
     )
 
-    file_index = 0
-    audio_file_name = None
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    ):
+
+def iter_script_chunks(paragraphs, max_chars=TTS_CHUNK_CHARS, first_chunk_chars=TTS_FIRST_CHUNK_CHARS):
+    """Packs paragraphs into TTS chunks, yielding each chunk as soon as it is complete.
+
+    Whole paragraphs are packed together while they fit; a paragraph that does
+    not fit is split into sentences. A single sentence longer than the limit
+    becomes a chunk of its own. The first chunk uses the smaller
+    `first_chunk_chars` limit so it comes back from the API sooner.
+
+    Args:
+        paragraphs: Iterable of paragraph strings; may be a stream that is
+            still being generated (see generate_text.OverviewStream.paragraphs).
+        max_chars: Target maximum length of a chunk.
+        first_chunk_chars: Target maximum length of the first chunk.
+
+    Yields:
+        Non-empty chunk strings, in reading order.
+    """
+    started = False
+    current = ""
+    for paragraph in paragraphs:
+        sentences = split_sentences(paragraph)
+        if not sentences:
+            continue
+        whole = " ".join(sentences)
+        limit = max_chars if started else first_chunk_chars
+        units = [whole] if len(whole) <= limit else sentences
+        separator = "\n\n"
+        for unit in units:
+            limit = max_chars if started else first_chunk_chars
+            if current and len(current) + len(separator) + len(unit) > limit:
+                yield current
+                started = True
+                current = ""
+            current = f"{current}{separator}{unit}" if current else unit
+            separator = " "
+    if current:
+        yield current
+
+
+def split_script(content, max_chars=TTS_CHUNK_CHARS, first_chunk_chars=TTS_FIRST_CHUNK_CHARS):
+    """Splits a narration script into TTS chunks at paragraph or sentence boundaries.
+
+    Args:
+        content: The script text; paragraphs are separated by blank lines.
+        max_chars: Target maximum length of a chunk.
+        first_chunk_chars: Target maximum length of the first chunk.
+
+    Returns:
+        A list of non-empty chunk strings, in reading order (see iter_script_chunks).
+    """
+    return list(iter_script_chunks(re.split(r"\n\s*\n", content), max_chars, first_chunk_chars))
+
+
+def iter_audio_parts(stream):
+    """Yields (data, mime_type) for every inline audio part of a generate_content_stream response."""
+    for chunk in stream:
         if (
             chunk.candidates is None
             or chunk.candidates[0].content is None
@@ -70,19 +273,199 @@ def generate(content = None, customize = "", name_file="AUDIO_OVERVIEW"):
         ):
             continue
         if chunk.candidates[0].content.parts[0].inline_data and chunk.candidates[0].content.parts[0].inline_data.data:
-            file_name = name_file
-            file_index += 1
             inline_data = chunk.candidates[0].content.parts[0].inline_data
-            data_buffer = inline_data.data
-            file_extension = mimetypes.guess_extension(inline_data.mime_type)
-            if file_extension is None:
-                file_extension = ".wav"
-                data_buffer = convert_to_wav(inline_data.data, inline_data.mime_type)
-            full_file_name = f"{file_name}{file_extension}"
-            save_binary_file(full_file_name, data_buffer)
-            audio_file_name = full_file_name
+            yield inline_data.data, inline_data.mime_type
         else:
             print(chunk.text)
+
+def synthesize_chunk(client, full_text, model=TTS_MODEL, voice_name=TTS_VOICE):
+    """Synthesizes one chunk.
+
+    Args:
+        client: A genai_client.ManagedClient (or any object with the same models API).
+        full_text: Prompt + chunk text to speak.
+        model: TTS model name.
+        voice_name: Prebuilt voice name.
+
+    Returns:
+        A (pcm_bytes, mime_type) tuple.
+    """
+    pieces = []
+    mime_type = None
+    for data, part_mime_type in iter_audio_parts(client.models.generate_content_stream(
+        model=model,
+        contents=build_tts_contents(full_text),
+        config=build_tts_config(voice_name),
+    )):
+        mime_type = mime_type or part_mime_type
+        pieces.append(data)
+    if not pieces:
+        raise RuntimeError("TTS response contained no audio")
+    return b"".join(pieces), mime_type
+
+def synthesize_chunk_cached(get_client, full_text, key, cache=None):
+    """Returns the cached (pcm_bytes, mime_type) for `key`, synthesizing and storing it on a miss."""
+    cached = open_cached_audio(cache, key)
+    if cached is not None:
+        f, mime_type = cached
+        with f:
+            return f.read(), mime_type
+    pcm, mime_type = synthesize_chunk(get_client(), full_text)
+    if cache is not None:
+        store_cached_audio(cache, key, pcm, mime_type)
+    return pcm, mime_type
+
+
+def generate_chunked(content, customize="", name_file="AUDIO_OVERVIEW", client=None,
+                     max_workers=TTS_MAX_WORKERS, max_chars=TTS_CHUNK_CHARS, first_chunk_chars=TTS_FIRST_CHUNK_CHARS,
+                     crossfade_ms=CROSSFADE_MS, cache=None):
+    """Synthesizes the script as concurrent chunks and stitches them into one WAV.
+
+    Chunks are requested from a bounded worker pool; retries and rate limits
+    are handled by the shared client (genai_client). Results are written in script order as soon as each one (and
+    every chunk before it) is ready, so the first audio is on disk after the
+    first, short chunk instead of after the whole script. Seams are joined
+    with a short crossfade. Each chunk is looked up in the TTS cache first
+    (see resolve_cache), and the API client is only fetched on a miss.
+
+    `content` may also be an iterable of paragraphs that are still being
+    generated: each chunk is submitted as soon as its paragraphs have arrived,
+    so synthesis starts on the opening paragraphs while the rest of the text
+    is still streaming in. The chunks are the same as for the finished text.
+
+    Returns:
+        The WAV file name, or None if there was nothing to say.
+    """
+    if isinstance(content, str):
+        chunks = split_script(content, max_chars, first_chunk_chars)
+        max_workers = min(max_workers, len(chunks))
+    else:
+        chunks = iter_script_chunks(content, max_chars, first_chunk_chars)
+    cache = resolve_cache(cache)
+    prompt_text = read_audio_prompt()
+
+    def get_client():
+        return client or get_shared_client()
+
+    audio_file_name = f"{name_file}.wav"
+    writer = None
+    crossfader = None
+    futures = []
+    written = 0
+
+    def write_ready(block):
+        # Writes finished chunks in script order; without block, stops at the first one still running
+        nonlocal writer, crossfader, written
+        while written < len(futures) and (block or futures[written].done()):
+            pcm, mime_type = futures[written].result()
+            written += 1
+            if mimetypes.guess_extension(mime_type) is not None:
+                raise ValueError(f"Chunked TTS needs raw PCM audio, got {mime_type}")
+            if writer is None:
+                writer = WavStreamWriter.from_mime_type(audio_file_name, mime_type)
+                crossfader = PcmCrossfader(writer.sample_rate, writer.num_channels, crossfade_ms)
+            elif parse_audio_mime_type(mime_type)["rate"] != writer.sample_rate:
+                raise ValueError(f"Chunk {written} has a different sample rate: {mime_type}")
+            writer.write(crossfader.add(pcm))
+            print(f"[AUDIO] Chunk {written} written")
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        try:
+            for chunk in chunks:
+                futures.append(executor.submit(synthesize_chunk_cached, get_client,
+                                               build_tts_text(prompt_text, chunk, customize),
+                                               tts_cache_key(chunk, prompt_text, customize), cache))
+                write_ready(block=False)
+            write_ready(block=True)
+            if writer is not None:
+                writer.write(crossfader.finish())
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            if writer is not None:
+                writer.close()
+    if writer is None:
+        return None
+    print(f"[AUDIO] {written} chunks stitched into {audio_file_name}")
+    return audio_file_name
+
+
+def open_audio_sink(name_file, mime_type):
+    """Opens the output file for audio of the given MIME type; returns (file_name, sink)."""
+    file_extension = mimetypes.guess_extension(mime_type)
+    if file_extension is None:
+        # Raw PCM (audio/L16): stream into a WAV container
+        audio_file_name = f"{name_file}.wav"
+        return audio_file_name, WavStreamWriter.from_mime_type(audio_file_name, mime_type)
+    # Already a container format: append the bytes as they come
+    audio_file_name = f"{name_file}{file_extension}"
+    return audio_file_name, open(audio_file_name, "wb")
+
+
+def generate(content = None, customize = "", name_file="AUDIO_OVERVIEW", client=None, chunked=False,
+             max_workers=TTS_MAX_WORKERS, cache=None):
+    if not content:
+        return None
+    if chunked:
+        return generate_chunked(content, customize, name_file, client, max_workers, cache=cache)
+    if not isinstance(content, str):
+        # Paragraphs of a streamed script: a single request needs the whole text
+        content = "\n\n".join(content)
+    cache = resolve_cache(cache)
+
+    model = TTS_MODEL
+    
+    # Đọc prompt từ file
+    prompt_text = read_audio_prompt()
+
+    # Cùng script, prompt, giọng đọc: lấy lại audio đã tạo thay vì gọi API
+    key = tts_cache_key(content, prompt_text, customize)
+    cached = open_cached_audio(cache, key)
+    if cached is not None:
+        f, mime_type = cached
+        with f:
+            audio_file_name, audio_sink = open_audio_sink(name_file, mime_type)
+            with audio_sink:
+                shutil.copyfileobj(f, audio_sink)
+        return audio_file_name
+    client = client or get_shared_client()
+    
+    # Tạo nội dung text hoàn chỉnh
+    full_text = build_tts_text(prompt_text, content, customize)
+    
+    contents = build_tts_contents(full_text)
+    
+    generate_content_config = build_tts_config()
+
+    audio_file_name = None
+    # Opened on the first audio chunk; every later chunk is appended to the same file
+    audio_sink = None
+    # The stream is also teed into the cache; the entry is only committed if it completes
+    cache_writer = None
+    try:
+        for data, mime_type in iter_audio_parts(client.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=generate_content_config,
+        )):
+            if audio_sink is None:
+                audio_file_name, audio_sink = open_audio_sink(name_file, mime_type)
+                if cache is not None:
+                    cache_writer = cache.writer(key)
+                    cache_writer.write(f"{mime_type}\n".encode("ascii"))
+            audio_sink.write(data)
+            if cache_writer is not None:
+                cache_writer.write(data)
+        if cache_writer is not None:
+            cache_writer.commit()
+            cache_writer = None
+    finally:
+        if cache_writer is not None:
+            cache_writer.discard()
+        if audio_sink is not None:
+            audio_sink.close()
     return audio_file_name
 
 def convert_to_wav(audio_data: bytes, mime_type: str) -> bytes:
@@ -96,10 +479,21 @@ def convert_to_wav(audio_data: bytes, mime_type: str) -> bytes:
         A bytes object representing the WAV file header.
     """
     parameters = parse_audio_mime_type(mime_type)
-    bits_per_sample = parameters["bits_per_sample"]
-    sample_rate = parameters["rate"]
-    num_channels = 1
-    data_size = len(audio_data)
+    header = wav_header(len(audio_data), parameters["rate"], parameters["bits_per_sample"])
+    return header + audio_data
+
+def wav_header(data_size: int, sample_rate: int, bits_per_sample: int, num_channels: int = 1) -> bytes:
+    """Builds the 44-byte header of a PCM WAV file.
+
+    Args:
+        data_size: Size of the audio data in bytes.
+        sample_rate: Samples per second.
+        bits_per_sample: Bits per sample (16 for L16).
+        num_channels: Number of channels.
+
+    Returns:
+        The WAV header as a bytes object.
+    """
     bytes_per_sample = bits_per_sample // 8
     block_align = num_channels * bytes_per_sample
     byte_rate = sample_rate * block_align
@@ -123,7 +517,7 @@ def convert_to_wav(audio_data: bytes, mime_type: str) -> bytes:
         b"data",          # Subchunk2ID
         data_size         # Subchunk2Size (size of audio data)
     )
-    return header + audio_data
+    return header
 
 def parse_audio_mime_type(mime_type: str) -> dict[str, int | None]:
     """Parses bits per sample and rate from an audio MIME type string.
@@ -1,53 +1,303 @@
 import os
 import re
-from google import genai
-from dotenv import load_dotenv
+import uuid
+import asyncio
+import threading
+from disk_cache import DiskCache, cache_key, file_sha256
+from genai_client import get_client as get_shared_client
+
+MODEL = "gemini-2.5-flash-lite"
+
+# Cache câu trả lời của model trên đĩa: cùng model, prompt, tài liệu và ngôn ngữ thì dùng lại kết quả,
+# không gọi API (và không tốn phí) lần nữa. Đổi customize_audio không ảnh hưởng tới bước này
+TEXT_CACHE_DIR = os.environ.get("TEXT_CACHE_DIR") or os.path.join(".cache", "text")
+TEXT_CACHE_MAX_BYTES = 64 * 1024 ** 2
+TEXT_CACHE_TTL = 7 * 24 * 3600
+# Tăng khi đổi cách tạo key / định dạng entry
+TEXT_CACHE_VERSION = 1
+# Dòng trống ngăn cách các đoạn văn (giống generate_audio.split_script)
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+_text_cache = None
+
+def get_text_cache():
+    """Cache câu trả lời dùng chung, tạo ở lần dùng đầu tiên"""
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = DiskCache(TEXT_CACHE_DIR, TEXT_CACHE_MAX_BYTES, suffix=".txt", ttl=TEXT_CACHE_TTL)
+    return _text_cache
+
+def resolve_cache(cache):
+    """None -> cache dùng chung, False -> không cache, còn lại là DiskCache được truyền vào"""
+    if cache is None:
+        return get_text_cache()
+    return cache or None
+
+def document_fingerprint(document):
+    """
+    Hash nội dung một tài liệu: đường dẫn file local thì hash nội dung file,
+    file đã upload (genai File) thì dùng sha256_hash do API trả về
+    """
+    if isinstance(document, (str, os.PathLike)) and os.path.isfile(document):
+        return file_sha256(document)
+    sha256_hash = getattr(document, "sha256_hash", None)
+    if sha256_hash:
+        return sha256_hash
+    # Không có hash nội dung: dùng định danh của file (kém chính xác hơn nhưng không bao giờ trả nhầm tài liệu khác)
+    return getattr(document, "uri", None) or getattr(document, "name", None) or str(document)
+
+def cached_generate(get_client, model, contents, key, cache):
+    """Text trả lời của model cho contents, lấy từ cache nếu có"""
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.decode("utf-8")
+    text = get_client().models.generate_content(model=model, contents=contents).text
+    if cache is not None and text:
+        cache.put(key, text.encode("utf-8"))
+    return text
 
 def sanitize_filename(name):
     """Loại bỏ ký tự không hợp lệ và giới hạn độ dài"""
     name = re.sub(r'[\\/*?:"<>|]', "_", name)
     return name.strip()[:50]
 
-def generate(document=[], customize=""):
-    load_dotenv()
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
+def client_getter(client=None):
+    """Hàm trả về client (mặc định là client dùng chung), chỉ lấy client khi thật sự gọi API, tức là khi cache trượt"""
+    def get_client():
+        return client or get_shared_client()
+    return get_client
+
+def get_language():
+    return str(os.environ.get("LANGUAGE"))
+
+def iter_paragraphs(pieces):
+    """
+    Các đoạn văn hoàn chỉnh từ các mẩu text đang tới, giống hệt PARAGRAPH_BREAK.split(text đầy đủ).
+    Một đoạn chỉ được trả về khi đã thấy chữ sau dòng trống ngăn cách (khoảng trắng còn có thể kéo dài sang mẩu sau)
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while True:
+            match = PARAGRAPH_BREAK.search(buffer)
+            if match is None or not buffer[match.end():].strip():
+                break
+            yield buffer[:match.start()]
+            buffer = buffer[match.end():]
+    yield from PARAGRAPH_BREAK.split(buffer)
+
+class OverviewStream:
+    """
+    Bài overview đang được tạo (generate_content_stream) trong một thread nền.
+
+    Mỗi mẩu text được ghi nối vào partial_path (nếu có) ngay khi tới, nên chương trình có chết giữa chừng
+    thì phần đã tạo vẫn còn trên đĩa. Đọc được nhiều lần, từ nhiều nơi cùng lúc:
+    - for piece in stream / async for piece in stream: các mẩu text theo thứ tự, từ đầu, chờ mẩu mới tới khi xong
+    - stream.paragraphs(): các đoạn văn hoàn chỉnh (bước sau, ví dụ TTS, bắt đầu từ các đoạn đầu)
+    - stream.result() / await stream.result_async(): cả bài; lỗi API thì raise
+    """
+    def __init__(self, partial_path=None):
+        self.partial_path = partial_path
+        self._pieces = []
+        self._done = False
+        self._error = None
+        self._condition = threading.Condition()
+        # Future của các async iterator đang chờ mẩu mới, mỗi cái gắn với event loop của nó
+        self._waiters = []
+        self._file = open(partial_path, "w", encoding="utf-8") if partial_path else None
+
+    @property
+    def text(self):
+        """Phần text đã nhận được tới lúc này"""
+        with self._condition:
+            return "".join(self._pieces)
+
+    def _append(self, piece):
+        if self._file is not None:
+            self._file.write(piece)
+            self._file.flush()
+        with self._condition:
+            self._pieces.append(piece)
+            self._notify()
+
+    def _finish(self, error=None):
+        if self._file is not None:
+            self._file.close()
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._notify()
+
+    def _notify(self):
+        self._condition.notify_all()
+        for loop, waiter in self._waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(lambda waiter=waiter: waiter.done() or waiter.set_result(None))
+        self._waiters = []
+
+    def _new_pieces(self, index):
+        """(các mẩu từ vị trí index, đã xong chưa), gọi khi đang giữ _condition"""
+        if self._done and self._error is not None and index >= len(self._pieces):
+            raise self._error
+        return self._pieces[index:], self._done
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._done or len(self._pieces) > index)
+                pieces, done = self._new_pieces(index)
+            index += len(pieces)
+            yield from pieces
+            if done and not pieces:
+                return
+
+    async def __aiter__(self):
+        index = 0
+        while True:
+            waiter = None
+            with self._condition:
+                pieces, done = self._new_pieces(index)
+                if not pieces and not done:
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._waiters.append((asyncio.get_running_loop(), waiter))
+            if waiter is not None:
+                await waiter
+                continue
+            index += len(pieces)
+            for piece in pieces:
+                yield piece
+            if done and not pieces:
+                return
+
+    def paragraphs(self):
+        return iter_paragraphs(self)
 
-    model = "gemini-2.5-flash-lite"
+    def discard_draft(self):
+        """
+        Cho bước đã lỗi (stream lỗi hoặc không đặt được tên): xóa file nháp nếu chưa nhận được chữ nào,
+        ngược lại giữ lại. Trả về đường dẫn file nháp còn giữ, None nếu không có / đã xóa
+        """
+        if not self.partial_path or not os.path.exists(self.partial_path):
+            return None
+        if self.text:
+            return self.partial_path
+        os.remove(self.partial_path)
+        return None
+
+    def result(self):
+        return "".join(self)
+
+    async def result_async(self):
+        return "".join([piece async for piece in self])
+
+def stream_overview(document=[], customize="", client=None, cache=None, partial_path=None):
+    """
+    Bắt đầu tạo bài overview (text) cho các tài liệu, trả về OverviewStream ngay.
+    Cache trúng thì stream có đủ bài ngay lập tức; trượt thì bài hoàn chỉnh được lưu vào cache khi stream xong
+    """
+    cache = resolve_cache(cache)
+    model = MODEL
     
     # Đọc prompt và thay [Language]
-    lang = str(os.environ.get("LANGUAGE"))
+    lang = get_language()
     prompt_content = open("prompt_content.txt", "r", encoding="utf-8").read().replace("[Language]", lang)
     prompt_text = open("prompt_text.txt", "r", encoding="utf-8").read().replace("[Language]", lang)
     
     final_prompt = f"{customize}\n{prompt_content}\n{prompt_text}"
     contents = [final_prompt] + document
-    
+    key = cache_key("overview", TEXT_CACHE_VERSION, model, final_prompt,
+                    [document_fingerprint(doc) for doc in document], lang)
+    stream = OverviewStream(partial_path)
+
+    def run():
+        try:
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                stream._append(cached.decode("utf-8"))
+            else:
+                pieces = []
+                for chunk in client_getter(client)().models.generate_content_stream(model=model, contents=contents):
+                    if chunk.text:
+                        pieces.append(chunk.text)
+                        stream._append(chunk.text)
+                if cache is not None and pieces:
+                    cache.put(key, "".join(pieces).encode("utf-8"))
+        except Exception as error:
+            stream._finish(error)
+            return
+        stream._finish()
+
+    threading.Thread(target=run, name="overview-stream", daemon=True).start()
+    return stream
+
+def generate_overview(document=[], customize="", client=None, cache=None):
+    """Bài overview (text) cho các tài liệu. Lỗi API thì raise"""
+    return stream_overview(document, customize, client, cache).result()
+
+def generate_title(overview_text, client=None, cache=None):
+    """Tên ngắn (đã làm sạch, dùng được làm tên file) cho bài overview. Lỗi API thì raise"""
+    cache = resolve_cache(cache)
+    model = MODEL
+    lang = get_language()
+    name_prompt = f"Give me a short and clear title for this overview in {lang}, using normal spacing between words.\nDo NOT join words together, do NOT use underscores, and do NOT add any punctuation.\nReturn ONLY the title text, nothing else:\n\n" + overview_text
+    name_key = cache_key("title", TEXT_CACHE_VERSION, model, name_prompt, lang)
+    raw_name = cached_generate(client_getter(client), model, [name_prompt], name_key, cache).strip()
+    return sanitize_filename(raw_name)
+
+def save_overview(overview_text, safe_name, directory="", draft_path=None):
+    """
+    Ghi bài overview ra "<tên> Overview.txt" trong thư mục directory, trả về đường dẫn file.
+    draft_path: file đã chứa đúng overview_text (OverviewStream.partial_path), được đổi tên thay vì ghi lại
+    """
+    file_path = os.path.join(directory, f"{safe_name} Overview.txt")
+
+    if os.path.exists(file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            unchanged = f.read() == overview_text
+        if not unchanged:
+            print(f"[WARNING] File {file_path} already exists. Renaming.")
+            file_path = os.path.join(directory, f"{safe_name}_1 Overview.txt")
+
+    if draft_path:
+        os.replace(draft_path, file_path)
+        return file_path
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(overview_text)
+    return file_path
+
+def print_cache_stats(cache=None):
+    cache = resolve_cache(cache)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"[CACHE] Text: {stats.hits} hit(s), {stats.misses} miss(es), "
+              f"{stats.entries} entries, {stats.bytes / 1024:.0f} KB")
+
+def print_kept_draft(stream):
+    """Sau lỗi: dọn file nháp rỗng, hoặc báo file nháp còn giữ phần text đã tạo"""
+    draft_path = stream.discard_draft()
+    if draft_path:
+        print(f"[INFO] Partial overview text kept in {draft_path}")
+
+def generate(document=[], customize="", client=None, cache=None):
+    # Text được ghi ra file nháp ngay khi tới, đổi tên khi đã có tiêu đề
+    stream = stream_overview(document, customize, client, cache, partial_path=f"OVERVIEW_{uuid.uuid4().hex[:8]}.partial.txt")
     try:
-        response = client.models.generate_content(model=model, contents=contents)
+        response_text = stream.result()
     except Exception as e:
         print(f"[ERROR] Failed to generate text: {e}")
+        print_kept_draft(stream)
         return None, None
 
     # Lấy tên file từ AI
     try:
-        name_res = client.models.generate_content(
-            model=model,
-            contents=[f"Give me a short and clear title for this overview in {lang}, using normal spacing between words.\nDo NOT join words together, do NOT use underscores, and do NOT add any punctuation.\nReturn ONLY the title text, nothing else:\n\n" + response.text],
-        )
-        raw_name = name_res.text.strip()
-        safe_name = sanitize_filename(raw_name)
-        file_path = f"{safe_name} Overview.txt"
-
-        if os.path.exists(file_path):
-            print(f"[WARNING] File {file_path} already exists. Renaming.")
-            file_path = f"{safe_name}_1 Overview.txt"
-
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(response.text)
-
-        return response.text, safe_name
+        safe_name = generate_title(response_text, client, cache)
+        save_overview(response_text, safe_name, draft_path=stream.partial_path)
+        return response_text, safe_name
     except Exception as e:
         print(f"[ERROR] Failed to name or save file: {e}")
-        return response.text, "Overview"
\ No newline at end of file
+        print_kept_draft(stream)
+        return response_text, "Overview"
+    finally:
+        print_cache_stats(cache)
@@ -0,0 +1,107 @@
+"""
+Engine chạy pipeline dạng DAG trên asyncio.
+
+Mỗi bước (Step) có tên, một hàm và danh sách bước phụ thuộc. Bước bắt đầu ngay khi mọi bước nó
+phụ thuộc đã xong, nên các nhánh độc lập chạy chồng lên nhau. Hàm nhận kết quả của các bước phụ
+thuộc dưới dạng keyword argument (tên bước = kết quả). Hàm thường (gọi API / ghi file, chặn luồng)
+được chạy trong thread pool qua asyncio.to_thread; coroutine function thì được await trực tiếp.
+
+Bước lỗi không làm dừng cả pipeline: các bước phụ thuộc vào nó bị bỏ qua (error ghi rõ bước nào
+lỗi), các nhánh khác vẫn chạy tiếp.
+
+    pipeline = Pipeline()
+    pipeline.add("upload", upload_sources)
+    pipeline.add("overview", lambda upload: generate_overview(upload), depends_on=["upload"])
+    results = pipeline.run()
+"""
+import time
+import asyncio
+import inspect
+from collections import namedtuple
+
+Step = namedtuple("Step", ["name", "function", "depends_on"])
+
+# Kết quả một bước: value (None nếu lỗi / bị bỏ qua), error (exception hoặc None),
+# thời điểm bắt đầu / kết thúc (time.perf_counter, None nếu không chạy)
+StepResult = namedtuple("StepResult", ["name", "value", "error", "started", "finished"])
+
+class StepSkipped(Exception):
+    """Bước không chạy vì một bước nó phụ thuộc bị lỗi"""
+
+class Pipeline:
+    def __init__(self):
+        self.steps = {}
+
+    def add(self, name, function, depends_on=()):
+        if name in self.steps:
+            raise ValueError(f"Bước '{name}' đã tồn tại")
+        self.steps[name] = Step(name, function, tuple(depends_on))
+        return self
+
+    def validate(self):
+        """Kiểm tra bước phụ thuộc tồn tại và không có chu trình, trả về thứ tự topo"""
+        for step in self.steps.values():
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise ValueError(f"Bước '{step.name}' phụ thuộc bước không tồn tại '{dependency}'")
+        order, state = [], {}
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Pipeline có chu trình: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dependency in self.steps[name].depends_on:
+                visit(dependency, path + [name])
+            state[name] = "done"
+            order.append(name)
+        for name in self.steps:
+            visit(name, [])
+        return order
+
+    async def _run_step(self, step, tasks, on_event):
+        dependencies = {}
+        for dependency in step.depends_on:
+            result = await tasks[dependency]
+            if result.error is not None:
+                error = StepSkipped(f"bỏ qua vì bước '{dependency}' lỗi")
+                on_event(step.name, "skipped", error)
+                return StepResult(step.name, None, error, None, None)
+            dependencies[dependency] = result.value
+
+        on_event(step.name, "started", None)
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(step.function):
+                value = await step.function(**dependencies)
+            else:
+                value = await asyncio.to_thread(step.function, **dependencies)
+        except Exception as error:
+            on_event(step.name, "failed", error)
+            return StepResult(step.name, None, error, started, time.perf_counter())
+        finished = time.perf_counter()
+        on_event(step.name, "finished", None)
+        return StepResult(step.name, value, None, started, finished)
+
+    async def run_async(self, on_event=None):
+        """Chạy tất cả các bước, trả về dict tên bước -> StepResult (theo thứ tự topo)"""
+        order = self.validate()
+        on_event = on_event or (lambda name, event, error: None)
+        tasks = {}
+        for name in order:
+            # Thứ tự topo: task của các bước phụ thuộc luôn được tạo trước
+            tasks[name] = asyncio.ensure_future(self._run_step(self.steps[name], tasks, on_event))
+        results = await asyncio.gather(*tasks.values())
+        return dict(zip(tasks, results))
+
+    def run(self, on_event=None):
+        return asyncio.run(self.run_async(on_event))
+
+def print_event(name, event, error):
+    """on_event mặc định cho CLI"""
+    if event == "failed":
+        print(f"[ERROR] Step '{name}' failed: {error}")
+    elif event == "skipped":
+        print(f"[SKIP] Step '{name}': {error}")
+    else:
+        print(f"[STEP] {name} {event}")
@@ -2,8 +2,27 @@ import os
 import random
 import colorsys
 import re
+import functools
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import namedtuple, OrderedDict
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
+import emoji_atlas
+import slide_encoder
+import template_layouts
+from template_layouts import (
+    CanvasPos, Below, TextBox, EmojiSlot, EmojiCorners, PlainLines, StepColumns,
+    get_template_spec, load_registry,
+)
+
+try:
+    import recolor
+except ImportError:
+    # Chưa cài NumPy: tô nền bằng Image.paste như cũ
+    recolor = None
 
 # ==============================================================================
 # --- HÀM TIỆN ÍCH ---
@@ -13,25 +32,130 @@ def hsl_to_rgb(h, s, l):
     r, g, b = colorsys.hls_to_rgb(h / 360.0, l / 100.0, s / 100.0)
     return int(r * 255), int(g * 255), int(b * 255)
 
-# Bộ đếm toàn cục
-slide_counter = 0
-chapter_count = 0
-
-def get_next_filename_with_suffix(output_dir, template_name):
+def get_slide_filename(output_dir, slide_number, template_name, extension=".png"):
     """Tạo tên file theo dạng: số_thứ_tự_tên_template.png"""
-    global slide_counter
-    slide_counter += 1
-    filename = f"{slide_counter}_{template_name}.png"
+    filename = f"{slide_number}_{template_name}{extension}"
     return os.path.join(output_dir, filename)
 
+# Mọi tọa độ, cỡ chữ và kích thước emoji trong các template được viết cho khung 2560x1440 (scale 1).
+# Các chế độ render có sẵn: draft 640x360, preview 1280x720, full 2560x1440, 4k 3840x2160
+RENDER_SCALES = {
+    "draft": 0.25,
+    "preview": 0.5,
+    "full": 1.0,
+    "4k": 1.5,
+}
+
+def get_render_scale(scale):
+    """Nhận tên chế độ render hoặc hệ số scale, trả về hệ số scale (float)"""
+    if isinstance(scale, str):
+        try:
+            return RENDER_SCALES[scale]
+        except KeyError:
+            raise ValueError(f"Không có chế độ render '{scale}', chọn một trong: {', '.join(RENDER_SCALES)}") from None
+    if scale <= 0:
+        raise ValueError(f"Hệ số scale phải lớn hơn 0, nhận được {scale}")
+    return float(scale)
+
+def scale_px(value, scale):
+    """Đổi một giá trị pixel của khung 2560x1440 sang scale hiện tại (làm tròn về int)"""
+    return round(value * scale)
+
+class RenderContext:
+    """
+    Trạng thái render của một bộ slide (deck): màu nền, các bộ đếm và cách đặt tên file output.
+    Mỗi deck dùng một context riêng nên nhiều deck có thể render cùng lúc trong một process.
+    Cache font / đo text / layout là cache chung của process (giá trị bất biến) nên không nằm ở đây.
+
+    encoder: tên preset hoặc SlideEncoder (xem slide_encoder.py)
+    in_memory: True thì không ghi file, slide đã mã hóa được giữ trong outputs (tên file -> bytes)
+    scale: tên chế độ trong RENDER_SCALES hoặc hệ số scale so với khung 2560x1440
+    """
+
+    def __init__(self, hue=None, emoji_dir="emojis", encoder=slide_encoder.DEFAULT_ENCODER, in_memory=False,
+                 scale=1.0):
+        self.hue = random.randint(0, 360) if hue is None else hue
+        self.emoji_dir = emoji_dir
+        self.encoder = slide_encoder.get_encoder(encoder)
+        self.in_memory = in_memory
+        self.scale = get_render_scale(scale)
+        self.outputs = OrderedDict()
+        self.slide_counter = 0
+        self.chapter_count = 0
+        self.text_with_emoji_count = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Lock không pickle được, cần bỏ ra khi gửi context sang process khác;
+        # output trong bộ nhớ được trả về qua SlideResult nên không gửi theo
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["outputs"] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def next_slide_number(self):
+        with self._lock:
+            self.slide_counter += 1
+            return self.slide_counter
+
+    def next_chapter_number(self):
+        with self._lock:
+            self.chapter_count += 1
+            return self.chapter_count
+
+    def next_text_with_emoji_number(self):
+        with self._lock:
+            self.text_with_emoji_count += 1
+            return self.text_with_emoji_count
+
+    def next_output_filename(self, output_dir, template_name):
+        """Tạo tên file tiếp theo dựa trên bộ đếm slide của deck"""
+        return self.output_filename(output_dir, self.next_slide_number(), template_name)
+
+    def output_filename(self, output_dir, slide_number, template_name):
+        return get_slide_filename(output_dir, slide_number, template_name, self.encoder.extension)
+
+    def write_output(self, image, output_filename):
+        """Mã hóa slide theo encoder của deck, ghi ra file hoặc giữ trong bộ nhớ"""
+        if self.in_memory:
+            data = slide_encoder.encode_image(image, self.encoder)
+            with self._lock:
+                self.outputs[output_filename] = data
+            return data
+        os.makedirs(os.path.dirname(output_filename) or ".", exist_ok=True)
+        slide_encoder.save_image(image, output_filename, self.encoder)
+        return None
+
+# Bộ nhớ đệm font dùng chung cho toàn tiến trình, khóa theo (thư mục font, tên font, cỡ chữ)
+FONT_CACHE_SIZE = 128
+
+# Các font và cỡ chữ mà các template có sẵn sử dụng
+TEMPLATE_FONT_NAMES = tuple(sorted({name for name, _ in template_layouts.template_fonts()}))
+TEMPLATE_FONT_SIZES = tuple(sorted({size for _, size in template_layouts.template_fonts()}))
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_truetype(font_dir, font_name, size):
+    """Đọc file font từ đĩa, chỉ chạy một lần cho mỗi khóa (lỗi không được cache)"""
+    font_path = os.path.join(font_dir, font_name)
+    return ImageFont.truetype(font_path, size=size)
+
 def load_font(font_dir, font_name, size):
     try:
-        font_path = os.path.join(font_dir, font_name)
-        return ImageFont.truetype(font_path, size=size)
+        return _load_truetype(font_dir, font_name, size)
     except (FileNotFoundError, OSError):
         print(f"⚠️ Không tìm thấy font '{font_name}', dùng font mặc định.")
         return ImageFont.load_default()
 
+def warm_up_fonts(font_dir, font_names=TEMPLATE_FONT_NAMES, sizes=TEMPLATE_FONT_SIZES, scale=1.0):
+    """Nạp trước các font mà template sử dụng (theo scale) để slide đầu tiên không phải đọc đĩa"""
+    for font_name in font_names:
+        for size in sizes:
+            load_font(font_dir, font_name, max(1, scale_px(size, scale)))
+
 def parse_markdown_text(text):
     """
     Tách text có markdown bold thành các phần
@@ -68,15 +192,36 @@ def parse_markdown_text(text):
     
     return parts
 
+# Bộ đo text: dùng chung một draw context và cache bbox theo (font, text)
+TEXT_MEASURE_CACHE_SIZE = 8192
+_measure_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+@functools.lru_cache(maxsize=TEXT_MEASURE_CACHE_SIZE)
+def measure_text(text, font):
+    """Trả về bbox (x1, y1, x2, y2) của text với font cho trước, có cache"""
+    return _measure_draw.textbbox((0, 0), text, font=font)
+
 def get_text_width(text, font):
     """Tính độ rộng của text với font cho trước"""
-    draw_temp = ImageDraw.Draw(Image.new('RGB', (1, 1)))
-    return draw_temp.textbbox((0, 0), text, font=font)[2]
+    return measure_text(text, font)[2]
 
 def get_text_height(text, font):
     """Tính độ cao của text với font cho trước"""
-    draw_temp = ImageDraw.Draw(Image.new('RGB', (1, 1)))
-    return draw_temp.textbbox((0, 0), text, font=font)[3]
+    return measure_text(text, font)[3]
+
+def get_line_width(line, regular_font, bold_font):
+    """
+    Tính độ rộng một dòng đã wrap (list các tuple (word, is_bold))
+    từ độ rộng từng từ đã cache cộng với độ rộng khoảng trắng theo font của từ đó,
+    thay vì đo lại cả dòng
+    """
+    total_line_width = 0
+    for word, is_bold in line:
+        font_to_use = bold_font if is_bold else regular_font
+        total_line_width += get_text_width(word, font_to_use)
+        if word != line[-1][0]:  # Không phải từ cuối
+            total_line_width += get_text_width(" ", font_to_use)
+    return total_line_width
 
 def draw_rounded_rectangle(draw, coords, radius, fill_color):
     """Vẽ hình chữ nhật bo góc"""
@@ -92,6 +237,37 @@ def draw_rounded_rectangle(draw, coords, radius, fill_color):
     draw.ellipse([x1, y2 - 2*radius, x1 + 2*radius, y2], fill=fill_color)  # Góc dưới trái
     draw.ellipse([x2 - 2*radius, y2 - 2*radius, x2, y2], fill=fill_color)  # Góc dưới phải
 
+def alpha_composite_clipped(image, overlay, pos):
+    """Blend overlay RGBA vào image RGBA tại pos (tại chỗ), phần tràn ra ngoài image bị cắt bỏ"""
+    x, y = pos
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + overlay.width, image.width), min(y + overlay.height, image.height)
+    if left >= right or top >= bottom:
+        return image
+    
+    image.alpha_composite(overlay, dest=(left, top), source=(left - x, top - y, right - x, bottom - y))
+    return image
+
+def composite_rounded_rectangle(image, coords, radius, fill_color):
+    """
+    Blend hình chữ nhật bo góc (màu có alpha) vào image RGBA,
+    chỉ tạo overlay và composite trong phạm vi bounding box của hình thay vì cả khung hình
+    """
+    x1, y1, x2, y2 = coords
+    
+    # Bounding box thực tế của hình (các góc bo có thể tràn ra nếu box nhỏ hơn 2*radius)
+    ex1, ey1 = min(x1, x2 - 2*radius), min(y1, y2 - 2*radius)
+    ex2, ey2 = max(x2, x1 + 2*radius), max(y2, y1 + 2*radius)
+    
+    # Bỏ qua nếu hình nằm hoàn toàn ngoài image
+    if ex2 < 0 or ey2 < 0 or ex1 >= image.width or ey1 >= image.height:
+        return image
+    
+    overlay = Image.new('RGBA', (ex2 - ex1 + 1, ey2 - ey1 + 1), (0, 0, 0, 0))
+    draw_rounded_rectangle(ImageDraw.Draw(overlay), (x1 - ex1, y1 - ey1, x2 - ex1, y2 - ey1),
+                           radius, fill_color)
+    return alpha_composite_clipped(image, overlay, (ex1, ey1))
+
 def wrap_markdown_text_to_fit_width(text, regular_font, bold_font, max_width):
     """
     Wrap text có markdown bold để fit trong width
@@ -163,10 +339,69 @@ def wrap_markdown_text_to_fit_width(text, regular_font, bold_font, max_width):
     
     return lines
 
-def draw_markdown_text(image, text, x, y, regular_font, bold_font, max_width, color="black", anchor="lt", 
-                      bold_bg_color=(239, 209, 0, 255), border_radius=20):
+def wrap_text_to_fit_width(text, font, max_width):
+    """Hàm wrap text gốc cho text không có markdown"""
+    text_width = get_text_width(text, font)
+    if text_width <= max_width:
+        text_height = get_text_height(text, font)
+        return [text], text_height
+    
+    words = text.split()
+    lines = []
+    current_line = ""
+    
+    for word in words:
+        test_line = current_line + (" " if current_line else "") + word
+        test_width = get_text_width(test_line, font)
+        if test_width <= max_width:
+            current_line = test_line
+        else:
+            if current_line:
+                lines.append(current_line)
+                current_line = word
+            else:
+                lines.append(word)
+    
+    if current_line:
+        lines.append(current_line)
+    
+    line_height = get_text_height("Aa", font)
+    total_height = len(lines) * line_height * 1.2
+    return lines, int(total_height)
+
+# ==============================================================================
+# --- LAYOUT & VẼ TEXT ---
+# ==============================================================================
+# Vẽ text chia làm 2 pha: pha layout (wrap + đo, có cache) trả về một TextLayout
+# bất biến với tọa độ tương đối so với điểm neo (x, y); pha vẽ chỉ đọc layout đó.
+
+# Một cụm từ liên tiếp cùng định dạng trên một dòng.
+# width/height: kích thước đo được; space: khoảng trắng cộng thêm sau cụm
+TextRun = namedtuple("TextRun", ["text", "is_bold", "width", "height", "space"])
+
+# Một dòng: offset_x là độ lệch của cụm đầu tiên so với x của điểm neo
+TextLine = namedtuple("TextLine", ["offset_x", "runs"])
+
+# Kết quả pha layout.
+# offset_y: độ lệch của dòng đầu so với y của điểm neo
+# text_anchor: anchor truyền cho draw.text khi vẽ từng cụm
+# markdown: True nếu các cụm bold được tô nền highlight
+TextLayout = namedtuple("TextLayout", [
+    "lines", "line_height", "total_height", "offset_y", "text_anchor", "markdown",
+    "regular_font", "bold_font",
+])
+
+TEXT_LAYOUT_CACHE_SIZE = 512
+
+# Padding cho background của text bold
+BOLD_BG_PADDING_X = 15
+BOLD_BG_PADDING_Y_TOP = 25
+BOLD_BG_PADDING_Y_BOTTOM = 0
+
+@functools.lru_cache(maxsize=TEXT_LAYOUT_CACHE_SIZE)
+def layout_markdown_text(text, regular_font, bold_font, max_width, anchor="lt"):
     """
-    Vẽ text có markdown bold lên image với nền màu vàng cho text bold
+    Pha layout cho text có markdown bold: wrap, nhóm các từ cùng định dạng và đo từng nhóm
     FIXED: Xử lý đúng anchor, đặc biệt là "mt" (middle-top) để căn giữa
     """
     lines = wrap_markdown_text_to_fit_width(text, regular_font, bold_font, max_width)
@@ -175,41 +410,20 @@ def draw_markdown_text(image, text, x, y, regular_font, bold_font, max_width, co
     total_height = len(lines) * line_height
     
     # Điều chỉnh y dựa trên anchor
-    if anchor == "mt":
-        start_y = y
-    elif anchor == "lt":
-        start_y = y
+    if anchor in ("mt", "lt"):
+        offset_y = 0
     else:
-        start_y = y - total_height / 2
+        offset_y = -(total_height / 2)
     
-    # Padding cho background
-    bg_padding_x = 15
-    bg_padding_y_top = 25
-    bg_padding_y_bottom = 0
-    
-    # Đảm bảo image ở chế độ RGBA
-    if image.mode != 'RGBA':
-        image = image.convert('RGBA')
-    
-    draw = ImageDraw.Draw(image)
-    
-    for line_idx, line in enumerate(lines):
-        line_y = start_y + (line_idx * line_height)
-        
+    layout_lines = []
+    for line in lines:
         # FIXED: Tính toán vị trí x cho từng dòng dựa trên anchor
         if anchor == "mt":
-            # Căn giữa: tính tổng width của dòng và bắt đầu từ giữa
-            total_line_width = 0
-            for word, is_bold in line:
-                font_to_use = bold_font if is_bold else regular_font
-                total_line_width += get_text_width(word, font_to_use)
-                if word != line[-1][0]:  # Không phải từ cuối
-                    total_line_width += get_text_width(" ", font_to_use)
-            
-            current_x = x - (total_line_width / 2)  # Bắt đầu từ nửa trái của tổng width
+            # Căn giữa: bắt đầu từ nửa trái của tổng width
+            offset_x = -(get_line_width(line, regular_font, bold_font) / 2)
         else:
             # Left align
-            current_x = x
+            offset_x = 0
         
         # Nhóm các từ liên tiếp cùng định dạng (bold/normal)
         grouped_parts = []
@@ -227,111 +441,114 @@ def draw_markdown_text(image, text, x, y, regular_font, bold_font, max_width, co
             
             grouped_parts.append(current_group)
         
-        # Vẽ từng nhóm
+        runs = []
         for group in grouped_parts:
-            if not group:
-                continue
-                
             is_bold = group[0][1]
             font_to_use = bold_font if is_bold else regular_font
             
             # Tạo text từ nhóm các từ
             group_text = " ".join(word for word, _ in group)
-            group_width = get_text_width(group_text, font_to_use)
-            group_height = get_text_height(group_text, font_to_use)
-            
-            # Vẽ background cho cả nhóm nếu là bold
-            if is_bold:
-                bg_x1 = int(current_x - bg_padding_x)
-                bg_y1 = int(line_y - bg_padding_y_top)
-                bg_x2 = int(current_x + group_width + bg_padding_x)
-                bg_y2 = int(line_y + group_height + bg_padding_y_bottom)
-                
-                # Tạo layer tạm cho background
-                overlay = Image.new('RGBA', image.size, (0, 0, 0, 0))
-                overlay_draw = ImageDraw.Draw(overlay)
-                
-                # Vẽ background bo góc với màu có alpha
-                draw_rounded_rectangle(overlay_draw, (bg_x1, bg_y1, bg_x2, bg_y2), 
-                                     border_radius, bold_bg_color)
-                
-                # Blend overlay vào image chính
-                image = Image.alpha_composite(image, overlay)
-                draw = ImageDraw.Draw(image)
-            
-            # Vẽ text của nhóm với anchor="lt" vì đã tính toán vị trí x rồi
-            draw.text((current_x, line_y), group_text, fill=color, font=font_to_use, anchor="lt")
-            current_x += group_width
             
             # Thêm khoảng trắng giữa các nhóm
+            space_width = 0
             if group != grouped_parts[-1]:  # Không phải nhóm cuối
                 space_width = get_text_width(" ", font_to_use)
-                current_x += space_width
+            
+            runs.append(TextRun(group_text, is_bold, get_text_width(group_text, font_to_use),
+                                get_text_height(group_text, font_to_use), space_width))
+        
+        layout_lines.append(TextLine(offset_x, tuple(runs)))
     
-    return image, total_height
+    return TextLayout(tuple(layout_lines), line_height, total_height, offset_y, "lt", True,
+                      regular_font, bold_font)
 
-def wrap_text_to_fit_width(text, font, max_width):
-    """Hàm wrap text gốc cho text không có markdown"""
-    draw_temp = ImageDraw.Draw(Image.new('RGB', (1, 1)))
-    text_width = draw_temp.textbbox((0, 0), text, font=font)[2]
-    if text_width <= max_width:
-        text_height = draw_temp.textbbox((0, 0), text, font=font)[3]
-        return [text], text_height
+@functools.lru_cache(maxsize=TEXT_LAYOUT_CACHE_SIZE)
+def layout_plain_text(text, font, max_width, anchor="lt"):
+    """Pha layout cho text không có markdown, mỗi dòng là một cụm vẽ với anchor truyền vào"""
+    lines, total_height = wrap_text_to_fit_width(text, font, max_width)
     
-    words = text.split()
-    lines = []
-    current_line = ""
+    # Điều chỉnh y dựa trên anchor - FIXED LOGIC
+    if anchor in ("mt", "lt"):
+        # Với "mt", text được căn giữa theo chiều ngang tại x
+        offset_y = 0
+    else:
+        offset_y = -(total_height / 2)
     
-    for word in words:
-        test_line = current_line + (" " if current_line else "") + word
-        test_width = draw_temp.textbbox((0, 0), test_line, font=font)[2]
-        if test_width <= max_width:
-            current_line = test_line
-        else:
-            if current_line:
-                lines.append(current_line)
-                current_line = word
-            else:
-                lines.append(word)
+    line_height = get_text_height("Aa", font) * 1.2
+    layout_lines = tuple(TextLine(0, (TextRun(line, False, 0, 0, 0),)) for line in lines)
+    return TextLayout(layout_lines, line_height, total_height, offset_y, anchor, False, font, font)
+
+def layout_text(text, regular_font, bold_font, max_width, anchor="lt"):
+    """Tự động detect markdown và chọn pha layout phù hợp"""
+    if '**' in text:
+        return layout_markdown_text(text, regular_font, bold_font, max_width, anchor)
+    return layout_plain_text(text, regular_font, max_width, anchor)
+
+def iter_layout_runs(layout, x, y):
+    """Duyệt các cụm của layout khi neo tại (x, y), trả về (run, run_x, line_y) theo thứ tự vẽ"""
+    start_y = y + layout.offset_y
+    for line_idx, line in enumerate(layout.lines):
+        line_y = start_y + (line_idx * layout.line_height)
+        current_x = x + line.offset_x
+        for run in line.runs:
+            yield run, current_x, line_y
+            current_x += run.width
+            current_x += run.space
+
+def get_highlight_box(run, run_x, line_y, scale=1.0):
+    """Tọa độ (x1, y1, x2, y2) của nền highlight cho một cụm bold; padding theo scale"""
+    padding_x = scale_px(BOLD_BG_PADDING_X, scale)
+    return (int(run_x - padding_x),
+            int(line_y - scale_px(BOLD_BG_PADDING_Y_TOP, scale)),
+            int(run_x + run.width + padding_x),
+            int(line_y + run.height + scale_px(BOLD_BG_PADDING_Y_BOTTOM, scale)))
+
+def get_highlight_boxes(layout, x, y, scale=1.0):
+    """Danh sách nền highlight của các cụm bold khi neo layout tại (x, y)"""
+    if not layout.markdown:
+        return []
+    return [get_highlight_box(run, run_x, line_y, scale)
+            for run, run_x, line_y in iter_layout_runs(layout, x, y) if run.is_bold]
+
+def paint_text_layout(image, layout, x, y, color="black", bold_bg_color=(239, 209, 0, 255), border_radius=20,
+                      scale=1.0):
+    """
+    Pha vẽ: vẽ một TextLayout đã tính sẵn lên image tại điểm neo (x, y), không đo lại text.
+    border_radius và padding của nền highlight là giá trị ở scale 1, được nhân theo scale
+    """
+    border_radius = scale_px(border_radius, scale)
+    # Đảm bảo image ở chế độ RGBA để blend nền highlight
+    if layout.markdown and image.mode != 'RGBA':
+        image = image.convert('RGBA')
     
-    if current_line:
-        lines.append(current_line)
+    draw = ImageDraw.Draw(image)
     
-    line_height = draw_temp.textbbox((0, 0), "Aa", font=font)[3]
-    total_height = len(lines) * line_height * 1.2
-    return lines, int(total_height)
+    for run, run_x, line_y in iter_layout_runs(layout, x, y):
+        # Vẽ background bo góc cho cả nhóm nếu là bold (blend trực tiếp, chỉ trong vùng của box)
+        if layout.markdown and run.is_bold:
+            composite_rounded_rectangle(image, get_highlight_box(run, run_x, line_y, scale),
+                                        border_radius, bold_bg_color)
+        
+        font_to_use = layout.bold_font if run.is_bold else layout.regular_font
+        draw.text((run_x, line_y), run.text, fill=color, font=font_to_use, anchor=layout.text_anchor)
+    
+    return image, layout.total_height
 
-def draw_mixed_text_with_markdown(image, text, x, y, regular_font, bold_font, max_width, color="black", anchor="lt"):
+def draw_markdown_text(image, text, x, y, regular_font, bold_font, max_width, color="black", anchor="lt", 
+                      bold_bg_color=(239, 209, 0, 255), border_radius=20, scale=1.0):
     """
-    Hàm mới: Vẽ text với tự động detect markdown và fallback về text thường
-    FIXED: Xử lý đúng anchor cho cả trường hợp có và không có markdown
+    Vẽ text có markdown bold lên image với nền màu vàng cho text bold
     """
-    # Kiểm tra xem có markdown không
-    if '**' in text:
-        # Có markdown, dùng draw_markdown_text
-        return draw_markdown_text(image, text, x, y, regular_font, bold_font, max_width, color, anchor)
-    else:
-        # Không có markdown, dùng cách cũ nhưng FIXED anchor
-        lines, total_height = wrap_text_to_fit_width(text, regular_font, max_width)
-        draw = ImageDraw.Draw(image)
-        
-        # Điều chỉnh y dựa trên anchor - FIXED LOGIC
-        if anchor == "mt":
-            # Với "mt", text được căn giữa theo chiều ngang tại x
-            start_y = y
-        elif anchor == "lt":
-            start_y = y
-        else:
-            start_y = y - total_height / 2
-        
-        line_height = draw.textbbox((0, 0), "Aa", font=regular_font)[3] * 1.2
-        
-        for i, line in enumerate(lines):
-            line_y = start_y + (i * line_height)
-            # FIXED: Sử dụng đúng anchor được truyền vào
-            draw.text((x, line_y), line, fill=color, font=regular_font, anchor=anchor)
-        
-        return image, total_height
+    layout = layout_markdown_text(text, regular_font, bold_font, max_width, anchor)
+    return paint_text_layout(image, layout, x, y, color, bold_bg_color, border_radius, scale)
+
+def draw_mixed_text_with_markdown(image, text, x, y, regular_font, bold_font, max_width, color="black", anchor="lt",
+                                  scale=1.0):
+    """
+    Vẽ text với tự động detect markdown và fallback về text thường
+    """
+    layout = layout_text(text, regular_font, bold_font, max_width, anchor)
+    return paint_text_layout(image, layout, x, y, color, scale=scale)
     
 # ==============================================================================
 # --- HÀM CHÍNH ---
@@ -343,290 +560,224 @@ def apply_background(template_image, hue):
     background.paste(template_image, (0, 0), mask=template_image)
     return background
 
+class ImageLRUCache:
+    """
+    Cache ảnh dùng chung trong process, giới hạn theo tổng dung lượng (byte),
+    loại bỏ ảnh ít được dùng gần đây nhất khi vượt ngân sách.
+    size_of: hàm tính dung lượng một phần tử, mặc định là dung lượng pixel của ảnh PIL.
+    Ảnh trong cache chỉ được đọc, không được vẽ trực tiếp lên.
+    """
+
+    def __init__(self, max_bytes, size_of=None):
+        self.max_bytes = max_bytes
+        self.size_of = size_of or self.image_bytes
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, key):
+        with self._lock:
+            image = self._items.get(key)
+            if image is not None:
+                self._items.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        size = self.size_of(image)
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self.size_of(self._items.pop(key))
+            # Ảnh lớn hơn cả ngân sách thì không cache
+            if size > self.max_bytes:
+                return
+            self._items[key] = image
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= self.size_of(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+# Template đã decode sang RGBA, khóa theo (đường dẫn, scale)
+TEMPLATE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_template_cache = ImageLRUCache(TEMPLATE_CACHE_MAX_BYTES)
+
+# Template đã phân tích cho recolor bằng NumPy, khóa theo (đường dẫn, scale)
+PREPARED_TEMPLATE_CACHE_MAX_BYTES = 160 * 1024 * 1024
+_prepared_template_cache = ImageLRUCache(PREPARED_TEMPLATE_CACHE_MAX_BYTES,
+                                         size_of=recolor.prepared_nbytes if recolor else None)
+
+# Nền đã tô màu, khóa theo (đường dẫn template, hue, scale)
+BACKGROUND_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_background_cache = ImageLRUCache(BACKGROUND_CACHE_MAX_BYTES)
+
+def load_template(template_path, scale=1.0):
+    """
+    Mở template và chuyển sang RGBA, mỗi file chỉ decode PNG một lần.
+    scale khác 1 thì resize template (RGBA, Pillow tự nhân alpha trước khi resample) một lần mỗi scale
+    """
+    key = (template_path, scale)
+    template_img = _template_cache.get(key)
+    if template_img is None:
+        if scale == 1:
+            template_img = Image.open(template_path).convert('RGBA')
+        else:
+            full_size = load_template(template_path)
+            size = (max(1, scale_px(full_size.width, scale)), max(1, scale_px(full_size.height, scale)))
+            template_img = full_size.resize(size, Image.LANCZOS)
+        _template_cache.put(key, template_img)
+    return template_img
+
+def load_prepared_template(template_path, scale=1.0):
+    """Phân tích template (đã resize theo scale) cho recolor bằng NumPy, mỗi file chỉ một lần mỗi scale"""
+    key = (template_path, scale)
+    prepared = _prepared_template_cache.get(key)
+    if prepared is None:
+        if scale == 1:
+            with Image.open(template_path) as template_img:
+                prepared = recolor.prepare_template(template_img)
+        else:
+            prepared = recolor.prepare_template(load_template(template_path, scale))
+        _prepared_template_cache.put(key, prepared)
+    return prepared
+
+def load_template_background(template_path, hue, scale=1.0):
+    """
+    Trả về bản sao của template đã ghép nền màu hue, ở kích thước theo scale.
+    Template lặp lại trong một deck, hoặc giữa các deck cùng hue, không phải decode và ghép lại.
+    Template được resize trước khi tô nền nên chế độ draft chỉ phải tô 1/16 số pixel
+    """
+    key = (template_path, hue, scale)
+    background = _background_cache.get(key)
+    if background is None:
+        if recolor is not None:
+            background = recolor.recolor_template(load_prepared_template(template_path, scale), hue)
+        else:
+            background = apply_background(load_template(template_path, scale), hue)
+        _background_cache.put(key, background)
+    return background.copy()
+
 def paste_emoji_image(base_img, emoji_char, pos, size, emoji_dir):
-    """Dán emoji PNG vào vị trí (pos) với kích thước (size)."""
-    codepoints = "-".join(f"{ord(c):x}" for c in emoji_char)
-    emoji_file = os.path.join(emoji_dir, f"{codepoints}.png")
+    """Dán emoji vào vị trí (pos) với kích thước (size), tile lấy từ atlas/cache đã resize sẵn."""
+    codepoints = emoji_atlas.emoji_codepoints(emoji_char)
+    emoji_img = emoji_atlas.get_emoji_tile(emoji_dir, codepoints, size)
     
-    if not os.path.exists(emoji_file):
+    if emoji_img is None:
+        emoji_file = os.path.join(emoji_dir, f"{codepoints}.png")
         print(f"⚠️ Không tìm thấy emoji '{emoji_char}' ({emoji_file})")
         return base_img
     
-    emoji_img = Image.open(emoji_file).convert("RGBA")
-    emoji_img = emoji_img.resize((size, size), Image.LANCZOS)
     base_img.paste(emoji_img, pos, emoji_img)
     return base_img
 
-def add_data_for_opening(image_to_draw_on, data, font_dir):
-    """UPDATED: Giữ nguyên layout gốc nhưng hỗ trợ markdown"""
-    title_text = data['title']
-    font_regular = load_font(font_dir, "NotoSans-Regular.ttf", 150)
-    font_bold = load_font(font_dir, "NotoSans-Bold.ttf", 150)
-    
-    # Chuyển đổi sang RGBA nếu cần
-    if image_to_draw_on.mode != 'RGBA':
-        image_to_draw_on = image_to_draw_on.convert('RGBA')
-    
-    text_position_x = image_to_draw_on.width / 2
-    text_position_y = 450
-    max_width = 2000
-    
-    # Sử dụng hàm mixed để tự động detect markdown
-    image_to_draw_on, _ = draw_mixed_text_with_markdown(
-        image_to_draw_on, title_text, text_position_x, text_position_y,
-        font_bold, font_bold, max_width, color="black", anchor="mt"
-    )
-    
-    return image_to_draw_on
-
-def add_data_for_definition(image_to_draw_on, data, font_dir):
-    """UPDATED: Giữ nguyên layout gốc nhưng hỗ trợ markdown"""
-    definition_text = data.get('definition', '')
-    term = data.get('term', '')
-    
-    font_term_regular = load_font(font_dir, "NotoSans-Regular.ttf", 100)
-    font_term_bold = load_font(font_dir, "NotoSans-Bold.ttf", 100)
-    font_def_regular = load_font(font_dir, "NotoSans-Regular.ttf", 60)
-    font_def_bold = load_font(font_dir, "NotoSans-Bold.ttf", 60)
-    
-    # Chuyển đổi sang RGBA nếu cần
-    if image_to_draw_on.mode != 'RGBA':
-        image_to_draw_on = image_to_draw_on.convert('RGBA')
-    
-    draw = ImageDraw.Draw(image_to_draw_on)
-
-    emoji_char = data.get('emoji', '😀')
-    emoji_dir = "emojis"
-    emoji_size = 300
-    emoji_x = 1900
-    emoji_y = int(image_to_draw_on.height / 2 - 300)
-    image_to_draw_on = paste_emoji_image(image_to_draw_on, emoji_char, (emoji_x, emoji_y), emoji_size, emoji_dir)
-
-    # Term với markdown support
-    term_x = 250
-    term_y = 300
-    max_width_term = 1400
-    image_to_draw_on, _ = draw_mixed_text_with_markdown(
-        image_to_draw_on, term, term_x, term_y,
-        font_term_regular, font_term_bold, max_width_term, color="black", anchor="lt"
-    )
-
-    # Definition với markdown support  
-    def_x = 250
-    def_y = 500
-    max_width_def = 1400
-    image_to_draw_on, _ = draw_mixed_text_with_markdown(
-        image_to_draw_on, definition_text, def_x, def_y,
-        font_def_regular, font_def_bold, max_width_def, color="black", anchor="lt"
-    )
-    
-    return image_to_draw_on
-
-def add_data_for_chapter(image_to_draw_on, data, font_dir):
-    """UPDATED: Giữ nguyên layout gốc nhưng hỗ trợ markdown"""
-    title_text = data['title']
-    font_regular = load_font(font_dir, "NotoSans-Regular.ttf", 180)
-    font_bold = load_font(font_dir, "NotoSans-Bold.ttf", 180)
-    
-    # Chuyển đổi sang RGBA nếu cần
-    if image_to_draw_on.mode != 'RGBA':
-        image_to_draw_on = image_to_draw_on.convert('RGBA')
-    
-    text_position_x = image_to_draw_on.width / 2 - image_to_draw_on.width / 6
-    text_position_y = image_to_draw_on.height / 2
-    max_width = 1500
-    
-    # Điều chỉnh start_y như code gốc
-    lines_temp, total_height = wrap_text_to_fit_width(title_text.replace('**', ''), font_regular, max_width)
-    start_y = text_position_y - (total_height / 2 - 50)
-    
-    image_to_draw_on, _ = draw_mixed_text_with_markdown(
-        image_to_draw_on, title_text, text_position_x, start_y,
-        font_regular, font_bold, max_width, color="black", anchor="lt"
-    )
-    
-    return image_to_draw_on
-
-def add_data_for_quote(image_to_draw_on, data, font_dir):
-    """UPDATED: Giữ nguyên layout gốc nhưng hỗ trợ markdown"""
-    title_text = data['title']
-    font_regular = load_font(font_dir, "NotoSans-Regular.ttf", 120)
-    font_bold = load_font(font_dir, "NotoSans-Bold.ttf", 120)
-    
-    # Chuyển đổi sang RGBA nếu cần
-    if image_to_draw_on.mode != 'RGBA':
-        image_to_draw_on = image_to_draw_on.convert('RGBA')
-    
-    text_position_x = image_to_draw_on.width / 4
-    text_position_y = 390
-    max_width = 1500
-    
-    image_to_draw_on, _ = draw_mixed_text_with_markdown(
-        image_to_draw_on, title_text, text_position_x, text_position_y,
-        font_regular, font_bold, max_width, color="black", anchor="lt"
-    )
-    
-    return image_to_draw_on
-
-def add_data_for_question(image_to_draw_on, data, font_dir):
-    """FIXED: Căn giữa text đúng cách"""
-    title_text = data['title']
-    font_regular = load_font(font_dir, "NotoSans-Regular.ttf", 150) 
-    font_bold = load_font(font_dir, "NotoSans-Bold.ttf", 150)
-    
-    # Chuyển đổi sang RGBA nếu cần
-    if image_to_draw_on.mode != 'RGBA':
-        image_to_draw_on = image_to_draw_on.convert('RGBA')
-    
-    text_position_x = image_to_draw_on.width / 2  # Vị trí giữa theo chiều ngang
-    text_position_y = 450
-    max_width = 2000
-    
-    # Kiểm tra có markdown không
-    if '**' in title_text:
-        # Có markdown - sử dụng hàm draw_markdown_text
-        image_to_draw_on, _ = draw_markdown_text(
-            image_to_draw_on, title_text, text_position_x, text_position_y,
-            font_regular, font_bold, max_width, color="black", anchor="mt"
-        )
-    else:
-        # Không có markdown - vẽ text thường và căn giữa thủ công
-        lines, total_height = wrap_text_to_fit_width(title_text, font_regular, max_width)
-        draw = ImageDraw.Draw(image_to_draw_on)
-        
-        line_height = draw.textbbox((0, 0), "Aa", font=font_regular)[3] * 1.2
-        start_y = text_position_y
-        
-        for i, line in enumerate(lines):
-            line_y = start_y + (i * line_height)
-            # Căn giữa từng dòng
-            draw.text((text_position_x, line_y), line, fill="black", font=font_regular, anchor="mt")
-    
-    return image_to_draw_on
-
-def add_data_for_side_by_side(image_to_draw_on, data, font_dir):
-    """UPDATED: Giữ nguyên layout gốc nhưng hỗ trợ markdown"""
-    left_data = data.get('left', {})
-    right_data = data.get('right', {})
-
-    font_regular = load_font(font_dir, "NotoSans-Regular.ttf", 70)
-    font_bold = load_font(font_dir, "NotoSans-Bold.ttf", 70)
-    
-    # Chuyển đổi image sang RGBA để hỗ trợ alpha blending
-    if image_to_draw_on.mode != 'RGBA':
-        image_to_draw_on = image_to_draw_on.convert('RGBA')
-
-    # Left side
-    left_emoji_char = left_data.get('emoji', '😀')
-    left_content_text = left_data.get('content', '')
-    
-    emoji_dir = "emojis"
-    emoji_size = 200
-    emoji_x_left = 200
-    emoji_y_left = 500
-    image_to_draw_on = paste_emoji_image(image_to_draw_on, left_emoji_char, (emoji_x_left, emoji_y_left), emoji_size, emoji_dir)
-    
-    content_x_left = 200
-    content_y_left = 800
-    max_width_left = 950  # Giới hạn width cho cột trái
-    
-    # Sử dụng hàm draw_markdown_text với nền màu vàng
-    image_to_draw_on, _ = draw_markdown_text(image_to_draw_on, left_content_text, content_x_left, content_y_left, 
-                      font_regular, font_bold, max_width_left, color="black", anchor="lt",
-                      bold_bg_color=(239, 209, 0, 255), border_radius=20)
-
-    # Right side
-    right_emoji_char = right_data.get('emoji', '😀')
-    right_content_text = right_data.get('content', '')
-
-    emoji_x_right = 1400
-    emoji_y_right = 500
-    image_to_draw_on = paste_emoji_image(image_to_draw_on, right_emoji_char, (emoji_x_right, emoji_y_right), emoji_size, emoji_dir)
-
-    content_x_right = 1400
-    content_y_right = 800
-    max_width_right = 950  # Giới hạn width cho cột phải
-    
-    # Sử dụng hàm draw_markdown_text với nền màu vàng
-    image_to_draw_on, _ = draw_markdown_text(image_to_draw_on, right_content_text, content_x_right, content_y_right, 
-                      font_regular, font_bold, max_width_right, color="black", anchor="lt",
-                      bold_bg_color=(239, 209, 0, 255), border_radius=20)
-
-    return image_to_draw_on
-
-def add_data_for_blank(image_to_draw_on, data, font_dir):
+# ==============================================================================
+# --- VẼ TEMPLATE THEO LAYOUT ---
+# ==============================================================================
+# Layout của từng template được khai báo trong template_layouts.py; các hàm dưới đây là bộ vẽ chung.
+
+def _scale_geometry(value, scale):
+    """Nhân một giá trị hình học của layout (số, CanvasPos, Below hoặc tuple vị trí) theo scale"""
+    if isinstance(value, (CanvasPos, Below)):
+        return value._replace(offset=scale_px(value.offset, scale))
+    if isinstance(value, tuple):
+        return tuple(_scale_geometry(v, scale) for v in value)
+    return scale_px(value, scale)
+
+@functools.lru_cache(maxsize=None)
+def compile_template(spec, scale):
     """
-    Template blank: Có title và content (list hoặc plain text)
-    Hỗ trợ markdown highlight
+    Đổi layout của template sang pixel của scale cho trước, một lần mỗi (template, scale):
+    tọa độ / kích thước được nhân theo scale, cỡ chữ tối thiểu là 1, field chuẩn hóa thành tuple
     """
-    title_text = data.get('title', '')
-    content_data = data.get('content', '')
-
-    # Font
-    font_title_regular = load_font(font_dir, "NotoSans-Regular.ttf", 120)
-    font_title_bold = load_font(font_dir, "NotoSans-Bold.ttf", 120)
-    font_content_regular = load_font(font_dir, "NotoSans-Regular.ttf", 70)
-    font_content_bold = load_font(font_dir, "NotoSans-Bold.ttf", 70)
-
-    # Chuyển đổi sang RGBA nếu cần
-    if image_to_draw_on.mode != 'RGBA':
-        image_to_draw_on = image_to_draw_on.convert('RGBA')
+    elements = []
+    for element in spec.elements:
+        changes = {name: _scale_geometry(getattr(element, name), scale)
+                   for name in template_layouts.GEOMETRY_FIELDS[type(element)]}
+        for size_field, _ in template_layouts.FONT_FIELDS[type(element)]:
+            changes[size_field] = max(1, scale_px(getattr(element, size_field), scale))
+        changes["field"] = template_layouts.field_path(element.field)
+        elements.append(element._replace(**changes))
+    return spec._replace(elements=tuple(elements))
+
+def resolve_field(data, field, default):
+    """Giá trị theo đường dẫn field trong data; default None thì field bắt buộc có (KeyError)"""
+    value = data
+    for key in field[:-1]:
+        value = value.get(key, {})
+    if default is None:
+        return value[field[-1]]
+    return value.get(field[-1], default)
+
+def resolve_canvas_value(value, image):
+    """Giá trị pixel của một tọa độ trong layout (số hoặc CanvasPos) trên image"""
+    if not isinstance(value, CanvasPos):
+        return value
+    size = image.width if value.axis == "x" else image.height
+    result = 0
+    for divisor in value.divisors:
+        result = result + size / divisor if divisor > 0 else result - size / -divisor
+    if value.offset:
+        result = result + value.offset
+    return result
+
+def _draw_text(image, box, text, x, y, regular_font, bold_font, max_width, ctx):
+    if box.valign == "middle":
+        # Căn giữa theo chiều cao text như template chapter gốc (chiều cao lấy từ layout đã cache)
+        total_height = layout_plain_text(text.replace('**', ''), regular_font, max_width).total_height
+        y = y - (total_height / 2 - box.valign_offset)
+    if box.style == "markdown":
+        return draw_markdown_text(image, text, x, y, regular_font, bold_font, max_width, color="black",
+                                  anchor=box.anchor, bold_bg_color=(239, 209, 0, 255), border_radius=20,
+                                  scale=ctx.scale)
+    return draw_mixed_text_with_markdown(image, text, x, y, regular_font, bold_font, max_width,
+                                         color="black", anchor=box.anchor, scale=ctx.scale)
+
+def paint_text_box(image, box, data, font_dir, ctx, previous_text):
+    """
+    Vẽ một TextBox. previous_text: (y, chiều cao) của ô text vẽ trước đó, dùng cho Below.
+    Trả về (image, (y, chiều cao)) của ô vừa vẽ
+    """
+    value = resolve_field(data, box.field, box.default)
+    regular_font = load_font(font_dir, box.regular_font, box.font_size)
+    bold_font = load_font(font_dir, box.bold_font, box.font_size)
 
-    # --- Vẽ Title ---
-    title_x = 200
-    title_y = 300
-    max_width_title = 2000
-
-    image_to_draw_on, title_height = draw_mixed_text_with_markdown(
-        image_to_draw_on, title_text, title_x, title_y,
-        font_title_bold, font_title_bold, max_width_title,
-        color="black", anchor="lt"
-    )
-
-    # --- Vẽ Content ---
-    content_start_y = title_y + title_height + 100
-    content_x = 200
-    max_width_content = image_to_draw_on.width - 400
-
-    if isinstance(content_data, list):
-        # Content dạng list
-        current_y = content_start_y
-        for idx, item in enumerate(content_data, start=1):
-            # Bạn có thể đổi "•" thành f"{idx}." nếu muốn số thứ tự
-            line_text = f"• {item}"
-            image_to_draw_on, line_height = draw_mixed_text_with_markdown(
-                image_to_draw_on, line_text, content_x, current_y,
-                font_content_regular, font_content_bold, max_width_content,
-                color="black", anchor="lt"
-            )
-            current_y += line_height + 20
+    x = resolve_canvas_value(box.x, image)
+    if isinstance(box.y, Below):
+        y = previous_text[0] + previous_text[1] + box.y.offset
     else:
-        # Content dạng plain text
-        image_to_draw_on, _ = draw_mixed_text_with_markdown(
-            image_to_draw_on, str(content_data), content_x, content_start_y,
-            font_content_regular, font_content_bold, max_width_content,
-            color="black", anchor="lt"
-        )
-
-    return image_to_draw_on
-
-# Thêm biến đếm toàn cục cho text_with_emoji (giống như chapter_count)
-text_with_emoji_count = 0
-
-def add_data_for_text_with_emoji(image_to_draw_on, data, font_dir, emoji_dir="emojis"):
+        y = resolve_canvas_value(box.y, image)
+    max_width = resolve_canvas_value(box.max_width, image)
+
+    if box.list_prefix is not None and isinstance(value, list):
+        # Dạng list: mỗi item một dòng có gạch đầu dòng
+        current_y = y
+        for item in value:
+            image, line_height = _draw_text(image, box, f"{box.list_prefix}{item}", x, current_y,
+                                            regular_font, bold_font, max_width, ctx)
+            current_y += line_height + box.list_spacing
+        return image, (y, current_y - y)
+
+    image, text_height = _draw_text(image, box, str(value), x, y, regular_font, bold_font, max_width, ctx)
+    return image, (y, text_height)
+
+def paint_emoji_slot(image, slot, data, ctx):
+    emoji_char = resolve_field(data, slot.field, slot.default)
+    pos = (int(resolve_canvas_value(slot.x, image)), int(resolve_canvas_value(slot.y, image)))
+    return paste_emoji_image(image, emoji_char, pos, slot.size, ctx.emoji_dir)
+
+def paint_emoji_corners(image, corners, data, ctx, usage_number):
     """
-    Template: Văn bản ở giữa, emoji ở góc.
-    Luân phiên vị trí: lần lẻ trên trái & dưới phải, lần chẵn trên phải & dưới trái
+    Emoji ở góc, luân phiên vị trí: lần lẻ dùng odd_positions, lần chẵn dùng even_positions.
+    usage_number: số lần template được dùng trong deck (đã gán trước khi render song song)
     """
-    global text_with_emoji_count
-    text_with_emoji_count += 1
-    
-    # Load font
-    font_text_regular = load_font(font_dir, "NotoSans-Regular.ttf", 130)
-    font_text_bold = load_font(font_dir, "NotoSans-Bold.ttf", 130)
-
-    # Emoji chars
-    emoji_chars = data.get("emoji_chars", [])
+    emoji_chars = resolve_field(data, corners.field, [])
     if not isinstance(emoji_chars, list):
         emoji_chars = [emoji_chars]
 
@@ -634,269 +785,251 @@ def add_data_for_text_with_emoji(image_to_draw_on, data, font_dir, emoji_dir="em
     if len(emoji_chars) == 1:
         emoji_chars = emoji_chars * 2
 
-    # Size emoji
-    emoji_size = 250
-    margin = 50
-
-    # === Vẽ emoji vào góc ===
-    for idx, char in enumerate(emoji_chars[:2]):
-        # Tạo ảnh tạm để xoay
-        tmp_img = Image.new("RGBA", image_to_draw_on.size, (0, 0, 0, 0))
-        
-        # Chọn vị trí dựa trên số lần đã dùng
-        if text_with_emoji_count % 2 == 1:
-            # Lần lẻ (1, 3, 5...): trái trên - phải dưới
-            if idx == 0:  # Trái trên
-                pos = (100, 100)
-            else:  # Phải dưới
-                pos = (2200, 1100)
-        else:
-            # Lần chẵn (2, 4, 6...): phải trên - trái dưới
-            if idx == 0:  # Phải trên
-                pos = (2200, 100)
-            else:  # Trái dưới
-                pos = (100, 1100)
-
-        # Dán emoji vào ảnh tạm
-        paste_emoji_image(tmp_img, char, pos, emoji_size, emoji_dir)
-
-        # Xoay nhẹ
-        angle = 0
-        tmp_img = tmp_img.rotate(angle, resample=Image.BICUBIC)
-
-        # Ghép vào ảnh gốc
-        image_to_draw_on = Image.alpha_composite(image_to_draw_on.convert("RGBA"), tmp_img)
-
-    # === Vẽ text giữa ảnh ===
-    text = data.get("text", "")
-    center_x = 400
-    center_y = 440
-    max_width_text = 1900
-
-    image_to_draw_on, _ = draw_mixed_text_with_markdown(
-        image_to_draw_on, text,
-        center_x, center_y,
-        font_text_regular, font_text_regular, max_width_text,
-        color="black", anchor="lt"
-    )
-
-    return image_to_draw_on
+    positions = corners.odd_positions if usage_number % 2 == 1 else corners.even_positions
+    emoji_size = corners.size
+    for char, pos in zip(emoji_chars, positions):
+        # Dán emoji vào tile tạm trong suốt, chỉ bằng kích thước emoji
+        tile = Image.new("RGBA", (emoji_size, emoji_size), (0, 0, 0, 0))
+        paste_emoji_image(tile, char, (0, 0), emoji_size, ctx.emoji_dir)
+
+        # Xoay nhẹ quanh tâm emoji, bỏ qua khi góc bằng 0
+        if corners.angle % 360:
+            tile = tile.rotate(corners.angle, resample=Image.BICUBIC, expand=True)
+            pos = (pos[0] - (tile.width - emoji_size) // 2, pos[1] - (tile.height - emoji_size) // 2)
+
+        # Ghép vào ảnh gốc, chỉ trong vùng của tile
+        alpha_composite_clipped(image, tile, pos)
+    return image
+
+def draw_plain_lines(draw, text, x, y, font, max_width, line_spacing):
+    """Wrap text thường và vẽ từng dòng từ (x, y), trả về y ngay dưới dòng cuối"""
+    lines, _ = wrap_text_to_fit_width(text, font, max_width)
+    current_y = y
+    for line in lines:
+        draw.text((x, current_y), line, fill="black", font=font, anchor="lt")
+        current_y += get_text_height(line, font) * line_spacing
+    return current_y
+
+def paint_plain_lines(image, element, data, font_dir):
+    text = resolve_field(data, element.field, element.default)
+    if text:
+        font = load_font(font_dir, element.font, element.font_size)
+        draw_plain_lines(ImageDraw.Draw(image), text, resolve_canvas_value(element.x, image),
+                         resolve_canvas_value(element.y, image), font, element.max_width, element.line_spacing)
+    return image
+
+def paint_step_columns(image, element, data, font_dir):
+    """Mỗi bước một cột tại vị trí cố định: title (in đậm), bên dưới là content (in thường)"""
+    steps_data = resolve_field(data, element.field, element.default)
+    font_step_title = load_font(font_dir, element.title_font, element.title_font_size)
+    font_content = load_font(font_dir, element.content_font, element.content_font_size)
+    draw = ImageDraw.Draw(image)
 
-def add_data_for_3_steps(image_to_draw_on, data, font_dir):
-    """
-    Template 3_steps: Title tổng + 3 bước với vị trí cố định trong code
-    - Main title: ở trên cùng bên trái (vị trí cố định)
-    - Steps: 3 vị trí cố định trong code
-    """
-    # Main title và steps data
-    main_title = data.get('title', '')
-    steps_data = data.get('steps', [])
-    
-    # Font
-    font_main_title = load_font(font_dir, "NotoSans-Bold.ttf", 100)  # Main title
-    font_step_title = load_font(font_dir, "NotoSans-Bold.ttf", 80)   # Step title in hoa
-    font_content = load_font(font_dir, "NotoSans-Regular.ttf", 50)   # Content in thường
-    
-    # Chuyển đổi sang RGBA nếu cần
-    if image_to_draw_on.mode != 'RGBA':
-        image_to_draw_on = image_to_draw_on.convert('RGBA')
-    
-    draw = ImageDraw.Draw(image_to_draw_on)
-    
-    # === VỊ TRÍ CỐ ĐỊNH ===
-    # Main title position
-    main_title_x = 100
-    main_title_y = 100
-    main_title_max_width = 2000
-    
-    # 3 step positions (cố định trong code)
-    step_positions = [
-        {"x": 310, "y": 655, "max_width": 600},    # Step 1: Trái
-        {"x": 1060, "y": 655, "max_width": 600},   # Step 2: Giữa  
-        {"x": 1810, "y": 655, "max_width": 500}    # Step 3: Phải
-    ]
-    
-    # === Vẽ Main Title (trên cùng bên trái) ===
-    if main_title:
-        title_lines, _ = wrap_text_to_fit_width(main_title, font_main_title, main_title_max_width)
-        current_y = main_title_y
-        
-        for line in title_lines:
-            draw.text((main_title_x, current_y), line, fill="black", font=font_main_title, anchor="lt")
-            current_y += get_text_height(line, font_main_title) * 1.3
-    
-    # === Vẽ từng Step với vị trí cố định ===
-    for i, step in enumerate(steps_data[:3]):  # Chỉ lấy tối đa 3 step
-        if i >= len(step_positions):
-            break
-            
-        pos = step_positions[i]
-        step_x = pos["x"]
-        step_y = pos["y"]
-        max_width = pos["max_width"]
-        
-        # Step title (in hoa)
+    for step, (step_x, step_y, max_width) in zip(steps_data, element.positions):
         step_title = step.get('title', '')
         if step_title:
-            title_lines, _ = wrap_text_to_fit_width(step_title, font_step_title, max_width)
-            current_y = step_y
-            
-            for line in title_lines:
-                draw.text((step_x, current_y), line, fill="black", font=font_step_title, anchor="lt")
-                current_y += get_text_height(line, font_step_title) * 1.3
-            
             # Vị trí cho content (cách title một khoảng)
-            content_y = current_y-30
+            content_y = draw_plain_lines(draw, step_title, step_x, step_y, font_step_title, max_width,
+                                         element.line_spacing) - element.content_gap
         else:
             content_y = step_y
-        
-        # Step content (in thường)
+
         step_content = step.get('content', '')
         if step_content:
-            content_lines, _ = wrap_text_to_fit_width(step_content, font_content, max_width)
-            current_content_y = content_y
-            
-            for line in content_lines:
-                draw.text((step_x, current_content_y), line, fill="black", font=font_content, anchor="lt")
-                current_content_y += get_text_height(line, font_content) * 1.3
-    
-    return image_to_draw_on
+            draw_plain_lines(draw, step_content, step_x, content_y, font_content, max_width, element.line_spacing)
+    return image
 
-def add_data_for_4_steps(image_to_draw_on, data, font_dir):
+def add_template_data(image_to_draw_on, spec, data, font_dir, ctx, usage_number=None):
     """
-    Template 3_steps: Title tổng + 3 bước với vị trí cố định trong code
-    - Main title: ở trên cùng bên trái (vị trí cố định)
-    - Steps: 3 vị trí cố định trong code
+    Vẽ data lên nền theo layout của template (spec), các phần tử lần lượt theo thứ tự khai báo.
+    usage_number: số lần dùng đã gán trước cho template alternating (khi render song song),
+    None thì lấy từ bộ đếm text_with_emoji của ctx
     """
-    # Main title và steps data
-    main_title = data.get('title', '')
-    steps_data = data.get('steps', [])
-    
-    # Font
-    font_main_title = load_font(font_dir, "NotoSans-Bold.ttf", 100)  # Main title
-    font_step_title = load_font(font_dir, "NotoSans-Bold.ttf", 80)   # Step title in hoa
-    font_content = load_font(font_dir, "NotoSans-Regular.ttf", 50)   # Content in thường
-    
-    # Chuyển đổi sang RGBA nếu cần
+    if spec.alternating and usage_number is None:
+        usage_number = ctx.next_text_with_emoji_number()
+    compiled = compile_template(spec, ctx.scale)
+
+    # Đảm bảo image ở chế độ RGBA để blend emoji và nền highlight
     if image_to_draw_on.mode != 'RGBA':
         image_to_draw_on = image_to_draw_on.convert('RGBA')
-    
-    draw = ImageDraw.Draw(image_to_draw_on)
-    
-    # === VỊ TRÍ CỐ ĐỊNH ===
-    # Main title position
-    main_title_x = 100
-    main_title_y = 100
-    main_title_max_width = 2000
-    
-    # 3 step positions (cố định trong code)
-    step_positions = [
-        {"x": 60, "y": 655, "max_width": 600},
-        {"x": 740, "y": 655, "max_width": 600},
-        {"x": 1420, "y": 655, "max_width": 500},
-        {"x": 2100, "y": 655, "max_width": 500}
-    ]
-    
-    # === Vẽ Main Title (trên cùng bên trái) ===
-    if main_title:
-        title_lines, _ = wrap_text_to_fit_width(main_title, font_main_title, main_title_max_width)
-        current_y = main_title_y
-        
-        for line in title_lines:
-            draw.text((main_title_x, current_y), line, fill="black", font=font_main_title, anchor="lt")
-            current_y += get_text_height(line, font_main_title) * 1.3
-    
-    # === Vẽ từng Step với vị trí cố định ===
-    for i, step in enumerate(steps_data[:4]):  # Chỉ lấy tối đa 3 step
-        if i >= len(step_positions):
-            break
-            
-        pos = step_positions[i]
-        step_x = pos["x"]
-        step_y = pos["y"]
-        max_width = pos["max_width"]
-        
-        # Step title (in hoa)
-        step_title = step.get('title', '')
-        if step_title:
-            title_lines, _ = wrap_text_to_fit_width(step_title, font_step_title, max_width)
-            current_y = step_y
-            
-            for line in title_lines:
-                draw.text((step_x, current_y), line, fill="black", font=font_step_title, anchor="lt")
-                current_y += get_text_height(line, font_step_title) * 1.3
-            
-            # Vị trí cho content (cách title một khoảng)
-            content_y = current_y-30
-        else:
-            content_y = step_y
-        
-        # Step content (in thường)
-        step_content = step.get('content', '')
-        if step_content:
-            content_lines, _ = wrap_text_to_fit_width(step_content, font_content, max_width)
-            current_content_y = content_y
-            
-            for line in content_lines:
-                draw.text((step_x, current_content_y), line, fill="black", font=font_content, anchor="lt")
-                current_content_y += get_text_height(line, font_content) * 1.3
-    
+
+    previous_text = None
+    for element in compiled.elements:
+        if isinstance(element, TextBox):
+            image_to_draw_on, previous_text = paint_text_box(image_to_draw_on, element, data, font_dir, ctx,
+                                                             previous_text)
+        elif isinstance(element, EmojiSlot):
+            image_to_draw_on = paint_emoji_slot(image_to_draw_on, element, data, ctx)
+        elif isinstance(element, EmojiCorners):
+            image_to_draw_on = paint_emoji_corners(image_to_draw_on, element, data, ctx, usage_number)
+        elif isinstance(element, PlainLines):
+            image_to_draw_on = paint_plain_lines(image_to_draw_on, element, data, font_dir)
+        elif isinstance(element, StepColumns):
+            image_to_draw_on = paint_step_columns(image_to_draw_on, element, data, font_dir)
+
     return image_to_draw_on
 
 # ==============================================================================
 # --- XỬ LÝ SLIDE ---
 # ==============================================================================
 
-def process_slide(template_file, data, template_dir, font_dir, output_dir, random_hue=random.randint(0, 360)):
-    global chapter_count
-
+def get_template_path(template_file, template_dir, chapter_number):
+    """Đường dẫn file template; template numbered_variants (chapter) thì thay bằng chapter_X.png"""
     template_name_no_ext = os.path.splitext(template_file)[0]
+    spec = get_template_spec(template_name_no_ext, template_dir)
+    if spec is not None and spec.numbered_variants:
+        return os.path.join(template_dir, f"{template_name_no_ext}_{chapter_number}.png")
+    return os.path.join(template_dir, template_file)
+
+def render_slide(template_file, data, template_dir, font_dir, ctx, chapter_number=None, text_with_emoji_number=None):
+    """
+    Render một slide của deck (ctx) thành ảnh, không lưu.
+    Layout lấy từ registry (template_layouts); template không có layout thì chỉ có nền.
+    Trả về None nếu không tìm thấy template.
+    """
+    spec = get_template_spec(os.path.splitext(template_file)[0], template_dir)
 
     # Nếu là chapter thì thay bằng chapter_X.png
-    if template_name_no_ext == "chapter":
-        chapter_count += 1
-        chapter_img_name = f"chapter_{chapter_count}.png"
-        template_path = os.path.join(template_dir, chapter_img_name)
-    else:
-        template_path = os.path.join(template_dir, template_file)
+    if spec is not None and spec.numbered_variants and chapter_number is None:
+        chapter_number = ctx.next_chapter_number()
+    template_path = get_template_path(template_file, template_dir, chapter_number)
 
     try:
-        template_img = Image.open(template_path).convert('RGBA')
+        image_with_background = load_template_background(template_path, ctx.hue, ctx.scale)
     except FileNotFoundError:
         print(f"❌ Không tìm thấy template '{template_path}'")
+        return None
+
+    if spec is None:
+        return image_with_background
+    return add_template_data(image_with_background, spec, data, font_dir, ctx,
+                             usage_number=text_with_emoji_number)
+
+def process_slide(template_file, data, template_dir, font_dir, output_dir, ctx,
+                  slide_number=None, chapter_number=None, text_with_emoji_number=None):
+    """
+    Render một slide của deck (ctx) và lưu vào output_dir (hoặc vào ctx.outputs nếu ctx.in_memory).
+    slide_number / chapter_number / text_with_emoji_number: các bộ đếm đã gán trước (xem plan_deck),
+    None thì lấy tiếp từ các bộ đếm của ctx như khi chạy tuần tự
+    """
+    template_name_no_ext = os.path.splitext(template_file)[0]
+    final_image = render_slide(template_file, data, template_dir, font_dir, ctx,
+                               chapter_number=chapter_number, text_with_emoji_number=text_with_emoji_number)
+    if final_image is None:
         return False
 
-    image_with_background = apply_background(template_img, random_hue)
-
-    if template_name_no_ext == "opening":
-        final_image = add_data_for_opening(image_with_background, data, font_dir)
-    elif template_name_no_ext == "definition":
-        final_image = add_data_for_definition(image_with_background, data, font_dir)
-    elif template_name_no_ext == "chapter":
-        final_image = add_data_for_chapter(image_with_background, data, font_dir)
-    elif template_name_no_ext == "quote":
-        final_image = add_data_for_quote(image_with_background, data, font_dir)
-    elif template_name_no_ext == "question":
-        final_image = add_data_for_question(image_with_background, data, font_dir)
-    elif template_name_no_ext == "side_by_side":
-        final_image = add_data_for_side_by_side(image_with_background, data, font_dir)
-    elif template_name_no_ext == "blank":
-        final_image = add_data_for_blank(image_with_background, data, font_dir)
-    elif template_name_no_ext == "text_with_emoji":
-        final_image = add_data_for_text_with_emoji(image_with_background, data, font_dir)
-    elif template_name_no_ext == "3_steps":
-        final_image = add_data_for_3_steps(image_with_background, data, font_dir)
-    elif template_name_no_ext == "4_steps":
-        final_image = add_data_for_4_steps(image_with_background, data, font_dir)
+    if slide_number is None:
+        output_filename = ctx.next_output_filename(output_dir, template_name_no_ext)
     else:
-        final_image = image_with_background
-
-    os.makedirs(output_dir, exist_ok=True)
-    output_filename = get_next_filename_with_suffix(output_dir, template_name_no_ext)
-    final_image.save(output_filename)
-    print(f"✅ Đã lưu '{output_filename}'")
+        output_filename = ctx.output_filename(output_dir, slide_number, template_name_no_ext)
+    ctx.write_output(final_image, output_filename)
+    if ctx.in_memory:
+        print(f"✅ Đã render '{output_filename}' (trong bộ nhớ)")
+    else:
+        print(f"✅ Đã lưu '{output_filename}'")
     return True
 
+# ==============================================================================
+# --- RENDER CẢ BỘ SLIDE SONG SONG ---
+# ==============================================================================
+
+# Một slide đã được gán sẵn các bộ đếm, có thể render độc lập ở bất kỳ process nào
+SlideJob = namedtuple("SlideJob", [
+    "index", "template", "data", "slide_number", "chapter_number", "text_with_emoji_number",
+])
+
+# Kết quả render một slide; error là None nếu thành công
+# data: slide đã mã hóa (bytes) khi ctx.in_memory, ngược lại là None
+SlideResult = namedtuple("SlideResult", ["index", "template", "output_filename", "error", "data"],
+                         defaults=[None])
+
+def plan_deck(slides_data, template_dir, ctx):
+    """
+    Gán trước số thứ tự file, số chapter và số lần dùng text_with_emoji cho từng slide
+    bằng các bộ đếm của ctx, theo đúng thứ tự mà vòng lặp tuần tự sẽ tăng chúng.
+    Registry layout được nạp (và kiểm tra) ở đây, nên layout sai báo lỗi trước khi render slide nào
+    """
+    jobs = []
+    load_registry(template_dir)
+
+    for index, slide_config in enumerate(slides_data):
+        template_file = slide_config["template"]
+        spec = get_template_spec(os.path.splitext(template_file)[0], template_dir)
+
+        chapter_number = None
+        if spec is not None and spec.numbered_variants:
+            chapter_number = ctx.next_chapter_number()
+
+        # Slide thiếu template không được đánh số, giống process_slide tuần tự
+        template_path = get_template_path(template_file, template_dir, chapter_number)
+        if not os.path.isfile(template_path):
+            jobs.append(SlideJob(index, template_file, slide_config["data"], None, chapter_number, None))
+            continue
+
+        slide_number = ctx.next_slide_number()
+        text_with_emoji_number = None
+        if spec is not None and spec.alternating:
+            text_with_emoji_number = ctx.next_text_with_emoji_number()
+
+        jobs.append(SlideJob(index, template_file, slide_config["data"], slide_number,
+                             chapter_number, text_with_emoji_number))
+    return jobs
+
+def render_slide_job(job, template_dir, font_dir, output_dir, ctx):
+    """Render một SlideJob, bắt mọi lỗi để báo cáo theo từng slide"""
+    template_name_no_ext = os.path.splitext(job.template)[0]
+    if job.slide_number is None:
+        template_path = get_template_path(job.template, template_dir, job.chapter_number)
+        return SlideResult(job.index, job.template, None, f"Không tìm thấy template '{template_path}'")
+
+    output_filename = ctx.output_filename(output_dir, job.slide_number, template_name_no_ext)
+    try:
+        process_slide(job.template, job.data, template_dir, font_dir, output_dir, ctx,
+                      slide_number=job.slide_number, chapter_number=job.chapter_number,
+                      text_with_emoji_number=job.text_with_emoji_number)
+    except Exception:
+        return SlideResult(job.index, job.template, None, traceback.format_exc())
+    return SlideResult(job.index, job.template, output_filename, None, ctx.outputs.get(output_filename))
+
+def render_deck(slides_data, template_dir, font_dir, output_dir, ctx=None, max_workers=None):
+    """
+    Render cả bộ slide trên một process pool.
+    Kết quả trả về theo đúng thứ tự slides_data; file output giống hệt khi render tuần tự.
+    ctx=None thì tạo deck mới với hue ngẫu nhiên; max_workers=None thì dùng số nhân CPU (không quá số slide),
+    max_workers=1 (hoặc deck chỉ có một slide) thì render ngay trong process hiện tại.
+    Với ctx.in_memory, slide đã mã hóa có trong SlideResult.data và ctx.outputs.
+    """
+    if ctx is None:
+        ctx = RenderContext()
+    jobs = plan_deck(slides_data, template_dir, ctx)
+    # Mỗi worker là một interpreter riêng (import Pillow, nạp font): không tạo nhiều hơn số slide
+    max_workers = min(max_workers or os.cpu_count() or 1, max(1, len(jobs)))
+
+    if max_workers == 1:
+        warm_up_fonts(font_dir, scale=ctx.scale)
+        return [render_slide_job(job, template_dir, font_dir, output_dir, ctx) for job in jobs]
+
+    results = []
+    # Worker được spawn (process mới), không fork: render_deck có thể được gọi từ một thread trong khi
+    # các thread khác (TTS, stream text, HTTP) đang giữ lock, fork lúc đó có thể làm worker bị treo
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=warm_up_fonts,
+                             initargs=(font_dir, TEMPLATE_FONT_NAMES, TEMPLATE_FONT_SIZES, ctx.scale)) as executor:
+        futures = [executor.submit(render_slide_job, job, template_dir, font_dir, output_dir, ctx)
+                   for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # Worker bị chết (vd. hết bộ nhớ) thì vẫn báo lỗi đúng slide
+                results.append(SlideResult(job.index, job.template, None, repr(e)))
+                continue
+            if result.data is not None:
+                with ctx._lock:
+                    ctx.outputs[result.output_filename] = result.data
+            results.append(result)
+    return results
+
 # ==============================================================================
 # --- CHẠY CHÍNH ---
 # ==============================================================================
@@ -933,10 +1066,13 @@ if __name__ == "__main__":
         }
     ]
 
+    results = render_deck(slides_data, TEMPLATE_DIR, FONT_DIR, OUTPUT_DIR)
+
     successful_slides = 0
-    random_hue = random.randint(0, 360)
-    for slide_config in slides_data:
-        if process_slide(slide_config["template"], slide_config["data"], TEMPLATE_DIR, FONT_DIR, OUTPUT_DIR, random_hue):
+    for result in results:
+        if result.error is None:
             successful_slides += 1
+        else:
+            print(f"❌ Slide {result.index + 1} ({result.template}): {result.error}")
 
     print(f"Hoàn tất: {successful_slides}/{len(slides_data)} slide.")
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Tô màu nền cho template bằng NumPy.
+
+Mỗi template chỉ được phân tích một lần: ảnh RGBA được nén thành bảng các màu khác nhau
+(alpha và RGB đã nhân alpha) cùng một mảng chỉ số cho từng pixel. Nền cho một hue bất kỳ
+chỉ cần trộn bảng màu (vài trăm đến vài nghìn màu) rồi tra bảng cho cả khung hình một lần.
+Kết quả giống hệt Image.paste(template, mask=template) lên nền màu đặc.
+"""
+import os
+import sys
+import colorsys
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+# Màu nền: HSL(hue, 100%, 41%) như apply_background
+BACKGROUND_SATURATION = 100
+BACKGROUND_LIGHTNESS = 41
+
+# size: (width, height)
+# indices: chỉ số màu của từng pixel (height x width)
+# inv_alpha: 255 - alpha của từng màu trong bảng
+# premultiplied: RGB * alpha của từng màu trong bảng
+PreparedTemplate = namedtuple("PreparedTemplate", ["size", "indices", "inv_alpha", "premultiplied"])
+
+def hsl_to_rgb(h, s, l):
+    r, g, b = colorsys.hls_to_rgb(h / 360.0, l / 100.0, s / 100.0)
+    return int(r * 255), int(g * 255), int(b * 255)
+
+def background_color(hue):
+    return hsl_to_rgb(hue, BACKGROUND_SATURATION, BACKGROUND_LIGHTNESS)
+
+def prepare_template(template_image):
+    """Phân tích template RGBA một lần thành PreparedTemplate"""
+    rgba = np.asarray(template_image.convert('RGBA'))
+    height, width = rgba.shape[:2]
+
+    # Mỗi pixel RGBA xem như một số uint32 để tìm các màu khác nhau
+    colors, indices = np.unique(rgba.reshape(-1, 4).view(np.uint32).ravel(), return_inverse=True)
+    index_dtype = np.uint16 if len(colors) <= 1 << 16 else np.uint32
+
+    colors = colors.view(np.uint8).reshape(-1, 4).astype(np.uint16)
+    alpha = colors[:, 3]
+    return PreparedTemplate(
+        (width, height),
+        indices.astype(index_dtype).reshape(height, width),
+        255 - alpha,
+        colors[:, :3] * alpha[:, None],
+    )
+
+def prepared_nbytes(prepared):
+    """Dung lượng bộ nhớ của một PreparedTemplate (byte)"""
+    return prepared.indices.nbytes + prepared.inv_alpha.nbytes + prepared.premultiplied.nbytes
+
+def _blend_tables(prepared, background_colors):
+    """
+    Trộn bảng màu của template với N màu nền trong một phép tính vector.
+    Trả về mảng (N, số màu) uint32, mỗi phần tử là một pixel RGBX.
+    Cùng công thức làm tròn DIV255 với Image.paste có mask; mọi giá trị trung gian
+    không vượt quá 255 * 255 + 255 + 128 nên tính bằng uint16 không bị tràn.
+    """
+    backgrounds = np.asarray(background_colors, dtype=np.uint16).reshape(-1, 1, 3)
+    tmp = prepared.inv_alpha[None, :, None] * backgrounds + prepared.premultiplied[None] + 128
+    tables = np.empty(tmp.shape[:2] + (4,), dtype=np.uint8)
+    tables[..., :3] = ((tmp >> 8) + tmp) >> 8
+    tables[..., 3] = 255
+    return tables.view(np.uint32)[..., 0]
+
+def _expand(prepared, table):
+    """Tra bảng màu cho cả khung hình, trả về ảnh RGB"""
+    pixels = np.take(table, prepared.indices)
+    return Image.frombytes('RGB', prepared.size, pixels, 'raw', 'RGBX')
+
+def recolor_template(prepared, hue):
+    """Nền của template với một hue"""
+    return _expand(prepared, _blend_tables(prepared, [background_color(hue)])[0])
+
+def recolor_bulk(prepared_templates, hues):
+    """
+    Chế độ hàng loạt: tạo nền cho mọi template với mọi hue.
+    prepared_templates: dict tên template -> PreparedTemplate.
+    Bảng màu của mỗi template được trộn với tất cả hue trong một lần; ảnh được trả về
+    dần dần dạng (tên template, hue, ảnh RGB) để bộ nhớ không tăng theo số hue.
+    """
+    hues = list(hues)
+    colors = [background_color(hue) for hue in hues]
+    for name, prepared in prepared_templates.items():
+        tables = _blend_tables(prepared, colors)
+        for hue, table in zip(hues, tables):
+            yield name, hue, _expand(prepared, table)
+
+def prepare_template_dir(template_dir):
+    """Phân tích tất cả template PNG trong thư mục, trả về dict tên (không đuôi) -> PreparedTemplate"""
+    prepared_templates = {}
+    for filename in sorted(os.listdir(template_dir)):
+        if filename.lower().endswith('.png'):
+            with Image.open(os.path.join(template_dir, filename)) as template_image:
+                prepared_templates[os.path.splitext(filename)[0]] = prepare_template(template_image)
+    return prepared_templates
+
+# --- PHẦN THỰC THI CHÍNH: xuất bản xem trước theme cho nhiều hue ---
+if __name__ == "__main__":
+    # python recolor.py <hue> [<hue> ...]
+    hues = [int(arg) for arg in sys.argv[1:]] or [0, 60, 120, 180, 240, 300]
+    template_directory = 'templates'
+    output_directory = 'output_theme_preview'
+
+    prepared_templates = prepare_template_dir(template_directory)
+    for name, hue, image in recolor_bulk(prepared_templates, hues):
+        hue_directory = os.path.join(output_directory, f"hue_{hue}")
+        os.makedirs(hue_directory, exist_ok=True)
+        image.save(os.path.join(hue_directory, f"{name}_colorized.png"))
+    print(f"✅ Đã xuất {len(prepared_templates)} template x {len(hues)} hue vào '{output_directory}'")
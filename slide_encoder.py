@@ -0,0 +1,61 @@
+"""
+Mã hóa slide đã render: chọn format, chế độ màu và mức nén khi lưu ra file hoặc giữ trong bộ nhớ.
+
+Slide sau apply_background luôn đục (không có vùng trong suốt), nên các preset ngoài "png"
+đều chuyển sang RGB để bỏ kênh alpha thừa.
+"""
+import io
+from collections import namedtuple
+
+# name: tên preset
+# format: tên format của Pillow
+# extension: đuôi file output
+# mode: chế độ màu trước khi mã hóa, None = giữ nguyên
+# options: tham số truyền cho Image.save
+SlideEncoder = namedtuple("SlideEncoder", ["name", "format", "extension", "mode", "options"])
+
+ENCODERS = {encoder.name: encoder for encoder in [
+    # Giống hệt cách lưu cũ: PNG giữ nguyên RGBA, mức nén mặc định của Pillow
+    SlideEncoder("png", "PNG", ".png", None, {}),
+    SlideEncoder("png_rgb", "PNG", ".png", "RGB", {}),
+    SlideEncoder("png_fast", "PNG", ".png", "RGB", {"compress_level": 1}),
+    SlideEncoder("png_small", "PNG", ".png", "RGB", {"compress_level": 9}),
+    SlideEncoder("webp_lossless", "WEBP", ".webp", "RGB", {"lossless": True, "quality": 50, "method": 4}),
+    SlideEncoder("webp", "WEBP", ".webp", "RGB", {"quality": 90, "method": 4}),
+    SlideEncoder("jpeg_high", "JPEG", ".jpg", "RGB", {"quality": 95, "subsampling": 0}),
+    SlideEncoder("jpeg", "JPEG", ".jpg", "RGB", {"quality": 85}),
+    SlideEncoder("jpeg_draft", "JPEG", ".jpg", "RGB", {"quality": 70}),
+]}
+
+DEFAULT_ENCODER = "png"
+
+def make_encoder(name, format, extension, mode="RGB", **options):
+    """Tạo preset tùy chỉnh, vd. make_encoder("png_3", "PNG", ".png", compress_level=3)"""
+    return SlideEncoder(name, format, extension, mode, options)
+
+def get_encoder(encoder):
+    """Nhận tên preset hoặc SlideEncoder, trả về SlideEncoder"""
+    if isinstance(encoder, SlideEncoder):
+        return encoder
+    try:
+        return ENCODERS[encoder]
+    except KeyError:
+        raise ValueError(f"Không có encoder '{encoder}', chọn một trong: {', '.join(ENCODERS)}") from None
+
+def prepare_image(image, encoder):
+    """Chuyển chế độ màu theo preset"""
+    if encoder.mode and image.mode != encoder.mode:
+        return image.convert(encoder.mode)
+    return image
+
+def encode_image(image, encoder):
+    """Mã hóa ảnh vào bộ nhớ, trả về bytes (không ghi file)"""
+    encoder = get_encoder(encoder)
+    buffer = io.BytesIO()
+    prepare_image(image, encoder).save(buffer, format=encoder.format, **encoder.options)
+    return buffer.getvalue()
+
+def save_image(image, path, encoder):
+    """Mã hóa và ghi ảnh ra file"""
+    encoder = get_encoder(encoder)
+    prepare_image(image, encoder).save(path, format=encoder.format, **encoder.options)
@@ -0,0 +1,298 @@
+"""
+Layout của các template slide, khai báo dạng dữ liệu.
+
+Mỗi template là một TemplateSpec gồm danh sách phần tử được vẽ lần lượt lên nền:
+- TextBox: một ô text (tự detect markdown, hoặc luôn tô nền bold), có thể là list gạch đầu dòng
+- EmojiSlot: một emoji ở vị trí cố định
+- EmojiCorners: các emoji ở góc, vị trí luân phiên theo số lần template được dùng trong deck
+- PlainLines: text thường, wrap và vẽ từng dòng
+- StepColumns: các cột bước (title + content), mỗi cột một vị trí
+
+Tọa độ, độ rộng và cỡ chữ là giá trị pixel của khung 2560x1440; bộ render nhân theo scale của deck.
+Tọa độ có thể là số, CanvasPos (tương đối theo kích thước khung hình) hoặc Below (ngay dưới ô text trước đó).
+
+Thêm template mới không cần sửa code: đặt file layouts.json trong thư mục template, vd.
+    [{"name": "summary", "elements": [
+        {"type": "text", "field": "title", "x": {"canvas": "x", "divisors": [2]}, "y": 300,
+         "max_width": 2000, "font_size": 120, "anchor": "mt"},
+        {"type": "text", "field": "content", "x": 200, "y": {"below": 100}, "max_width": 2160,
+         "font_size": 70, "default": "", "list_prefix": "• "}
+    ]}]
+Template trong layouts.json ghi đè template có sẵn cùng tên.
+"""
+import os
+import json
+import functools
+from collections import namedtuple
+
+REGULAR_FONT = "NotoSans-Regular.ttf"
+BOLD_FONT = "NotoSans-Bold.ttf"
+
+TEMPLATE_LAYOUTS_FILE = "layouts.json"
+
+# Tọa độ tương đối theo khung hình: 0 + size / d với mỗi d trong divisors (d âm thì trừ size / -d),
+# rồi cộng offset. axis: "x" (theo chiều rộng) hoặc "y" (theo chiều cao)
+CanvasPos = namedtuple("CanvasPos", ["axis", "divisors", "offset"], defaults=[0])
+
+# Tọa độ y ngay dưới ô text vẽ trước đó: y + chiều cao + offset
+Below = namedtuple("Below", ["offset"], defaults=[0])
+
+# field: tên khóa trong data, hoặc tuple đường dẫn vd. ("left", "content")
+# default: giá trị khi data thiếu khóa; None = bắt buộc phải có
+# style: "mixed" (tự detect markdown) hoặc "markdown" (luôn layout markdown, tô nền bold)
+# valign: "top" hoặc "middle" (căn giữa theo chiều cao của text tại y, lệch lên valign_offset)
+# list_prefix: khác None thì giá trị dạng list được vẽ thành từng dòng "prefix + item", cách nhau list_spacing
+TextBox = namedtuple("TextBox", [
+    "field", "x", "y", "max_width", "font_size", "regular_font", "bold_font", "anchor", "style",
+    "default", "valign", "valign_offset", "list_prefix", "list_spacing",
+], defaults=[REGULAR_FONT, BOLD_FONT, "lt", "mixed", None, "top", 0, None, 0])
+
+EmojiSlot = namedtuple("EmojiSlot", ["field", "x", "y", "size", "default"], defaults=["😀"])
+
+# Tối đa len(odd_positions) emoji; chỉ có 1 emoji thì được nhân đôi.
+# Lần dùng lẻ (1, 3, 5...) lấy odd_positions, lần chẵn lấy even_positions
+EmojiCorners = namedtuple("EmojiCorners", ["field", "size", "odd_positions", "even_positions", "angle"],
+                          defaults=[0])
+
+# Dòng sau cách dòng trước get_text_height(dòng) * line_spacing; text rỗng thì bỏ qua
+PlainLines = namedtuple("PlainLines", ["field", "x", "y", "max_width", "font_size", "font", "line_spacing", "default"],
+                        defaults=[BOLD_FONT, 1.3, ""])
+
+# positions: tuple các (x, y, max_width), mỗi bước một cột; bước thừa bị bỏ qua.
+# Content bắt đầu dưới dòng title cuối cùng, kéo lên content_gap
+StepColumns = namedtuple("StepColumns", [
+    "field", "positions", "title_font_size", "content_font_size", "title_font", "content_font",
+    "content_gap", "line_spacing", "default",
+], defaults=[BOLD_FONT, REGULAR_FONT, 30, 1.3, ()])
+
+# numbered_variants: file nền là <name>_<số>.png, số lấy từ bộ đếm chapter của deck
+# alternating: template cần số lần dùng trong deck (bộ đếm text_with_emoji) để luân phiên vị trí
+TemplateSpec = namedtuple("TemplateSpec", ["name", "elements", "numbered_variants", "alternating"],
+                          defaults=[False, False])
+
+# Tên kiểu phần tử trong layouts.json
+ELEMENT_TYPES = {
+    "text": TextBox,
+    "emoji": EmojiSlot,
+    "emoji_corners": EmojiCorners,
+    "plain_lines": PlainLines,
+    "steps": StepColumns,
+}
+
+# Các thuộc tính là pixel (nhân theo scale) và cỡ chữ của từng kiểu phần tử
+GEOMETRY_FIELDS = {
+    TextBox: ("x", "y", "max_width", "valign_offset", "list_spacing"),
+    EmojiSlot: ("x", "y", "size"),
+    EmojiCorners: ("size", "odd_positions", "even_positions"),
+    PlainLines: ("x", "y", "max_width"),
+    StepColumns: ("positions", "content_gap"),
+}
+FONT_FIELDS = {
+    TextBox: (("font_size", "regular_font"), ("font_size", "bold_font")),
+    EmojiSlot: (),
+    EmojiCorners: (),
+    PlainLines: (("font_size", "font"),),
+    StepColumns: (("title_font_size", "title_font"), ("content_font_size", "content_font")),
+}
+
+TEXT_ANCHORS = ("lt", "mt", "lm", "mm")
+TEXT_STYLES = ("mixed", "markdown")
+TEXT_VALIGNS = ("top", "middle")
+
+def _steps_layout(name, positions):
+    return TemplateSpec(name, (
+        PlainLines("title", 100, 100, 2000, 100),
+        StepColumns("steps", positions, 80, 50),
+    ))
+
+BUILTIN_TEMPLATES = (
+    TemplateSpec("opening", (
+        TextBox("title", CanvasPos("x", (2,)), 450, 2000, 150, regular_font=BOLD_FONT, anchor="mt"),
+    )),
+    TemplateSpec("definition", (
+        EmojiSlot("emoji", 1900, CanvasPos("y", (2,), -300), 300),
+        TextBox("term", 250, 300, 1400, 100, default=""),
+        TextBox("definition", 250, 500, 1400, 60, default=""),
+    )),
+    TemplateSpec("chapter", (
+        TextBox("title", CanvasPos("x", (2, -6)), CanvasPos("y", (2,)), 1500, 180,
+                valign="middle", valign_offset=50),
+    ), numbered_variants=True),
+    TemplateSpec("quote", (
+        TextBox("title", CanvasPos("x", (4,)), 390, 1500, 120),
+    )),
+    TemplateSpec("question", (
+        TextBox("title", CanvasPos("x", (2,)), 450, 2000, 150, anchor="mt"),
+    )),
+    TemplateSpec("side_by_side", (
+        EmojiSlot(("left", "emoji"), 200, 500, 200),
+        TextBox(("left", "content"), 200, 800, 950, 70, style="markdown", default=""),
+        EmojiSlot(("right", "emoji"), 1400, 500, 200),
+        TextBox(("right", "content"), 1400, 800, 950, 70, style="markdown", default=""),
+    )),
+    TemplateSpec("blank", (
+        TextBox("title", 200, 300, 2000, 120, regular_font=BOLD_FONT, default=""),
+        TextBox("content", 200, Below(100), CanvasPos("x", (1,), -400), 70, default="",
+                list_prefix="• ", list_spacing=20),
+    )),
+    TemplateSpec("text_with_emoji", (
+        EmojiCorners("emoji_chars", 250, ((100, 100), (2200, 1100)), ((2200, 100), (100, 1100))),
+        TextBox("text", 400, 440, 1900, 130, bold_font=REGULAR_FONT, default=""),
+    ), alternating=True),
+    _steps_layout("3_steps", ((310, 655, 600), (1060, 655, 600), (1810, 655, 500))),
+    _steps_layout("4_steps", ((60, 655, 600), (740, 655, 600), (1420, 655, 500), (2100, 655, 500))),
+)
+
+def field_path(field):
+    """Đường dẫn khóa của field dạng tuple"""
+    return (field,) if isinstance(field, str) else tuple(field)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _validate_coordinate(where, value, axis, allow_below=False):
+    if _is_number(value):
+        return
+    if isinstance(value, CanvasPos):
+        if value.axis not in ("x", "y"):
+            raise ValueError(f"{where}: axis phải là 'x' hoặc 'y', nhận được {value.axis!r}")
+        if not value.divisors or not all(_is_number(d) and d != 0 for d in value.divisors):
+            raise ValueError(f"{where}: divisors phải là các số khác 0")
+        if not _is_number(value.offset):
+            raise ValueError(f"{where}: offset phải là số")
+        return
+    if allow_below and isinstance(value, Below):
+        if not _is_number(value.offset):
+            raise ValueError(f"{where}: offset phải là số")
+        return
+    raise ValueError(f"{where}: tọa độ {axis} không hợp lệ: {value!r}")
+
+def _validate_positive(where, value):
+    if not _is_number(value) or value <= 0:
+        raise ValueError(f"{where}: phải là số dương, nhận được {value!r}")
+
+def _validate_positions(where, positions, length):
+    if not positions:
+        raise ValueError(f"{where}: cần ít nhất một vị trí")
+    for position in positions:
+        if len(position) != length or not all(_is_number(v) for v in position):
+            raise ValueError(f"{where}: vị trí {position!r} phải gồm {length} số")
+
+def validate_template_spec(spec):
+    """Kiểm tra một TemplateSpec, báo ValueError với mô tả lỗi đầu tiên tìm thấy"""
+    if not spec.name or not isinstance(spec.name, str):
+        raise ValueError(f"Tên template không hợp lệ: {spec.name!r}")
+    has_text = False
+    for idx, element in enumerate(spec.elements):
+        where = f"Template '{spec.name}', phần tử {idx + 1} ({type(element).__name__})"
+        if type(element) not in GEOMETRY_FIELDS:
+            raise ValueError(f"Template '{spec.name}', phần tử {idx + 1}: kiểu không hỗ trợ {element!r}")
+        if not field_path(element.field) or not all(isinstance(k, str) and k for k in field_path(element.field)):
+            raise ValueError(f"{where}: field không hợp lệ: {element.field!r}")
+        for size_field, font_field in FONT_FIELDS[type(element)]:
+            _validate_positive(f"{where}.{size_field}", getattr(element, size_field))
+            if not isinstance(getattr(element, font_field), str) or not getattr(element, font_field):
+                raise ValueError(f"{where}: {font_field} phải là tên file font")
+
+        if isinstance(element, TextBox):
+            _validate_coordinate(where, element.x, "x")
+            if isinstance(element.y, Below) and not has_text:
+                raise ValueError(f"{where}: Below cần một ô text vẽ trước đó")
+            _validate_coordinate(where, element.y, "y", allow_below=True)
+            _validate_coordinate(where, element.max_width, "max_width")
+            if element.anchor not in TEXT_ANCHORS:
+                raise ValueError(f"{where}: anchor phải là một trong {TEXT_ANCHORS}")
+            if element.style not in TEXT_STYLES:
+                raise ValueError(f"{where}: style phải là một trong {TEXT_STYLES}")
+            if element.valign not in TEXT_VALIGNS:
+                raise ValueError(f"{where}: valign phải là một trong {TEXT_VALIGNS}")
+            has_text = True
+        elif isinstance(element, EmojiSlot):
+            _validate_coordinate(where, element.x, "x")
+            _validate_coordinate(where, element.y, "y")
+            _validate_positive(f"{where}.size", element.size)
+        elif isinstance(element, EmojiCorners):
+            _validate_positive(f"{where}.size", element.size)
+            _validate_positions(f"{where}.odd_positions", element.odd_positions, 2)
+            _validate_positions(f"{where}.even_positions", element.even_positions, 2)
+            if not spec.alternating:
+                raise ValueError(f"{where}: template có EmojiCorners phải khai báo alternating=True")
+        elif isinstance(element, PlainLines):
+            _validate_coordinate(where, element.x, "x")
+            _validate_coordinate(where, element.y, "y")
+            _validate_positive(f"{where}.max_width", element.max_width)
+            _validate_positive(f"{where}.line_spacing", element.line_spacing)
+        elif isinstance(element, StepColumns):
+            _validate_positions(f"{where}.positions", element.positions, 3)
+            _validate_positive(f"{where}.line_spacing", element.line_spacing)
+    return spec
+
+# --- Đọc layout từ JSON ---
+
+def _coordinate_from_json(value):
+    if isinstance(value, dict):
+        if "canvas" in value:
+            return CanvasPos(value["canvas"], tuple(value.get("divisors", ())), value.get("offset", 0))
+        if "below" in value:
+            return Below(value["below"])
+    return value
+
+def _freeze(value):
+    """list trong JSON -> tuple, để spec bất biến và dùng được làm khóa cache"""
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def element_from_dict(config):
+    config = dict(config)
+    element_type = ELEMENT_TYPES.get(config.pop("type", None))
+    if element_type is None:
+        raise ValueError(f"Kiểu phần tử không hợp lệ trong {config!r}, chọn một trong: {', '.join(ELEMENT_TYPES)}")
+    for key in ("x", "y", "max_width"):
+        if key in config:
+            config[key] = _coordinate_from_json(config[key])
+    try:
+        return element_type(**{key: _freeze(value) for key, value in config.items()})
+    except TypeError as e:
+        raise ValueError(f"Phần tử {element_type.__name__} không hợp lệ: {e}") from None
+
+def template_spec_from_dict(config):
+    return TemplateSpec(
+        config.get("name"),
+        tuple(element_from_dict(element) for element in config.get("elements", ())),
+        bool(config.get("numbered_variants", False)),
+        bool(config.get("alternating", False)),
+    )
+
+def load_template_layouts(path):
+    """Đọc danh sách TemplateSpec từ file JSON"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [template_spec_from_dict(config) for config in json.load(f)]
+
+@functools.lru_cache(maxsize=None)
+def load_registry(template_dir):
+    """
+    Registry tên template -> TemplateSpec cho một thư mục template: template có sẵn cùng layouts.json
+    (nếu có). Mọi spec được kiểm tra một lần mỗi process; layout sai báo ValueError ngay khi nạp
+    """
+    registry = {spec.name: spec for spec in BUILTIN_TEMPLATES}
+    layouts_path = os.path.join(template_dir, TEMPLATE_LAYOUTS_FILE)
+    if os.path.isfile(layouts_path):
+        for spec in load_template_layouts(layouts_path):
+            registry[spec.name] = spec
+    for spec in registry.values():
+        validate_template_spec(spec)
+    return registry
+
+def get_template_spec(template_name, template_dir):
+    """TemplateSpec theo tên template (không đuôi), None nếu template không có layout"""
+    return load_registry(template_dir).get(template_name)
+
+def template_fonts(specs=BUILTIN_TEMPLATES):
+    """Các (tên font, cỡ chữ) mà các template sử dụng"""
+    fonts = set()
+    for spec in specs:
+        for element in spec.elements:
+            for size_field, font_field in FONT_FIELDS[type(element)]:
+                fonts.add((getattr(element, font_field), getattr(element, size_field)))
+    return sorted(fonts)
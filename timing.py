@@ -0,0 +1,277 @@
+"""
+Căn thời gian slide theo lời đọc.
+
+1. Chia text overview (từ generate_text) thành các đoạn, mỗi slide một đoạn, cắt theo ranh giới câu
+   sao cho độ dài các đoạn cân đối (độ dài lời đọc tỉ lệ gần đúng với số ký tự).
+2. Tìm các khoảng lặng trong PCM audio/L16 (từ generate_audio) bằng NumPy, đọc theo từng chunk:
+   RMS của từng frame 20 ms, frame dưới ngưỡng là lặng, chuỗi frame lặng đủ dài là một khoảng nghỉ.
+   Bộ nhớ không tăng theo độ dài audio; 15 phút ở 24 kHz xử lý trong khoảng 0.1 giây.
+3. Ranh giới giữa hai đoạn được ước lượng theo tỉ lệ ký tự rồi kéo về khoảng nghỉ gần nhất,
+   để slide đổi đúng lúc người đọc ngắt câu. Kết quả là timeline dùng cho video_assembly.
+
+    python timing.py <file_overview.txt> <file_wav> <thư_mục_slide> [timeline.json]
+"""
+import re
+import sys
+import json
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+# audio/L16 từ Gemini: PCM 16-bit little-endian, mono, 24 kHz
+# (ghi thẳng vào WAV trong generate_audio.convert_to_wav nên là little-endian, không phải network order)
+PCM_DTYPE = np.dtype("<i2")
+DEFAULT_SAMPLE_RATE = 24000
+
+FRAME_MS = 20
+# Frame có RMS dưới ngưỡng (dBFS) là lặng
+SILENCE_THRESHOLD_DBFS = -40.0
+# Khoảng lặng ngắn hơn mức này (giữa hai từ) không tính là khoảng nghỉ
+MIN_PAUSE_MS = 250
+
+# Ranh giới slide chỉ được kéo tới khoảng nghỉ cách vị trí ước lượng tối đa
+# SNAP_WINDOW x thời lượng trung bình của một đoạn
+SNAP_WINDOW = 0.35
+# Mỗi giây độ dài khoảng nghỉ được ưu tiên như gần hơn chừng ấy giây (ưu tiên chỗ ngắt câu dài)
+PAUSE_LENGTH_WEIGHT = 1.0
+
+# Một khoảng nghỉ trong audio (giây)
+Pause = namedtuple("Pause", ["start", "end"])
+
+# Kết quả phân tích audio: tổng thời lượng (giây) và các khoảng nghỉ theo thứ tự thời gian
+SpeechAnalysis = namedtuple("SpeechAnalysis", ["duration", "pauses"])
+
+# Một slide trên timeline: slide là đường dẫn (hoặc tên) slide, start/end tính bằng giây
+TimelineEntry = namedtuple("TimelineEntry", ["index", "slide", "start", "end", "text"])
+
+SENTENCE_PATTERN = re.compile(r"[^.!?…。]+(?:[.!?…。]+[\"'”’)]*|$)")
+
+# --- Chia text ---
+
+def split_sentences(text):
+    """Tách text thành các câu (giữ dấu câu), bỏ khoảng trắng thừa"""
+    sentences = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        for match in SENTENCE_PATTERN.finditer(paragraph):
+            sentence = " ".join(match.group(0).split())
+            if sentence:
+                sentences.append(sentence)
+    return sentences
+
+def split_segments(text, segment_count):
+    """
+    Chia text thành segment_count đoạn liên tiếp, cắt ở ranh giới câu,
+    đoạn thứ i kết thúc ở câu có tổng ký tự cộng dồn gần i / segment_count tổng nhất.
+    Ít câu hơn số đoạn thì các đoạn cuối rỗng
+    """
+    if segment_count <= 0:
+        return []
+    sentences = split_sentences(text)
+    if not sentences:
+        return [""] * segment_count
+
+    cumulative = np.cumsum([len(sentence) for sentence in sentences])
+    segments = []
+    start = 0
+    for i in range(1, segment_count + 1):
+        remaining_segments = segment_count - i
+        if remaining_segments == 0:
+            end = len(sentences)
+        else:
+            target = cumulative[-1] * i / segment_count
+            end = int(np.argmin(np.abs(cumulative - target))) + 1
+            # Mỗi đoạn ít nhất một câu, chừa lại mỗi đoạn sau một câu nếu còn đủ
+            end = max(end, start + 1)
+            end = min(end, max(len(sentences) - remaining_segments, start + 1), len(sentences))
+        segments.append(" ".join(sentences[start:end]))
+        start = end
+    return segments
+
+# --- Phân tích audio ---
+
+class SilenceDetector:
+    """
+    Tìm khoảng nghỉ trong PCM 16-bit, nhận dữ liệu từng chunk (feed) theo thứ tự.
+    Chunk có thể cắt ngang frame hoặc ngang một sample: phần dư được giữ lại cho chunk sau.
+    Trạng thái giữa các chunk chỉ gồm phần dư đó và độ dài chuỗi frame lặng đang mở
+    """
+
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, channels=1, frame_ms=FRAME_MS,
+                 threshold_dbfs=SILENCE_THRESHOLD_DBFS, min_pause_ms=MIN_PAUSE_MS):
+        self.sample_rate = sample_rate
+        self.frame_samples = max(1, sample_rate * frame_ms // 1000) * channels
+        self.frame_seconds = self.frame_samples / channels / sample_rate
+        # So sánh bình phương RMS với bình phương ngưỡng, không cần căn
+        threshold = 32768.0 * 10 ** (threshold_dbfs / 20)
+        self.threshold_square = threshold * threshold
+        self.min_pause_frames = max(1, round(min_pause_ms / frame_ms))
+        self.channels = channels
+
+        self.pauses = []
+        self.frame_count = 0
+        self.sample_count = 0
+        self._silent_run_start = None
+        self._pending = b""
+
+    def feed(self, pcm):
+        """Nhận thêm một chunk PCM (bytes / bytearray / memoryview)"""
+        if self._pending:
+            pcm = self._pending + bytes(pcm)
+        usable = len(pcm) - len(pcm) % (self.frame_samples * PCM_DTYPE.itemsize)
+        self._pending = bytes(pcm[usable:])
+        if not usable:
+            return
+        samples = np.frombuffer(pcm, dtype=PCM_DTYPE, count=usable // PCM_DTYPE.itemsize)
+        self.sample_count += samples.size
+        frames = samples.reshape(-1, self.frame_samples).astype(np.float32)
+        energy = np.einsum("ij,ij->i", frames, frames) / self.frame_samples
+        self._add_frames(energy < self.threshold_square)
+
+    def _add_frames(self, silent):
+        """Cập nhật các chuỗi frame lặng với mảng bool của các frame mới"""
+        offset = self.frame_count
+        self.frame_count += silent.size
+
+        # Vị trí bắt đầu / kết thúc các chuỗi lặng trong chunk (chỉ số frame toàn cục)
+        edges = np.diff(silent.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+        starts = np.flatnonzero(edges == 1) + offset
+        ends = np.flatnonzero(edges == -1) + offset
+
+        if self._silent_run_start is not None:
+            if silent.size and silent[0]:
+                # Chuỗi lặng từ chunk trước kéo dài sang chunk này
+                starts[0] = self._silent_run_start
+            else:
+                self._close_run(self._silent_run_start, offset)
+            self._silent_run_start = None
+
+        # Chuỗi chạm cuối chunk có thể còn kéo dài, giữ lại chờ chunk sau
+        if silent.size and silent[-1]:
+            self._silent_run_start = int(starts[-1])
+            starts, ends = starts[:-1], ends[:-1]
+
+        long_runs = (ends - starts) >= self.min_pause_frames
+        self.pauses.extend(Pause(start * self.frame_seconds, end * self.frame_seconds)
+                           for start, end in zip(starts[long_runs].tolist(), ends[long_runs].tolist()))
+
+    def _close_run(self, start_frame, end_frame):
+        if end_frame - start_frame >= self.min_pause_frames:
+            self.pauses.append(Pause(start_frame * self.frame_seconds, end_frame * self.frame_seconds))
+
+    def finish(self):
+        """Kết thúc luồng, trả về SpeechAnalysis"""
+        if self._pending:
+            # Frame cuối chưa đủ: tính thời lượng, không xét lặng
+            self.sample_count += len(self._pending) // PCM_DTYPE.itemsize
+            self._pending = b""
+        if self._silent_run_start is not None:
+            self._close_run(self._silent_run_start, self.frame_count)
+            self._silent_run_start = None
+        duration = self.sample_count / self.channels / self.sample_rate
+        return SpeechAnalysis(duration, list(self.pauses))
+
+def iter_wav_chunks(wav_path, chunk_frames=1 << 18):
+    """Đọc dữ liệu PCM của file WAV theo từng chunk, trả về (sample_rate, channels, iterator bytes)"""
+    wav_file = wave.open(wav_path, "rb")
+    if wav_file.getsampwidth() != PCM_DTYPE.itemsize:
+        wav_file.close()
+        raise ValueError(f"Chỉ hỗ trợ WAV 16-bit, '{wav_path}' có {wav_file.getsampwidth() * 8}-bit")
+
+    def chunks():
+        with wav_file:
+            while True:
+                data = wav_file.readframes(chunk_frames)
+                if not data:
+                    return
+                yield data
+
+    return wav_file.getframerate(), wav_file.getnchannels(), chunks()
+
+def analyze_pcm_chunks(chunks, sample_rate=DEFAULT_SAMPLE_RATE, channels=1, **options):
+    """Phân tích một luồng chunk PCM (vd. inline_data.data của từng chunk TTS)"""
+    detector = SilenceDetector(sample_rate, channels, **options)
+    for chunk in chunks:
+        detector.feed(chunk)
+    return detector.finish()
+
+def analyze_wav(wav_path, **options):
+    """Phân tích file WAV 16-bit, đọc theo từng chunk"""
+    sample_rate, channels, chunks = iter_wav_chunks(wav_path)
+    return analyze_pcm_chunks(chunks, sample_rate, channels, **options)
+
+# --- Timeline ---
+
+def _snap_to_pause(estimate, pauses, lower, upper, window):
+    """Khoảng nghỉ tốt nhất quanh estimate trong (lower, upper), trả về thời điểm giữa khoảng nghỉ hoặc None"""
+    best, best_score = None, None
+    for pause in pauses:
+        middle = (pause.start + pause.end) / 2
+        if middle <= lower or middle >= upper or abs(middle - estimate) > window:
+            continue
+        score = abs(middle - estimate) - PAUSE_LENGTH_WEIGHT * (pause.end - pause.start)
+        if best_score is None or score < best_score:
+            best, best_score = middle, score
+    return best
+
+def align_segments(segments, analysis):
+    """
+    Thời điểm bắt đầu / kết thúc của từng đoạn trên audio, trả về list (start, end).
+    Ranh giới ước lượng theo tỉ lệ ký tự cộng dồn, rồi kéo về khoảng nghỉ gần đó (nếu có)
+    """
+    if not segments:
+        return []
+    duration = analysis.duration
+    weights = np.array([max(len(segment), 1) for segment in segments], dtype=np.float64)
+    estimates = np.cumsum(weights)[:-1] / weights.sum() * duration
+    window = SNAP_WINDOW * duration / len(segments)
+
+    boundaries = [0.0]
+    for i, estimate in enumerate(estimates):
+        # Ranh giới sau phải sau ranh giới trước và trước ước lượng của ranh giới kế tiếp
+        lower = boundaries[-1]
+        upper = estimates[i + 1] if i + 1 < len(estimates) else duration
+        snapped = _snap_to_pause(estimate, analysis.pauses, lower, upper, window)
+        boundaries.append(float(snapped if snapped is not None else max(estimate, lower)))
+    boundaries.append(duration)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def build_timeline(text, slides, analysis):
+    """
+    Timeline cho các slide (theo thứ tự trình chiếu) từ text overview và kết quả phân tích audio.
+    analysis: SpeechAnalysis, hoặc đường dẫn file WAV
+    """
+    if isinstance(analysis, str):
+        analysis = analyze_wav(analysis)
+    segments = split_segments(text, len(slides))
+    return [TimelineEntry(index, slide, start, end, segment)
+            for index, (slide, segment, (start, end)) in enumerate(zip(slides, segments, align_segments(segments, analysis)))]
+
+def timeline_durations(timeline):
+    """Thời lượng từng slide (giây), dùng cho video_assembly.assemble_slide_dir"""
+    return [entry.end - entry.start for entry in timeline]
+
+def write_timeline(timeline, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([entry._asdict() for entry in timeline], f, ensure_ascii=False, indent=2)
+
+def read_timeline(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [TimelineEntry(**entry) for entry in json.load(f)]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print(__doc__)
+        sys.exit(1)
+    import video_assembly
+
+    text_file, audio_file, slide_directory = sys.argv[1:4]
+    timeline_file = sys.argv[4] if len(sys.argv) > 4 else audio_file.rsplit(".", 1)[0] + ".timeline.json"
+    with open(text_file, "r", encoding="utf-8") as f:
+        overview_text = f.read()
+    slide_files = video_assembly.list_slide_files(slide_directory)
+    timeline = build_timeline(overview_text, slide_files, audio_file)
+    write_timeline(timeline, timeline_file)
+    for entry in timeline:
+        print(f"{entry.start:8.2f} - {entry.end:8.2f}  {entry.slide}")
+    print(f"✅ Đã ghi timeline '{timeline_file}'")
@@ -0,0 +1,156 @@
+"""
+Upload tài liệu nguồn lên Gemini Files API: song song, không upload lại file đã có.
+
+Mỗi file được hash (SHA-256 nội dung). Manifest local (JSON) ghi hash -> handle file trên server
+(name, uri, thời điểm hết hạn). File có hash đã nằm trong manifest và handle còn sống
+(chưa hết hạn, files.get vẫn trả về file ACTIVE) thì dùng lại, không upload. Các file còn lại
+được upload đồng thời bằng một pool giới hạn số worker; retry khi lỗi rate limit / lỗi server do
+client dùng chung (genai_client) đảm nhiệm. Nhiều file cùng nội dung chỉ upload một lần.
+"""
+import os
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from disk_cache import file_sha256, write_json_atomic
+
+UPLOAD_MANIFEST = os.path.join(".cache", "uploads.json")
+UPLOAD_MAX_WORKERS = 4
+# File trên Files API tự bị xóa sau 48 giờ; handle sắp hết hạn coi như đã chết
+# để không hết hạn giữa chừng lúc đang tạo nội dung
+EXPIRY_MARGIN = timedelta(hours=1)
+
+# Kết quả cho một file nguồn: file là handle trên server (None nếu lỗi), reused = lấy lại từ manifest
+UploadResult = namedtuple("UploadResult", ["path", "sha256", "file", "reused", "error"])
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(manifest_path, manifest):
+    """Ghi nguyên tử: tiến trình khác không bao giờ đọc phải manifest ghi dở"""
+    write_json_atomic(manifest_path, manifest)
+
+def is_expired(entry, now=None):
+    expiration = entry.get("expiration_time")
+    if not expiration:
+        return False
+    now = now or datetime.now(timezone.utc)
+    return datetime.fromisoformat(expiration) - EXPIRY_MARGIN <= now
+
+def manifest_entry(remote_file, path):
+    expiration = remote_file.expiration_time
+    return {
+        "name": remote_file.name,
+        "uri": remote_file.uri,
+        "mime_type": remote_file.mime_type,
+        "expiration_time": expiration.isoformat() if expiration else None,
+        "source": path,
+    }
+
+def _hash_file(path):
+    """(sha256, None), hoặc (None, lỗi) nếu không đọc được file"""
+    try:
+        return file_sha256(path), None
+    except OSError as error:
+        return None, error
+
+def _state_name(remote_file):
+    state = getattr(remote_file, "state", None)
+    return getattr(state, "value", state)
+
+class UploadManager:
+    def __init__(self, client, manifest_path=UPLOAD_MANIFEST, max_workers=UPLOAD_MAX_WORKERS):
+        self.client = client
+        self.manifest_path = manifest_path
+        self.max_workers = max_workers
+        self.manifest = load_manifest(manifest_path)
+        self._lock = threading.Lock()
+        # sha256 -> Future đang xử lý / đã xong, dùng chung giữa các lần gọi upload_all đồng thời
+        # (batch: nhiều job cùng một tài liệu chỉ upload một lần)
+        self._futures = {}
+        self._futures_lock = threading.Lock()
+
+    def live_file(self, sha256):
+        """Handle còn sống của file có hash sha256 theo manifest, None nếu chưa có / đã hết hạn / bị xóa"""
+        entry = self.manifest.get(sha256)
+        if entry is None or is_expired(entry):
+            return None
+        try:
+            remote_file = self.client.files.get(name=entry["name"])
+        except Exception:
+            # 404 / 403: file đã bị xóa trên server
+            return None
+        if _state_name(remote_file) == "FAILED":
+            return None
+        return remote_file
+
+    def upload(self, path, sha256):
+        remote_file = self.client.files.upload(file=path)
+        self._record(sha256, manifest_entry(remote_file, path))
+        return remote_file
+
+    def _record(self, sha256, entry):
+        with self._lock:
+            # Gộp với manifest trên đĩa để không ghi đè handle mà tiến trình khác vừa thêm,
+            # đồng thời bỏ các handle đã hết hạn
+            manifest = load_manifest(self.manifest_path)
+            manifest.update(self.manifest)
+            manifest[sha256] = entry
+            self.manifest = {key: value for key, value in manifest.items() if not is_expired(value)}
+            save_manifest(self.manifest_path, self.manifest)
+
+    def _resolve(self, sha256, path):
+        remote_file = self.live_file(sha256)
+        if remote_file is not None:
+            return remote_file, True
+        return self.upload(path, sha256), False
+
+    def _submit(self, executor, sha256, path):
+        with self._futures_lock:
+            future = self._futures.get(sha256)
+            if future is not None:
+                return future
+            future = executor.submit(self._resolve, sha256, path)
+            self._futures[sha256] = future
+        future.add_done_callback(lambda done: self._forget_failed(sha256, done))
+        return future
+
+    def _forget_failed(self, sha256, future):
+        # Lỗi thì lần gọi sau được thử lại
+        if future.exception() is not None:
+            with self._futures_lock:
+                if self._futures.get(sha256) is future:
+                    del self._futures[sha256]
+
+    def upload_all(self, paths):
+        """Upload (hoặc dùng lại) tất cả file, trả về list UploadResult theo thứ tự paths"""
+        paths = list(paths)
+        if not paths:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(paths)))) as executor:
+            hashed = list(executor.map(_hash_file, paths))
+            # Mỗi nội dung chỉ xử lý một lần, dù có nhiều file trùng nhau
+            first_path = {}
+            for path, (sha256, error) in zip(paths, hashed):
+                if error is None:
+                    first_path.setdefault(sha256, path)
+            futures = {sha256: self._submit(executor, sha256, path) for sha256, path in first_path.items()}
+
+            results = []
+            for path, (sha256, error) in zip(paths, hashed):
+                if error is not None:
+                    # Không đọc được file (không có quyền, symlink hỏng...): chỉ file này lỗi, các file khác vẫn upload
+                    results.append(UploadResult(path, None, None, False, error))
+                    continue
+                try:
+                    remote_file, reused = futures[sha256].result()
+                    results.append(UploadResult(path, sha256, remote_file, reused, None))
+                except Exception as error:
+                    results.append(UploadResult(path, sha256, None, False, error))
+        return results
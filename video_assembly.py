@@ -0,0 +1,166 @@
+"""
+Ghép video: các slide đã render (1_opening.png, 2_chapter.png, ...) + file WAV -> MP4, dùng ffmpeg.
+
+Mỗi slide là một khung hình duy nhất được giữ trong suốt đoạn của nó: danh sách slide được đưa vào
+concat demuxer của ffmpeg kèm thời lượng từng ảnh, và output dùng timestamp biến thiên (-fps_mode vfr,
+ffmpeg cũ hơn 5.1 thì -vsync vfr),
+nên mỗi ảnh chỉ được decode và mã hóa đúng một lần thay vì một lần cho mỗi khung hình ở 25/30 fps.
+Video 10 phút với vài chục slide chỉ có vài chục khung hình, ghép xong trong vài giây.
+
+Cần ffmpeg trên PATH, hoặc đường dẫn tới ffmpeg trong biến môi trường FFMPEG_BINARY.
+
+    python video_assembly.py <thư_mục_slide> <file_wav> [output.mp4]
+"""
+import os
+import re
+import sys
+import wave
+import shutil
+import tempfile
+import functools
+import subprocess
+from collections import namedtuple
+
+FFMPEG_ENV = "FFMPEG_BINARY"
+
+SLIDE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# Tên file slide: <số thứ tự>_<tên template>.<đuôi>, xem get_slide_filename trong python.py
+SLIDE_FILENAME_PATTERN = re.compile(r"^(\d+)_")
+
+# Một slide trên timeline: ảnh và thời lượng hiển thị (giây)
+VideoSegment = namedtuple("VideoSegment", ["image_path", "duration"])
+
+# Tham số mã hóa.
+# Mỗi slide là một keyframe (gop 1): chỉ có một khung hình mỗi slide nên gần như không tốn thêm dung lượng,
+# và tua tới slide nào cũng hiện ngay
+VIDEO_CODEC = "libx264"
+# crf / preset / tune stillimage chỉ áp dụng cho libx264, codec khác dùng thiết lập mặc định của nó
+VIDEO_CRF = 18
+VIDEO_PRESET = "medium"
+# -fps_mode có từ ffmpeg 5.1, bản cũ hơn chỉ có -vsync
+FPS_MODE_MIN_VERSION = (5, 1)
+FFMPEG_VERSION_PATTERN = re.compile(r"ffmpeg version n?(\d+)\.(\d+)")
+# Giọng đọc TTS là mono 24 kHz: 96k đã đủ, bitrate cao hơn làm encoder AAC chậm đi nhiều lần
+AUDIO_CODEC = "aac"
+AUDIO_BITRATE = "96k"
+
+def find_ffmpeg():
+    """Đường dẫn ffmpeg: biến môi trường FFMPEG_BINARY, không có thì tìm trên PATH"""
+    ffmpeg = os.environ.get(FFMPEG_ENV) or shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise FileNotFoundError(f"Không tìm thấy ffmpeg: cài ffmpeg hoặc đặt biến môi trường {FFMPEG_ENV}")
+    return ffmpeg
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_version(ffmpeg):
+    """(major, minor) của ffmpeg, None nếu không đọc được (bản build từ git, vd. 'N-112345-g...')"""
+    try:
+        result = subprocess.run([ffmpeg, "-hide_banner", "-version"], capture_output=True, text=True)
+    except OSError:
+        return None
+    match = FFMPEG_VERSION_PATTERN.search(result.stdout)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+def list_slide_files(slide_dir):
+    """Các file slide trong thư mục, sắp theo số thứ tự ở đầu tên file"""
+    slides = []
+    for filename in os.listdir(slide_dir):
+        match = SLIDE_FILENAME_PATTERN.match(filename)
+        if match and filename.lower().endswith(SLIDE_EXTENSIONS):
+            slides.append((int(match.group(1)), os.path.join(slide_dir, filename)))
+    return [path for _, path in sorted(slides)]
+
+def wav_duration(audio_path):
+    """Thời lượng file WAV (giây), chỉ đọc header"""
+    with wave.open(audio_path, "rb") as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+def equal_segments(slide_paths, total_duration):
+    """Chia đều thời lượng cho các slide (khi chưa có timeline)"""
+    if not slide_paths:
+        return []
+    duration = total_duration / len(slide_paths)
+    return [VideoSegment(path, duration) for path in slide_paths]
+
+def _concat_path(path):
+    # Đường dẫn tuyệt đối, escape dấu nháy đơn theo cú pháp của concat demuxer
+    return os.path.abspath(path).replace("'", "'\\''")
+
+def write_concat_list(segments, list_path):
+    """
+    Ghi danh sách cho concat demuxer. Ảnh cuối được lặp lại một lần không kèm duration,
+    nếu không ffmpeg sẽ bỏ qua thời lượng của slide cuối
+    """
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.write("ffconcat version 1.0\n")
+        for segment in segments:
+            f.write(f"file '{_concat_path(segment.image_path)}'\n")
+            f.write(f"duration {segment.duration:.6f}\n")
+        f.write(f"file '{_concat_path(segments[-1].image_path)}'\n")
+
+def build_ffmpeg_command(ffmpeg, list_path, audio_path, output_path, video_codec=VIDEO_CODEC, crf=VIDEO_CRF,
+                         preset=VIDEO_PRESET, audio_codec=AUDIO_CODEC, audio_bitrate=AUDIO_BITRATE, legacy_vsync=False):
+    """legacy_vsync: dùng -vsync vfr thay cho -fps_mode vfr (ffmpeg < 5.1)"""
+    video_options = ["-c:v", video_codec]
+    if video_codec == "libx264":
+        video_options += ["-crf", str(crf), "-preset", preset, "-tune", "stillimage"]
+    return [
+        ffmpeg, "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        # yuv420p cần kích thước chẵn
+        "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+        "-vsync" if legacy_vsync else "-fps_mode", "vfr",
+        *video_options,
+        "-g", "1", "-pix_fmt", "yuv420p",
+        "-c:a", audio_codec, "-b:a", audio_bitrate,
+        "-shortest", "-movflags", "+faststart",
+        output_path,
+    ]
+
+def assemble_video(segments, audio_path, output_path, ffmpeg=None, **encode_options):
+    """
+    Ghép các VideoSegment và audio thành MP4 tại output_path, trả về output_path.
+    encode_options: video_codec, crf, preset, audio_codec, audio_bitrate (xem build_ffmpeg_command)
+    """
+    segments = [segment for segment in segments if segment.duration > 0]
+    if not segments:
+        raise ValueError("Không có slide nào để ghép video")
+    ffmpeg = ffmpeg or find_ffmpeg()
+    version = ffmpeg_version(ffmpeg)
+    encode_options.setdefault("legacy_vsync", version is not None and version < FPS_MODE_MIN_VERSION)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        list_path = os.path.join(tmp_dir, "slides.ffconcat")
+        write_concat_list(segments, list_path)
+        command = build_ffmpeg_command(ffmpeg, list_path, audio_path, output_path, **encode_options)
+        result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg lỗi (mã {result.returncode}): {result.stderr.strip()}")
+    return output_path
+
+def assemble_slide_dir(slide_dir, audio_path, output_path, durations=None, **options):
+    """
+    Ghép tất cả slide trong slide_dir với file WAV.
+    durations: thời lượng từng slide (giây) theo thứ tự slide; None thì chia đều độ dài audio
+    """
+    slide_paths = list_slide_files(slide_dir)
+    if durations is None:
+        segments = equal_segments(slide_paths, wav_duration(audio_path))
+    else:
+        if len(durations) != len(slide_paths):
+            raise ValueError(f"Có {len(slide_paths)} slide nhưng {len(durations)} thời lượng")
+        segments = [VideoSegment(path, duration) for path, duration in zip(slide_paths, durations)]
+    return assemble_video(segments, audio_path, output_path, **options)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    slide_directory, audio_file = sys.argv[1], sys.argv[2]
+    output_file = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(audio_file)[0] + ".mp4"
+    assemble_slide_dir(slide_directory, audio_file, output_file)
+    print(f"✅ Đã ghép video '{output_file}'")
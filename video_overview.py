@@ -1,55 +1,236 @@
 from generate_audio import generate as generate_audio
-from generate_text import generate as generate_text
-from dotenv import load_dotenv
-from google import genai
+from generate_text import stream_overview, generate_title, save_overview, print_kept_draft, print_cache_stats
+from video_assembly import assemble_slide_dir, list_slide_files
+from timing import build_timeline, timeline_durations, write_timeline
+from upload_manager import UploadManager
+from pipeline import Pipeline, print_event
+from collections import namedtuple
+from genai_client import get_client
 import os
+import sys
+import json
+import uuid
+import asyncio
+import argparse
 
-load_dotenv()
+# One overview job. Every field can come from a JSON config file or a CLI flag.
+# slides: optional JSON file with the slide list for python.py's render_deck
+# ([{"template": ..., "data": ...}, ...]), rendered into slide_dir; without it no video is assembled.
+# output_dir: where the overview text, audio, timeline and video are written ("" = current folder)
+# render_workers: slide render processes (None = one per CPU core, at most one per slide)
+OverviewJob = namedtuple(
+    "OverviewJob",
+    ["sources", "customize_text", "customize_audio", "slides", "slide_dir", "template_dir", "font_dir", "output_dir",
+     "render_workers"],
+    defaults=("sources", "", "", None, "output", "templates", "fonts", "", None),
+)
 
 def ask_yes_no(message):
     ans = input(message).strip().lower()
     return ans == "yes"
 
-print("===== Audio Overview Generation =====")
-print("WARNING: If you're using Google's Gemini API on the *free plan*, your content *might* be used to help improve their models.\n"
-      "If you prefer not to share your content, use another API or service.\n")
-if not ask_yes_no("Do you want to continue? (yes/no): "):
-    print("Exiting the program as per user request.")
-    exit()
-
-# Nhập phần tùy chỉnh
-customize_text = input("Enter customization text (optional): ").strip()
-customize_audio = input("Enter customization audio (optional): ").strip()
-print(f"[DEBUG] Customize Text: {customize_text}")
-print(f"[DEBUG] Customize Audio: {customize_audio}")
-
-print("Uploading files...")
-client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-documents = [os.path.join("sources", f) for f in os.listdir("sources") if os.path.isfile(os.path.join("sources", f))]
-uploaded_documents = []
-
-for document in documents:
+def list_documents(source_dir):
+    return [os.path.join(source_dir, f) for f in os.listdir(source_dir) if os.path.isfile(os.path.join(source_dir, f))]
+
+def upload_sources(client, source_dir, uploader=None):
+    print("Uploading files...")
+    uploaded_documents = []
+
+    # Uploads run concurrently; files already uploaded on an earlier run (same content hash) are reused
+    uploader = uploader or UploadManager(client)
+    for result in uploader.upload_all(list_documents(source_dir)):
+        if result.error is not None:
+            print(f"[ERROR] Failed to upload {result.path}: {result.error}")
+            continue
+        uploaded_documents.append(result.file)
+        if result.reused:
+            print(f"[UPLOAD] {result.path} unchanged, reusing {result.file.name}.")
+        else:
+            print(f"[UPLOAD] {result.path} uploaded successfully.")
+
+    if not uploaded_documents:
+        raise RuntimeError("No documents were uploaded.")
+    return uploaded_documents
+
+def start_overview(documents, customize_text, client, output_dir=""):
+    # The text is streamed into a draft file as it arrives; name_overview renames it once the title is known
+    return stream_overview(documents, customize_text, client,
+                           partial_path=os.path.join(output_dir, f"OVERVIEW_{uuid.uuid4().hex[:8]}.partial.txt"))
+
+async def collect_overview(overview_stream):
+    try:
+        return await overview_stream.result_async()
+    except Exception:
+        print_kept_draft(overview_stream)
+        raise
+
+def name_overview(overview, overview_stream, client, output_dir=""):
     try:
-        uploaded_doc = client.files.upload(file=document)
-        uploaded_documents.append(uploaded_doc)
-        print(f"[UPLOAD] {document} uploaded successfully.")
-    except Exception as e:
-        print(f"[ERROR] Failed to upload {document}: {e}")
-
-if not uploaded_documents:
-    print("[ERROR] No documents were uploaded. Exiting.")
-    exit()
-
-# Generate text overview
-text_overview, name = generate_text(uploaded_documents, customize_text)
-if not text_overview or not name:
-    print("[ERROR] Failed to generate text overview.")
-    exit()
-print(f"[SUCCESS] Text overview generated successfully. File name: {name} Overview.txt")
-
-# Generate audio overview
-audio_file = generate_audio(text_overview, customize_audio, name)
-if audio_file:
+        name = generate_title(overview, client)
+        file_name = save_overview(overview, name, output_dir, draft_path=overview_stream.partial_path)
+    except Exception:
+        print_kept_draft(overview_stream)
+        raise
+    print(f"[SUCCESS] Text overview generated successfully. File name: {file_name}")
+    return name
+
+def synthesize_overview(overview, customize_audio, client, output_dir=""):
+    # Chunked mode: the script is synthesized as concurrent chunks and stitched in order.
+    # overview can be the paragraphs of a stream that is still arriving: the first chunks are
+    # synthesized while the rest of the text is being generated.
+    # The title is not known yet (it is generated alongside), so the audio gets a draft name first
+    audio_file = generate_audio(overview, customize_audio,
+                                os.path.join(output_dir, f"AUDIO_OVERVIEW_{uuid.uuid4().hex[:8]}"),
+                                client=client, chunked=True)
+    if not audio_file:
+        raise RuntimeError("Failed to generate audio.")
+    return audio_file
+
+def finalize_audio(audio, title, output_dir=""):
+    audio_file = os.path.join(output_dir, title + os.path.splitext(audio)[1])
+    os.replace(audio, audio_file)
     print(f"[SUCCESS] Audio overview saved as {audio_file}")
-else:
-    print("[ERROR] Failed to generate audio.")
\ No newline at end of file
+    return audio_file
+
+def render_slides(slides_path, template_dir, font_dir, slide_dir, max_workers=None):
+    """
+    Renders the slide list from slides_path into slide_dir; returns slide_dir if any slide was rendered.
+    Numbered slides left in slide_dir by an earlier run are removed first so they never end up in the video.
+    """
+    if not slides_path:
+        return None
+    # Imported here: the renderer (Pillow, fonts, emoji atlas) is only needed when there are slides to render
+    from python import render_deck
+    with open(slides_path, "r", encoding="utf-8") as f:
+        slides_data = json.load(f)
+    if os.path.isdir(slide_dir):
+        stale = list_slide_files(slide_dir)
+        for path in stale:
+            os.remove(path)
+        if stale:
+            print(f"[INFO] Removed {len(stale)} old slide(s) from {slide_dir}.")
+    rendered = 0
+    for result in render_deck(slides_data, template_dir, font_dir, slide_dir, max_workers=max_workers):
+        if result.error is not None:
+            print(f"[ERROR] Slide {result.index + 1} ({result.template}): {result.error}")
+        else:
+            rendered += 1
+    return slide_dir if rendered else None
+
+def assemble_overview(overview, title, audio_file, slide_dir, output_dir=""):
+    # Assemble video from the slides and the audio
+    if not slide_dir or not audio_file.endswith(".wav"):
+        print("[INFO] No slides to assemble, skipping video.")
+        return None
+    # Align each slide with its part of the narration
+    timeline = build_timeline(overview, list_slide_files(slide_dir), audio_file)
+    write_timeline(timeline, os.path.join(output_dir, f"{title} Overview.timeline.json"))
+    video_file = assemble_slide_dir(slide_dir, audio_file, os.path.join(output_dir, f"{title} Overview.mp4"),
+                                    durations=timeline_durations(timeline))
+    print(f"[SUCCESS] Video overview saved as {video_file}")
+    return video_file
+
+def build_pipeline(job, client, uploader=None):
+    """
+    The overview job as a DAG:
+
+        upload -> overview_stream -> overview -> title ----------+
+                                 \\-> audio -----------------> audio_file -> video
+        slides ---------------------------------------------------------------/
+
+    Uploads run in parallel and slides render while the text is generated.
+    overview_stream starts the text generation and returns at once; audio
+    synthesizes the opening paragraphs while later ones are still streaming,
+    and the title call runs once the full text is in.
+    """
+    pipeline = Pipeline()
+    pipeline.add("upload", lambda: upload_sources(client, job.sources, uploader))
+    pipeline.add("overview_stream", lambda upload: start_overview(upload, job.customize_text, client, job.output_dir),
+                 depends_on=["upload"])
+    pipeline.add("overview", collect_overview, depends_on=["overview_stream"])
+    pipeline.add("title", lambda overview, overview_stream: name_overview(overview, overview_stream, client, job.output_dir),
+                 depends_on=["overview", "overview_stream"])
+    pipeline.add("audio", lambda overview_stream: synthesize_overview(overview_stream.paragraphs(), job.customize_audio,
+                                                                      client, job.output_dir),
+                 depends_on=["overview_stream"])
+    pipeline.add("slides", lambda: render_slides(job.slides, job.template_dir, job.font_dir, job.slide_dir,
+                                                 job.render_workers))
+    pipeline.add("audio_file", lambda audio, title: finalize_audio(audio, title, job.output_dir),
+                 depends_on=["audio", "title"])
+    pipeline.add("video", lambda overview, title, audio_file, slides:
+                 assemble_overview(overview, title, audio_file, slides, job.output_dir),
+                 depends_on=["overview", "title", "audio_file", "slides"])
+    return pipeline
+
+async def run_job_async(job, client, on_event=print_event, uploader=None):
+    """Runs one overview job inside a running event loop; returns the dict of step name -> StepResult"""
+    if job.output_dir:
+        os.makedirs(job.output_dir, exist_ok=True)
+    return await build_pipeline(job, client, uploader).run_async(on_event)
+
+def run_job(job, client, on_event=print_event, uploader=None):
+    """Runs one overview job; returns the dict of step name -> StepResult"""
+    results = asyncio.run(run_job_async(job, client, on_event, uploader))
+    print_cache_stats()
+    return results
+
+def load_config(config_path):
+    """Job fields (and accept_terms) from a JSON config file"""
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    unknown = set(config) - set(OverviewJob._fields) - {"accept_terms"}
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+    return config
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a text, audio and video overview of the files in a source folder.")
+    parser.add_argument("--config", help="JSON file with job settings (keys: " + ", ".join(OverviewJob._fields) + ", accept_terms)")
+    parser.add_argument("--sources", help="folder with the source documents (default: sources)")
+    parser.add_argument("--customize-text", help="customization for the text overview")
+    parser.add_argument("--customize-audio", help="customization for the narration")
+    parser.add_argument("--slides", help="JSON slide list to render before assembling the video")
+    parser.add_argument("--slide-dir", help="folder the slides are rendered into; old numbered slides in it are removed (default: output)")
+    parser.add_argument("--output-dir", help="folder for the overview text, audio, timeline and video (default: current folder)")
+    parser.add_argument("--render-workers", type=int, help="slide render processes (default: one per CPU core)")
+    parser.add_argument("--yes", action="store_true", help="accept the free-plan data notice without asking")
+    parser.add_argument("--non-interactive", action="store_true",
+                        help="never prompt; unset customizations are left empty")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = load_config(args.config) if args.config else {}
+    accept_terms = args.yes or config.pop("accept_terms", False)
+    for field in ("sources", "customize_text", "customize_audio", "slides", "slide_dir", "output_dir", "render_workers"):
+        value = getattr(args, field)
+        if value is not None:
+            config[field] = value
+    interactive = not args.non_interactive and sys.stdin.isatty()
+
+    print("===== Audio Overview Generation =====")
+    print("WARNING: If you're using Google's Gemini API on the *free plan*, your content *might* be used to help improve their models.\n"
+          "If you prefer not to share your content, use another API or service.\n")
+    if not accept_terms:
+        if not interactive:
+            print("[ERROR] Pass --yes (or \"accept_terms\": true in the config) to run non-interactively.")
+            return 1
+        if not ask_yes_no("Do you want to continue? (yes/no): "):
+            print("Exiting the program as per user request.")
+            return 0
+
+    # Nhập phần tùy chỉnh
+    if interactive and "customize_text" not in config:
+        config["customize_text"] = input("Enter customization text (optional): ").strip()
+    if interactive and "customize_audio" not in config:
+        config["customize_audio"] = input("Enter customization audio (optional): ").strip()
+    job = OverviewJob(**config)
+    print(f"[DEBUG] Customize Text: {job.customize_text}")
+    print(f"[DEBUG] Customize Audio: {job.customize_audio}")
+
+    results = run_job(job, get_client())
+    failed = [result for result in results.values() if result.error is not None]
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())